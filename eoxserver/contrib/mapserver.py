@@ -90,7 +90,10 @@ class Map(MetadataMixIn, mapObj):
 
 def dispatch(map_, request):
     """ Wraps the ``OWSDispatch`` method. Perfoms all necessary steps for a 
-        further handling of the result.
+        further handling of the result. The output buffer of MapServer is 
+        copied exactly once into the returned string; all further processing
+        (see :func:`eoxserver.services.result.result_set_from_raw_data`) only 
+        references it via ``buffer`` views.
     """
 
     logger.debug("MapServer: Installing stdout to buffer.")
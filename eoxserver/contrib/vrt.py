@@ -93,7 +93,7 @@ class VRTBuilder(object):
 
 
     def add_simple_source(self, band_index, src, src_band, 
-                          src_rect=None, dst_rect=None):
+                          src_rect=None, dst_rect=None, open_options=None):
         if isinstance(src, str):
             pass
 
@@ -110,6 +110,11 @@ class VRTBuilder(object):
             '<SourceFilename relativeToVRT="1">%s</SourceFilename>' % src,
             "<SourceBand>%d</SourceBand>" % src_band
         ]
+        if open_options:
+            lines.append("<OpenOptions>%s</OpenOptions>" % "".join(
+                '<OOI key="%s">%s</OOI>' % item 
+                for item in sorted(open_options.items())
+            ))
         if src_rect:
             lines.append(
                 '<SrcRect xOff="%d" yOff="%d" xSize="%d" ySize="%d"/>' 
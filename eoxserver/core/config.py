@@ -33,10 +33,12 @@ on different configuration files.
 
 import imp
 import os
-from os.path import join, getmtime
+from os.path import join, getmtime, exists
+from stat import S_ISDIR, S_IMODE
 from sys import prefix
+import tempfile
 import threading
-from ConfigParser import RawConfigParser
+from ConfigParser import RawConfigParser, NoOptionError, NoSectionError
 import logging
 from time import time
 
@@ -49,18 +51,101 @@ logger = logging.getLogger(__name__)
 # configuration singleton
 _cached_config = None
 _last_access_time = None
+_last_check_time = None
+
+# default interval (in seconds) to check the instance configuration for
+# modifications
+DEFAULT_CHECK_INTERVAL = 5
+
+
+def get_files_stamp(paths):
+    """ Returns a tuple of a stamp identifying the current state of the given
+        files (their paths, modification times and sizes) and their latest 
+        modification time. Missing files are skipped.
+    """
+    stamps = []
+    modified = None
+    for path in paths:
+        if path is None or not exists(path):
+            continue
+        stat = os.stat(path)
+        stamps.append("%s:%r:%d" % (path, stat.st_mtime, stat.st_size))
+        modified = max(modified, stat.st_mtime)
+    return ";".join(stamps), modified
+
+
+class ConfigSnapshot(RawConfigParser):
+    """ Immutable and versioned snapshot of the EOxServer configuration. Once
+        the configuration files are read, the snapshot cannot be altered. This
+        allows readers to cache their parsed values per snapshot in the 
+        `value_cache`. Unlike the process local `version`, the `stamp` and 
+        the `modified` time of the read files are the same in all processes.
+    """
+
+    def __init__(self, paths, version):
+        RawConfigParser.__init__(self)
+        self.stamp, self.modified = get_files_stamp(paths)
+        self.read(paths)
+        self.version = version
+        self.value_cache = {}
+        self._frozen = True
+
+        try:
+            self.check_interval = self.getfloat(
+                "core.system", "config_check_interval"
+            )
+        except (NoOptionError, NoSectionError, ValueError):
+            self.check_interval = DEFAULT_CHECK_INTERVAL
+
+    def _check_frozen(self):
+        if getattr(self, "_frozen", False):
+            raise TypeError("The configuration snapshot is immutable.")
+
+    def set(self, *args, **kwargs):
+        self._check_frozen()
+        return RawConfigParser.set(self, *args, **kwargs)
+
+    def add_section(self, *args, **kwargs):
+        self._check_frozen()
+        return RawConfigParser.add_section(self, *args, **kwargs)
+
+    def remove_option(self, *args, **kwargs):
+        self._check_frozen()
+        return RawConfigParser.remove_option(self, *args, **kwargs)
+
+    def remove_section(self, *args, **kwargs):
+        self._check_frozen()
+        return RawConfigParser.remove_section(self, *args, **kwargs)
 
 
 def get_eoxserver_config():
+    """ Returns the current snapshot of the EOxServer configuration. The 
+        instance configuration file is only checked for modifications once per
+        check interval (`config_check_interval` in the `core.system` section). 
+        In between, the snapshot is returned without locking. A negative 
+        interval disables the check; the configuration is then only reloaded 
+        via `reload_eoxserver_config`.
+    """
+    global _last_check_time
+
+    config = _cached_config
+    if config is not None:
+        interval = config.check_interval
+        if interval < 0 or time() - _last_check_time < interval:
+            return config
+
     with config_lock:
         if not _cached_config or getmtime(get_instance_config_path()) > _last_access_time:
             reload_eoxserver_config()
-
-    return _cached_config
+        _last_check_time = time()
+        return _cached_config
 
 
 def reload_eoxserver_config():
-    global _cached_config, _last_access_time
+    """ Explicitly (re-)load the configuration files and replace the current 
+        snapshot.
+    """
+    global _cached_config, _last_access_time, _last_check_time
     _, eoxs_path, _ = imp.find_module("eoxserver")
     paths = [
         join(eoxs_path, "conf", "default.conf"),
@@ -74,9 +159,54 @@ def reload_eoxserver_config():
     )
 
     with config_lock:
-        _cached_config = RawConfigParser()
-        _cached_config.read(paths)
+        version = _cached_config.version + 1 if _cached_config else 1
+        _cached_config = ConfigSnapshot(paths, version)
         _last_access_time = time()
+        _last_check_time = _last_access_time
+
+
+def get_private_directory(name, directory=None):
+    """ Returns the path of a directory for files the server relies upon, 
+        e.g: cached VRTs, which may reference arbitrary files. A configured 
+        `directory` is used as it is and created if necessary. Otherwise, a
+        directory named after `name` and the current user is used within the 
+        temporary directory (`path_temp` in the `core.system` section). It is
+        created with mode 0700 and rejected, if it is not owned by the current
+        user or accessible by others, as anybody could plant files there.
+    """
+    if directory:
+        _makedirs(directory)
+        return directory
+
+    try:
+        temp_dir = get_eoxserver_config().get("core.system", "path_temp")
+    except (NoOptionError, NoSectionError):
+        temp_dir = None
+
+    uid = os.getuid()
+    directory = join(
+        temp_dir or tempfile.gettempdir(), "eoxserver-%s-%d" % (name, uid)
+    )
+    _makedirs(directory)
+
+    stat = os.lstat(directory)
+    if not S_ISDIR(stat.st_mode) or stat.st_uid != uid \
+            or S_IMODE(stat.st_mode) & 0077:
+        raise IOError(
+            "The directory '%s' is not private to the current user." 
+            % directory
+        )
+    return directory
+
+
+def _makedirs(directory):
+    if not exists(directory):
+        try:
+            os.makedirs(directory, 0700)
+        except OSError:
+            # might have been created concurrently
+            if not exists(directory):
+                raise
 
 
 def get_instance_config_path():
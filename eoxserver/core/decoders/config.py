@@ -60,11 +60,30 @@ class Option(object):
 
     def __get__(self, reader, objtype=None):
         section = self.section or reader.section
+
+        # configuration snapshots provide a cache for the parsed values
+        cache = getattr(reader._config, "value_cache", None)
+        if cache is None:
+            return self._parse(reader._config, section)
+
+        key = (self, section)
+        try:
+            value = cache[key]
+        except KeyError:
+            value = cache[key] = self._parse(reader._config, section)
+
+        # prevent modifications of the cached value
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+
+    def _parse(self, config, section):
         try:
             if self.type is bool:
-                raw_value = reader._config.getboolean(section, self.key)
+                raw_value = config.getboolean(section, self.key)
             else:
-                raw_value = reader._config.get(section, self.key)
+                raw_value = config.get(section, self.key)
         except (NoOptionError, NoSectionError), e:
             if not self.required:
                 return self.default
@@ -27,8 +27,86 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+from itertools import islice
+from collections import defaultdict
 
 from django.contrib.gis.db import models
+from django.contrib.gis.db.models.query import GeoQuerySet
+
+
+# maximum number of objects casted with a single query per type. Keeps the
+# number of SQL variables below the limits of some database backends (SQLite).
+CAST_CHUNK_SIZE = 500
+
+
+def iter_cast_bulk(objects, chunk_size=CAST_CHUNK_SIZE):
+    """ Iterate over the given `Castable` objects (e.g a `QuerySet`) and yield
+        them casted to their actual types in the original order. Instead of 
+        one query per object (as with `Castable.cast()`), the objects are 
+        grouped by their real type and each group is fetched with a single 
+        query per chunk. The `cast_select_related` and `cast_prefetch_related`
+        attributes of the actual types are applied to these queries.
+    """
+
+    objects = iter(objects)
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            break
+
+        pks_by_type = defaultdict(list)
+        for obj in chunk:
+            real_type = obj.real_type
+            if real_type != type(obj):
+                pks_by_type[real_type].append(obj.pk)
+
+        casted = {}
+        for real_type, pks in pks_by_type.items():
+            qs = real_type.objects.filter(pk__in=pks)
+            if real_type.cast_select_related:
+                qs = qs.select_related(*real_type.cast_select_related)
+            if real_type.cast_prefetch_related:
+                qs = qs.prefetch_related(*real_type.cast_prefetch_related)
+
+            for obj in qs:
+                casted[obj.pk] = obj
+
+        for obj in chunk:
+            yield casted.get(obj.pk, obj)
+
+
+def cast_all(objects, chunk_size=CAST_CHUNK_SIZE):
+    """ Return a list of the given `Castable` objects casted to their actual
+        types. See `iter_cast_bulk` for details.
+    """
+    return list(iter_cast_bulk(objects, chunk_size))
+
+
+class CastableQuerySet(GeoQuerySet):
+    """ `QuerySet` for `Castable` models, adding bulk cast methods. 
+    """
+
+    def iter_cast_bulk(self, chunk_size=CAST_CHUNK_SIZE):
+        return iter_cast_bulk(self, chunk_size)
+
+    def cast_all(self, chunk_size=CAST_CHUNK_SIZE):
+        return cast_all(self, chunk_size)
+
+
+class CastableManager(models.GeoManager):
+    """ Manager for `Castable` models returning `CastableQuerySet` instances.
+    """
+
+    use_for_related_fields = True
+
+    def get_query_set(self):
+        return CastableQuerySet(self.model, using=self._db)
+
+    def iter_cast_bulk(self, chunk_size=CAST_CHUNK_SIZE):
+        return self.get_query_set().iter_cast_bulk(chunk_size)
+
+    def cast_all(self, chunk_size=CAST_CHUNK_SIZE):
+        return self.get_query_set().cast_all(chunk_size)
 
 
 class Castable(models.Model):
@@ -36,6 +114,10 @@ class Castable(models.Model):
         completed models can be retrieved.
     """
 
+    # related fields to be fetched along when casting objects in bulk
+    cast_select_related = ()
+    cast_prefetch_related = ()
+
     @property
     def real_type(self):
         # if not saved, use the actual type
@@ -27,6 +27,106 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
 import logging
+from stat import S_IMODE
+from tempfile import NamedTemporaryFile, mkdtemp
+from uuid import uuid4
 
 from django.test import TestCase
+
+from eoxserver.core.config import ConfigSnapshot, get_private_directory
+from eoxserver.core.decoders import config, typelist
+
+
+class SnapshotTestReader(config.Reader):
+    section = "test"
+    number = config.Option(type=int)
+    values = config.Option(type=typelist(str, ","), default=[])
+
+
+class ConfigSnapshotTestCase(TestCase):
+    """ Test class for the configuration snapshots and the cached reader 
+        values.
+    """
+
+    def setUp(self):
+        self.config_file = NamedTemporaryFile(suffix=".conf")
+        self.config_file.write("[test]\nnumber=12\nvalues=a,b\n")
+        self.config_file.flush()
+        self.snapshot = ConfigSnapshot([self.config_file.name], 1)
+
+    def tearDown(self):
+        self.config_file.close()
+
+    def test_cached_values(self):
+        reader = SnapshotTestReader(self.snapshot)
+        self.assertEqual(reader.number, 12)
+        self.assertEqual(len(self.snapshot.value_cache), 1)
+        
+        # a new reader on the same snapshot uses the cached values
+        reader = SnapshotTestReader(self.snapshot)
+        self.assertEqual(reader.number, 12)
+        self.assertEqual(len(self.snapshot.value_cache), 1)
+
+    def test_cached_lists_are_copied(self):
+        reader = SnapshotTestReader(self.snapshot)
+        reader.values.append("c")
+        self.assertEqual(reader.values, ["a", "b"])
+
+    def test_immutable(self):
+        self.assertRaises(TypeError, self.snapshot.set, "test", "number", "1")
+        self.assertRaises(TypeError, self.snapshot.add_section, "other")
+
+    def test_stamp(self):
+        # the stamp is independent of the process local version
+        self.assertEqual(
+            self.snapshot.stamp, 
+            ConfigSnapshot([self.config_file.name], 2).stamp
+        )
+        self.assertEqual(
+            os.stat(self.config_file.name).st_mtime, self.snapshot.modified
+        )
+
+        # modifications of the files result in a new stamp
+        self.config_file.write("other=1\n")
+        self.config_file.flush()
+        os.utime(self.config_file.name, (999999999, 999999999))
+        self.assertNotEqual(
+            self.snapshot.stamp, 
+            ConfigSnapshot([self.config_file.name], 1).stamp
+        )
+
+
+class PrivateDirectoryTestCase(TestCase):
+    """ Test class for the default directories of the caches.
+    """
+
+    def test_default_directory(self):
+        name = "test-%s" % uuid4().hex
+        directory = get_private_directory(name)
+        try:
+            self.assertEqual(S_IMODE(os.stat(directory).st_mode), 0700)
+            self.assertEqual(os.stat(directory).st_uid, os.getuid())
+            self.assertTrue(directory.endswith("-%d" % os.getuid()))
+
+            # an existing directory is reused
+            self.assertEqual(get_private_directory(name), directory)
+
+            # directories writable by others are rejected
+            os.chmod(directory, 0777)
+            self.assertRaises(IOError, get_private_directory, name)
+        finally:
+            os.rmdir(directory)
+
+    def test_configured_directory(self):
+        parent = mkdtemp()
+        directory = os.path.join(parent, "cache")
+        try:
+            self.assertEqual(
+                get_private_directory("test", directory), directory
+            )
+            self.assertTrue(os.path.isdir(directory))
+        finally:
+            os.rmdir(directory)
+            os.rmdir(parent)
@@ -268,6 +268,29 @@ def capitalize_header(key):
     ])
 
 
+def parse_header_bytes(header_bytes):
+    """ Parses the given header section into a ``dict`` with capitalized keys.
+        Empty lines are skipped.
+    """
+    headers = {}
+    for line in header_bytes.split(CRLF):
+        key, _, value = line.partition(":")
+        key = key.strip()
+        if key:
+            headers[capitalize_header(key)] = value.strip()
+    return headers
+
+
+def get_content_length(headers):
+    """ Returns the "Content-Length" of the given headers as an integer or
+        ``None`` if it is not set or invalid.
+    """
+    length = headers.get("Content-Length", "").strip()
+    if length.isdigit():
+        return int(length)
+    return None
+
+
 def iterate(data, offset=0, end=None, headers=None):
     """ Efficient generator function to iterate over a single- or multipart 
         message. I yields tuples in the shape (``headers``, ``data``), where 
@@ -275,6 +298,10 @@ def iterate(data, offset=0, end=None, headers=None):
         of the original content. In case of multipart messages, the multipart 
         headers are yielded beforehand, with an empty string as data.
 
+        Only the header sections are actually parsed: when a part announces 
+        its "Content-Length", its payload is skipped without being scanned for
+        the next boundary. The payloads themselves are never copied.
+
         The `offset` parameter specifies the offset index to the start of the 
         data. This is mostly used in the recursive call. The same applies to the
         `end` parameter.
@@ -286,7 +313,7 @@ def iterate(data, offset=0, end=None, headers=None):
     """
 
     # check if the headers need to be parsed.
-    if not headers:
+    if headers is None:
         # read the header bytes from the string and get the new offset.
         header_bytes, offset = get_substring(data, CRLFCRLF, offset, end)
 
@@ -295,10 +322,7 @@ def iterate(data, offset=0, end=None, headers=None):
             return
 
         # parse the headers into a dict
-        headers = {}
-        for line in header_bytes.split(CRLF):
-            key, _, value = line.partition(":")
-            headers[capitalize_header(key.strip())] = value.strip()
+        headers = parse_header_bytes(header_bytes)
 
     # get the content type
     content_type, params = parse_parametrized_option(
@@ -314,7 +338,9 @@ def iterate(data, offset=0, end=None, headers=None):
         boundary = "%s--%s" % (CRLF, params["boundary"])
         end_boundary = "%s--" % boundary
 
-        sub_end = data.find(end_boundary)
+        # the end boundary terminates the message, so search it backwards to
+        # avoid scanning the whole payload
+        sub_end = data.rfind(end_boundary, offset, end)
         if sub_end == -1:
             raise ValueError("Could not find multipart end.")
 
@@ -325,14 +351,41 @@ def iterate(data, offset=0, end=None, headers=None):
 
         # iterate over all parts until we reach the end of the multipart
         while sub_offset < sub_end:
-            sub_offset += len(boundary) + 1
-            sub_stop = data.find(boundary, sub_offset, sub_end)
-            
+            # skip the boundary and its line break
+            sub_offset += len(boundary)
+            if data.startswith(CRLF, sub_offset):
+                sub_offset += len(CRLF)
+            elif data.startswith("\n", sub_offset):
+                sub_offset += 1
+
+            # read the part headers
+            if data.startswith(CRLF, sub_offset):
+                sub_headers, payload_offset = {}, sub_offset + len(CRLF)
+            else:
+                header_bytes, payload_offset = get_substring(
+                    data, CRLFCRLF, sub_offset, sub_end
+                )
+                if header_bytes is None:
+                    raise ValueError("Could not find part headers.")
+                sub_headers = parse_header_bytes(header_bytes)
+
+            # use the announced length of the part if it is consistent with
+            # the next boundary, otherwise scan for the boundary
+            sub_stop = -1
+            length = get_content_length(sub_headers)
+            if length is not None:
+                sub_stop = payload_offset + length
+                if sub_stop > sub_end or not data.startswith(boundary, sub_stop):
+                    sub_stop = -1
+
+            if sub_stop == -1:
+                sub_stop = data.find(boundary, payload_offset, sub_end)
+
             sub_stop = sub_stop if sub_stop > -1 else sub_end
 
             # recursive function call
-            for sub_headers, sub_data in iterate(data, sub_offset, sub_stop):
-                yield sub_headers, sub_data
+            for item in iterate(data, payload_offset, sub_stop, sub_headers):
+                yield item
 
             sub_offset = sub_stop
 
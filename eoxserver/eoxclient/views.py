@@ -30,6 +30,9 @@
 import json
 from django.http import HttpResponse
 from eoxserver.core.config import get_eoxserver_config
+from eoxserver.services.result import (
+    get_etag, is_not_modified, not_modified_response, set_validators
+)
 from eoxserver.eoxclient import models
 from eoxserver.eoxclient.view_utils import error_handler, method_allow
 
@@ -91,6 +94,14 @@ def data_json(request):
     qset = models.ClientLayer.objects.all()
     qset = qset.order_by('order', 'id')
     qset = qset.prefetch_related('eoobj')
-    return HttpResponse(layers2json(qset, JSON_OPTS),
-                                          content_type="application/json")
+    content = layers2json(qset, JSON_OPTS)
+
+    # the client layers are not tracked by the catalog journal, so the entity
+    # tag is derived from the content itself
+    etag = get_etag(content)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    return set_validators(
+        HttpResponse(content, content_type="application/json"), etag
+    )
 
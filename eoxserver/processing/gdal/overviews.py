@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Selection of overview levels for reduced resolution reads.
+
+When an image is requested at a lower resolution than the one of the source
+data, reading from an overview (internal, external ".ovr" or the overviews 
+of a cached VRT) costs I/O proportional to the output size instead of the 
+source size. Which level is read is governed by a policy that can be set in
+the configuration::
+
+    [processing.gdal]
+    # AUTO:    the coarsest overview still at least as fine as the requested
+    #          resolution
+    # AUTO-<n>: <n> levels finer than AUTO, for more accurate results
+    # NONE:    always read the full resolution data
+    overview_policy=AUTO
+"""
+
+import re
+from math import floor
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.core.util.rect import Rect
+
+
+# tolerance for rounding differences of the overview sizes 
+EPSILON = 1e-6
+
+_policy_re = re.compile(r"^AUTO(?:-(\d+))?$")
+
+
+class OverviewConfigReader(config.Reader):
+    section = "processing.gdal"
+    overview_policy = config.Option(default="AUTO")
+
+
+def parse_overview_policy(value):
+    """ Parses an overview policy. Returns the number of levels to step back 
+        from the best matching overview or ``None`` if no overviews shall be 
+        used.
+    """
+    value = value.strip().upper()
+    if value == "NONE":
+        return None
+
+    match = _policy_re.match(value)
+    if not match:
+        raise ValueError("Invalid overview policy '%s'." % value)
+    return int(match.group(1) or 0)
+
+
+def get_overview_policy():
+    """ Returns the parsed overview policy of the configuration.
+    """
+    return parse_overview_policy(
+        OverviewConfigReader(get_eoxserver_config()).overview_policy
+    )
+
+
+def get_overview_level(band, src_size, dst_size, policy=0):
+    """ Returns the index of the overview of `band` to read an area of 
+        `src_size` (in pixels of the full resolution) to an image of 
+        `dst_size`, or ``None`` if the full resolution shall be read.
+    """
+    if policy is None or not band.GetOverviewCount():
+        return None
+
+    factor = min(
+        float(src_size[0]) / dst_size[0], float(src_size[1]) / dst_size[1]
+    )
+
+    overviews = []
+    for index in xrange(band.GetOverviewCount()):
+        overview = band.GetOverview(index)
+        overviews.append((min(
+            float(band.XSize) / overview.XSize, 
+            float(band.YSize) / overview.YSize
+        ), index))
+    overviews.sort()
+
+    # overviews that are at least as fine as the requested resolution
+    candidates = [
+        index for ov_factor, index in overviews 
+        if ov_factor <= factor * (1 + EPSILON)
+    ]
+    position = len(candidates) - 1 - policy
+    if position < 0:
+        return None
+    return candidates[position]
+
+
+def get_overview_rect(band, level, rect):
+    """ Translates a pixel rectangle of the full resolution of `band` to the
+        pixel space of the given overview level.
+    """
+    overview = band.GetOverview(level)
+    factor_x = float(band.XSize) / overview.XSize
+    factor_y = float(band.YSize) / overview.YSize
+
+    offset_x = int(floor(rect.offset_x / factor_x + 0.5))
+    offset_y = int(floor(rect.offset_y / factor_y + 0.5))
+    return Rect(
+        offset_x, offset_y,
+        max(1, min(
+            int(floor(rect.size_x / factor_x + 0.5)), overview.XSize - offset_x
+        )),
+        max(1, min(
+            int(floor(rect.size_y / factor_y + 0.5)), overview.YSize - offset_y
+        ))
+    )
+
+
+def get_mapserver_processing(policy):
+    """ Returns the MapServer raster processing directives approximating the
+        overview policy. MapServer selects the overviews itself via GDAL; the
+        directives only influence the resolution of the intermediate image
+        when resampling.
+    """
+    if policy is None:
+        return ["LOAD_FULL_RES_IMAGE=YES"]
+    elif policy > 0:
+        # the default oversampling ratio of MapServer is 2
+        return ["OVERSAMPLE_RATIO=%d" % (2 ** (policy + 1))]
+    return []
@@ -0,0 +1,176 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Process wide pool of open, read-only GDAL datasets.
+
+Opening a dataset with GDAL re-reads its header structures (e.g: TIFF 
+directories, overviews and GCPs) every time, which is expensive for large files
+and for remote or archived files (`/vsicurl/`, `/vsizip/`). The pool keeps 
+idle dataset handles open and hands them out again for the same path and open
+options. As GDAL dataset handles must not be used concurrently, a handle is 
+only used by a single thread at a time; more handles for the same file are 
+opened on demand. Handles are revalidated by the modification time and size of
+the file and the least recently used idle handles are closed when the pool 
+exceeds its size.
+
+Usage::
+
+    with dataset_pool.open(path) as ds:
+        ...
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from eoxserver.contrib import gdal
+
+
+logger = logging.getLogger(__name__)
+
+# maximum number of idle dataset handles kept open
+MAX_POOL_SIZE = 64
+
+
+def get_stamp(path):
+    """ Returns a tuple (modification time, size) of the given file or ``None``
+        if it cannot be determined.
+    """
+    if path.startswith("/vsi"):
+        try:
+            stat = gdal.VSIStatL(path)
+        except (AttributeError, RuntimeError):
+            return None
+        if stat is None:
+            return None
+        return (stat.mtime, stat.size)
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def is_poolable(path):
+    """ In-memory files are usually temporary and thus not pooled.
+    """
+    return not path.startswith("/vsimem/")
+
+
+class DatasetPool(object):
+    """ Pool of open read-only GDAL datasets keyed by their path and open 
+        options.
+    """
+
+    def __init__(self, max_size=MAX_POOL_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # idle handles in LRU order: (key, id(ds)) -> (ds, stamp)
+        self._idle = OrderedDict()
+        # handles currently handed out: id(ds) -> (key, stamp, ds)
+        self._in_use = {}
+
+    def acquire(self, path, open_options=None):
+        """ Returns an open dataset for the given path which has to be 
+            returned to the pool with `release` after usage.
+        """
+        if not isinstance(path, basestring):
+            path = str(path)
+        if not is_poolable(path):
+            return _open(path, open_options)
+
+        key = (path, tuple(sorted((open_options or {}).items())))
+        stamp = get_stamp(path)
+
+        with self._lock:
+            for idle_key in reversed(self._idle.keys()):
+                if idle_key[0] != key:
+                    continue
+                ds, idle_stamp = self._idle.pop(idle_key)
+                if idle_stamp == stamp:
+                    self._in_use[id(ds)] = (key, stamp, ds)
+                    return ds
+                logger.debug("Discarding outdated dataset handle '%s'." % path)
+
+        ds = _open(path, open_options)
+        with self._lock:
+            self._in_use[id(ds)] = (key, stamp, ds)
+        return ds
+
+    def release(self, ds):
+        """ Returns a dataset acquired by `acquire` to the pool. Datasets not 
+            acquired from the pool are simply dropped.
+        """
+        with self._lock:
+            entry = self._in_use.pop(id(ds), None)
+            if entry is None:
+                return
+
+            key, stamp, _ = entry
+            if stamp is None:
+                # handles that cannot be revalidated are not kept
+                return
+
+            self._idle[(key, id(ds))] = (ds, stamp)
+            while len(self._idle) > self.max_size:
+                self._idle.popitem(last=False)
+
+    @contextmanager
+    def open(self, path, open_options=None):
+        """ Context manager to acquire and release a dataset.
+        """
+        ds = self.acquire(path, open_options)
+        try:
+            yield ds
+        finally:
+            self.release(ds)
+
+    def clear(self):
+        """ Closes all idle dataset handles.
+        """
+        with self._lock:
+            self._idle.clear()
+
+    def __len__(self):
+        return len(self._idle)
+
+
+def _open(path, open_options=None):
+    if open_options:
+        return gdal.OpenEx(
+            path, gdal.OF_RASTER | gdal.OF_READONLY, open_options=[
+                "%s=%s" % item for item in sorted(open_options.items())
+            ]
+        )
+    return gdal.Open(path)
+
+
+# the process wide dataset pool
+dataset_pool = DatasetPool()
@@ -0,0 +1,410 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Persistent cache of the geo-referencing of referenceable datasets.
+
+The pixel to geo transformation of a referenceable dataset is given by its 
+tie-points (GCPs). Fitting a transformer (e.g: a thin plate spline) on 
+thousands of tie-points is expensive and used to be repeated for every 
+request. For each dataset file, this module caches
+
+ * the suggested transformer parameters (see `reftools.suggest_transformer`)
+ * the footprint derived with these parameters
+ * a regular grid of tie-points sampled from the fitted transformer. The grid
+   approximates the transformation with a few hundred points, so a 
+   transformer fitted on it is cheap to create.
+
+The entries are kept in memory and stored as VRT files in the configured 
+directory. They are keyed by the path of the dataset and invalidated by its
+modification time and size::
+
+    [processing.gdal.reftools]
+    cache_directory=/var/eoxserver/reftools
+    # number of grid cells along each image axis
+    grid_size=16
+
+If no directory is configured, a directory private to the user of the server 
+process is created in the temporary directory.
+
+The VRT files reference the bands of the original dataset and carry the grid 
+as their GCPs, so they can be rectified directly.
+
+The warping of the rectified VRTs is configured in the same section::
+
+    [processing.gdal.reftools]
+    # number of warping threads or ALL_CPUS
+    warp_threads=ALL_CPUS
+    # warp memory in MiB
+    warp_memory_limit=256
+    # size of the chunks warped at once
+    warp_block_size=512,512
+    # error threshold of the approximating transformer in pixels (0: exact)
+    max_error=0.125
+"""
+
+import os
+from os.path import dirname, exists, join
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from uuid import uuid4
+
+from eoxserver.core.config import get_eoxserver_config, get_private_directory
+from eoxserver.core.decoders import config
+from eoxserver.contrib import gdal
+from eoxserver.contrib.vrt import VRTBuilder
+from eoxserver.processing.gdal import reftools
+from eoxserver.processing.gdal.pool import dataset_pool, get_stamp, is_poolable
+from eoxserver.processing.gdal.vrt import create_simple_vrt
+
+
+logger = logging.getLogger(__name__)
+
+# transformer fitted on the grid of tie-points
+GRID_METHOD = reftools.METHOD_TPS
+GRID_ORDER = 1
+
+# metadata domain of the cache entries in the VRT files
+METADATA_DOMAIN = "EOXS_REFERENCE"
+
+# maximum number of entries kept in memory
+MAX_ENTRIES = 256
+
+
+class RefCacheConfigReader(config.Reader):
+    section = "processing.gdal.reftools"
+    cache_directory = config.Option(default=None)
+    grid_size = config.Option(type=int, default=16)
+
+
+class WarpConfigReader(config.Reader):
+    section = "processing.gdal.reftools"
+    warp_threads = config.Option(default=None)
+    warp_memory_limit = config.Option(type=float, default=0.0)
+    warp_block_size = config.Option(type=int, separator=",", default=None)
+    max_error = config.Option(type=float, default=reftools.APPROX_ERR_TOL)
+
+
+class GeoReference(object):
+    """ Cached geo-referencing of a referenceable dataset.
+    """
+
+    def __init__(self, path, stamp, method, order, footprint_wkt, 
+                 projection, size, grid=None, vrt_path=None):
+        self.path = path
+        self.stamp = stamp
+        self.method = method
+        self.order = order
+        self.footprint_wkt = footprint_wkt
+        self.projection = projection
+        self.size = size
+        # list of tuples (pixel, line, x, y) or None
+        self.grid = grid
+        self.vrt_path = vrt_path
+
+    @property
+    def transformer_options(self):
+        return {"method": self.method, "order": self.order}
+
+    def get_grid_dataset(self, rect=None):
+        """ Returns an in-memory dataset (without bands) for the image or the
+            given window of it, which is geo-referenced by the grid.
+        """
+        offset_x, offset_y = (rect.offset_x, rect.offset_y) if rect else (0, 0)
+        size = rect.size if rect else self.size
+
+        builder = VRTBuilder(*size)
+        builder.dataset.SetGCPs([
+            gdal.GCP(x, y, 0, pixel - offset_x, line - offset_y)
+            for pixel, line, x, y in self.grid
+        ], self.projection)
+        return builder.dataset
+
+
+def format_stamp(stamp):
+    return "%r;%r" % stamp
+
+
+def get_cache_directory():
+    return get_private_directory(
+        "reftools", RefCacheConfigReader(get_eoxserver_config()).cache_directory
+    )
+
+
+def get_vrt_path(path, directory=None):
+    """ Returns the path of the cached VRT for the dataset at the given path.
+        Unless another `directory` is given, the VRT is located in the 
+        configured cache directory.
+    """
+    if isinstance(path, unicode):
+        path = path.encode("utf-8")
+    return join(
+        directory or get_cache_directory(), 
+        "%s.vrt" % hashlib.sha1(path).hexdigest()
+    )
+
+
+@contextmanager
+def _open_ds(path_or_ds):
+    if isinstance(path_or_ds, basestring):
+        with dataset_pool.open(path_or_ds) as ds:
+            yield ds
+    else:
+        yield path_or_ds
+
+
+def _get_path(path_or_ds):
+    if isinstance(path_or_ds, basestring):
+        return path_or_ds
+    return path_or_ds.GetDescription() or None
+
+
+class GeoReferenceCache(object):
+    """ Cache of `GeoReference` objects, backed by the VRT files. The VRT 
+        files are stored in the given `directory` or in the configured cache 
+        directory.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, path_or_ds):
+        """ Returns the `GeoReference` for the given dataset or path or 
+            ``None`` if the dataset cannot be cached (e.g: temporary files).
+        """
+        path = _get_path(path_or_ds)
+        if not path or not is_poolable(path):
+            return None
+
+        stamp = get_stamp(path)
+        if stamp is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None and entry.stamp == stamp:
+                self._entries[path] = entry
+                return entry
+
+        entry = self._load(path, stamp) or self._build(path_or_ds, path, stamp)
+
+        with self._lock:
+            self._entries[path] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, path, stamp):
+        vrt_path = get_vrt_path(path, self.directory)
+        if not exists(vrt_path):
+            return None
+
+        try:
+            ds = gdal.Open(vrt_path)
+        except RuntimeError:
+            return None
+
+        metadata = ds.GetMetadata(METADATA_DOMAIN) or {}
+        if metadata.get("SOURCE_STAMP") != format_stamp(stamp):
+            return None
+
+        grid = None
+        if metadata.get("GRID") == "YES":
+            grid = [
+                (gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY) 
+                for gcp in ds.GetGCPs()
+            ]
+        return GeoReference(
+            path, stamp, int(metadata["METHOD"]), int(metadata["ORDER"]),
+            metadata["FOOTPRINT"], ds.GetGCPProjection(), 
+            (ds.RasterXSize, ds.RasterYSize), grid, 
+            vrt_path if grid else None
+        )
+
+    def _build(self, path_or_ds, path, stamp):
+        logger.debug("Deriving the geo-reference of '%s'." % path)
+        grid_size = RefCacheConfigReader(get_eoxserver_config()).grid_size
+
+        with _open_ds(path_or_ds) as ds:
+            options = reftools.suggest_transformer(ds)
+            footprint_wkt = reftools.get_footprint_wkt(ds, **options)
+            try:
+                grid = reftools.sample_grid(ds, grid_size, grid_size, **options)
+            except reftools.ReftoolsException, e:
+                logger.warning(str(e))
+                grid = None
+
+            entry = GeoReference(
+                path, stamp, options["method"], options["order"], 
+                footprint_wkt, ds.GetGCPProjection(), 
+                (ds.RasterXSize, ds.RasterYSize), grid
+            )
+
+            try:
+                entry.vrt_path = self._store(ds, entry)
+            except Exception, e:
+                logger.warning(
+                    "Failed to store the geo-reference of '%s': %s" 
+                    % (path, e)
+                )
+        return entry
+
+    def _store(self, ds, entry):
+        vrt_path = get_vrt_path(entry.path, self.directory)
+
+        # build the VRT in a temporary file and move it in place afterwards,
+        # so that concurrent requests never see incomplete files
+        tmp_path = join(dirname(vrt_path), "tmp_%s.vrt" % uuid4().hex)
+        try:
+            vrt_ds = create_simple_vrt(ds, tmp_path)
+            if entry.grid:
+                vrt_ds.SetGCPs([
+                    gdal.GCP(x, y, 0, pixel, line)
+                    for pixel, line, x, y in entry.grid
+                ], entry.projection)
+            vrt_ds.SetMetadata({
+                "SOURCE_STAMP": format_stamp(entry.stamp),
+                "METHOD": str(entry.method),
+                "ORDER": str(entry.order),
+                "FOOTPRINT": entry.footprint_wkt,
+                "GRID": "YES" if entry.grid else "NO"
+            }, METADATA_DOMAIN)
+            vrt_ds = None
+            os.rename(tmp_path, vrt_path)
+        finally:
+            if exists(tmp_path):
+                os.remove(tmp_path)
+
+        return vrt_path if entry.grid else None
+
+
+# the process wide cache
+georeference_cache = GeoReferenceCache()
+
+
+def get_transformer_options(path_or_ds):
+    """ Returns the suggested transformer options of the dataset.
+    """
+    entry = georeference_cache.get(path_or_ds)
+    if entry is not None:
+        return entry.transformer_options
+
+    with _open_ds(path_or_ds) as ds:
+        return reftools.suggest_transformer(ds)
+
+
+def get_footprint_wkt(path_or_ds, rect=None):
+    """ Returns the footprint of the dataset or of the given pixel window of 
+        it as WKT.
+    """
+    entry = georeference_cache.get(path_or_ds)
+    if entry is not None:
+        if rect is None:
+            return entry.footprint_wkt
+        if entry.grid:
+            return reftools.get_footprint_wkt(
+                entry.get_grid_dataset(rect), GRID_METHOD, GRID_ORDER
+            )
+
+    with _open_ds(path_or_ds) as ds:
+        if entry is not None:
+            options = entry.transformer_options
+        else:
+            options = reftools.suggest_transformer(ds)
+
+        if rect is not None:
+            builder = VRTBuilder(*rect.size)
+            builder.copy_gcps(ds, rect.offset)
+            ds = builder.dataset
+
+        return reftools.get_footprint_wkt(ds, **options)
+
+
+def rect_from_subset(path_or_ds, srid, minx, miny, maxx, maxy):
+    """ Returns the pixel rectangle of the dataset covering the given subset.
+    """
+    entry = georeference_cache.get(path_or_ds)
+    if entry is not None and entry.grid:
+        return reftools.rect_from_subset(
+            entry.get_grid_dataset(), srid, minx, miny, maxx, maxy,
+            GRID_METHOD, GRID_ORDER
+        )
+
+    with _open_ds(path_or_ds) as ds:
+        if entry is not None:
+            options = entry.transformer_options
+        else:
+            options = reftools.suggest_transformer(ds)
+
+        builder = VRTBuilder(ds.RasterXSize, ds.RasterYSize)
+        builder.copy_gcps(ds)
+        return reftools.rect_from_subset(
+            builder.dataset, srid, minx, miny, maxx, maxy, **options
+        )
+
+
+def get_warp_options():
+    """ Returns the configured warp options as keyword arguments for 
+        `reftools.create_rectified_vrt`.
+    """
+    reader = WarpConfigReader(get_eoxserver_config())
+    block_size = reader.warp_block_size
+    if block_size and len(block_size) == 1:
+        block_size = block_size * 2
+
+    return {
+        "num_threads": reader.warp_threads or None,
+        "memory_limit": reader.warp_memory_limit * 1024 * 1024,
+        "block_size": tuple(block_size) if block_size else None,
+        "max_error": reader.max_error
+    }
+
+
+def create_rectified_vrt(path_or_ds, vrt_path, srid=None, **kwargs):
+    """ Creates a rectified VRT of the dataset. If available, the cached VRT
+        geo-referenced by the grid is rectified instead of the dataset itself.
+        Warp options not passed explicitly are taken from the configuration.
+    """
+    options = get_warp_options()
+    options.update(kwargs)
+    kwargs = options
+
+    entry = georeference_cache.get(path_or_ds)
+    if entry is not None and entry.vrt_path:
+        kwargs.update(method=GRID_METHOD, order=GRID_ORDER)
+        path_or_ds = entry.vrt_path
+
+    reftools.create_rectified_vrt(path_or_ds, vrt_path, srid, **kwargs)
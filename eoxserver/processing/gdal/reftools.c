@@ -438,6 +438,65 @@ CPLErr eoxs_get_footprint_wkt(GDALDatasetH ds, int method, int order, char **out
     return CE_None;
 }
 
+/* Samples the pixel to geo transformation of the dataset on a regular grid 
+   of (n_x + 1) x (n_y + 1) nodes spanning the whole image. The output arrays 
+   must hold all nodes and are filled row by row, starting at the upper left
+   image corner. */
+CPLErr eoxs_sample_grid(GDALDatasetH ds, int method, int order, int n_x, int n_y, double *out_x, double *out_y) {
+    void *transformer;
+    int x_size, y_size;
+    int n_points, i, j, k;
+    double *z;
+    int *success;
+
+    if (!ds) {
+        CPLError(CE_Failure, CPLE_ObjectNull, "No dataset passed.");
+        return CE_Failure;
+    }
+
+    else if ( 0 == GDALGetGCPCount(ds) ) {
+        CPLError(CE_Failure, CPLE_IllegalArg, "The given dataset has no GCPs.");
+        return CE_Failure; 
+    }
+
+    else if (( n_x < 1 )||( n_y < 1 )) {
+        CPLError(CE_Failure, CPLE_IllegalArg, "Invalid grid size! N_X=%d N_Y=%d", n_x, n_y);
+        return CE_Failure; 
+    }
+
+    x_size = GDALGetRasterXSize(ds);
+    y_size = GDALGetRasterYSize(ds);
+
+    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
+
+    if (!transformer) {
+        if (CPLGetLastErrorMsg() == NULL) {
+            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
+        }
+        return CE_Failure; 
+    }
+
+    n_points = (n_x + 1) * (n_y + 1);
+    z = calloc(n_points, sizeof(double));
+    success = malloc(sizeof(int) * n_points);
+
+    for (j = 0, k = 0; j <= n_y; j++) {
+        for (i = 0; i <= n_x; i++, k++) {
+            out_x[k] = (double) i * x_size / n_x;
+            out_y[k] = (double) j * y_size / n_y;
+        }
+    }
+
+    /* for TPS and GCP methods returns always true */
+    GDALUseTransformer(transformer, FALSE, n_points, out_x, out_y, z, success);
+
+    free(z);
+    free(success);
+    GDALDestroyTransformer(transformer);
+
+    return CE_None;
+}
+
 double eoxs_array_min(int n, double *c) {
     double min_value;
     int i;
@@ -658,12 +717,16 @@ CPLErr eoxs_rect_from_subset(GDALDatasetH ds, EOXS_SUBSET *subset, int method, i
     return CE_None;
 }
 
-CPLErr eoxs_create_rectified_vrt(GDALDatasetH ds, const char *vrt_filename,
+/* Creates a rectified (warped) VRT. The optional papszWarpOptions (e.g. 
+   NUM_THREADS=ALL_CPUS for multithreaded warping) are merged into the options
+   of the warper. */
+CPLErr eoxs_create_rectified_vrt_ex(GDALDatasetH ds, const char *vrt_filename,
                             int srid, // TODO: make it work with srs_wkt 
                             GDALResampleAlg eResampleAlg, 
                             double dfWarpMemoryLimit, 
                             double dfMaxError,
-                            int method, int order)
+                            int method, int order,
+                            char **papszWarpOptions)
 {
     GDALDatasetH vrt_ds;
     OGRSpatialReferenceH dst_srs;
@@ -736,6 +799,11 @@ CPLErr eoxs_create_rectified_vrt(GDALDatasetH ds, const char *vrt_filename,
     warp_options->pTransformerArg = transformer;            // pointer to the transfomer 
     warp_options->hSrcDS = ds ;                             // source dataset 
 
+    // additional warper options (e.g. number of threads)
+    if ( papszWarpOptions ) 
+        warp_options->papszWarpOptions = CSLMerge( 
+                warp_options->papszWarpOptions, papszWarpOptions ) ; 
+
     { 
         int i , j , nb ; 
 
@@ -833,6 +901,17 @@ CPLErr eoxs_create_rectified_vrt(GDALDatasetH ds, const char *vrt_filename,
     return ret ;
 }
 
+CPLErr eoxs_create_rectified_vrt(GDALDatasetH ds, const char *vrt_filename,
+                            int srid,
+                            GDALResampleAlg eResampleAlg, 
+                            double dfWarpMemoryLimit, 
+                            double dfMaxError,
+                            int method, int order)
+{
+    return eoxs_create_rectified_vrt_ex(ds, vrt_filename, srid, eResampleAlg,
+                dfWarpMemoryLimit, dfMaxError, method, order, NULL);
+}
+
 /* Thin wrapper for GDALSuggestedWarpOutput which allows the setting of the order. */
 CPLErr eoxs_suggested_warp_output(GDALDatasetH ds, 
                                   const char *src_wkt, /* can be NULL */
@@ -861,14 +940,15 @@ CPLErr eoxs_suggested_warp_output(GDALDatasetH ds,
 
 
 /* original source copied from gdalwarper.cpp - some mods have been made though */
-CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
+CPLErr eoxs_reproject_image_ex(GDALDatasetH hSrcDS,
                             const char *pszSrcWKT, 
                             GDALDatasetH hDstDS,
                             const char *pszDstWKT,
                             GDALResampleAlg eResampleAlg, 
                             double dfWarpMemoryLimit, 
                             double dfMaxError,
-                            int method, int order) 
+                            int method, int order,
+                            char **papszWarpOptions) 
 {
     
     GDALWarpOptions *psWOptions;
@@ -890,6 +970,11 @@ CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
     psWOptions->eResampleAlg = eResampleAlg;
     psWOptions->dfWarpMemoryLimit = dfWarpMemoryLimit ;   // warp memory limit 
 
+    // additional warper options (e.g. number of threads)
+    if ( papszWarpOptions ) 
+        psWOptions->papszWarpOptions = CSLMerge( 
+                psWOptions->papszWarpOptions, papszWarpOptions ) ; 
+
 /* -------------------------------------------------------------------- */
 /*      Set transform.                                                  */
 /* -------------------------------------------------------------------- */
@@ -982,7 +1067,14 @@ CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
     GDALWarpOperationH  hWarper = GDALCreateWarpOperation( psWOptions );
     CPLErr eErr = CE_Failure;
 
-    if( hWarper )
+    // when multithreading is requested also overlap the I/O with the 
+    // computation of the chunks
+    if( hWarper && CSLFetchNameValue( psWOptions->papszWarpOptions, 
+                                      "NUM_THREADS" ) )
+        eErr = GDALChunkAndWarpMulti( hWarper, 0, 0, 
+                                      GDALGetRasterXSize(hDstDS),
+                                      GDALGetRasterYSize(hDstDS) );
+    else if( hWarper )
         eErr = GDALChunkAndWarpImage( hWarper, 0, 0, 
                                       GDALGetRasterXSize(hDstDS),
                                       GDALGetRasterYSize(hDstDS) );
@@ -990,6 +1082,9 @@ CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
 /* -------------------------------------------------------------------- */
 /*      Cleanup.                                                        */
 /* -------------------------------------------------------------------- */
+    if( hWarper )
+        GDALDestroyWarpOperation( hWarper );
+
     GDALDestroyGenImgProjTransformer( hTransformArg );
 
     if( dfMaxError > 0.0 )
@@ -999,3 +1094,17 @@ CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
 
     return eErr;
 }
+
+CPLErr eoxs_reproject_image(GDALDatasetH hSrcDS,
+                            const char *pszSrcWKT, 
+                            GDALDatasetH hDstDS,
+                            const char *pszDstWKT,
+                            GDALResampleAlg eResampleAlg, 
+                            double dfWarpMemoryLimit, 
+                            double dfMaxError,
+                            int method, int order) 
+{
+    return eoxs_reproject_image_ex(hSrcDS, pszSrcWKT, hDstDS, pszDstWKT, 
+                eResampleAlg, dfWarpMemoryLimit, dfMaxError, method, order,
+                NULL);
+}
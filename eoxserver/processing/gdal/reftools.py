@@ -32,8 +32,10 @@ import os.path
 import logging
 
 from functools import wraps 
+from contextlib import contextmanager
 
 from eoxserver.contrib import gdal
+from eoxserver.processing.gdal.pool import dataset_pool
 from eoxserver.core.util.rect import Rect
 
 #-------------------------------------------------------------------------------
@@ -129,6 +131,27 @@ try:
     _free_string = _lib.eoxs_free_string
     _free_string.argtypes = [C.c_char_p]
 
+    try:
+        _sample_grid = _lib.eoxs_sample_grid
+        _sample_grid.argtypes = [C.c_void_p, C.c_int, C.c_int, C.c_int, C.c_int, C.POINTER(C.c_double), C.POINTER(C.c_double)]
+        _sample_grid.restype = C.c_int
+    except AttributeError:
+        # library compiled from an older version of reftools.c
+        _sample_grid = None
+
+    try:
+        _create_rectified_vrt_ex = _lib.eoxs_create_rectified_vrt_ex
+        _create_rectified_vrt_ex.argtypes = [C.c_void_p, C.c_char_p, C.c_int, C.c_int, C.c_double, C.c_double, C.c_int, C.c_int, C.POINTER(C.c_char_p)]
+        _create_rectified_vrt_ex.restype = C.c_int
+
+        _reproject_image_ex = _lib.eoxs_reproject_image_ex
+        _reproject_image_ex.argtypes = [C.c_void_p, C.c_char_p, C.c_void_p, C.c_char_p, C.c_int, C.c_double, C.c_double, C.c_int, C.c_int, C.POINTER(C.c_char_p)]
+        _reproject_image_ex.restype = C.c_int
+    except AttributeError:
+        # library compiled from an older version of reftools.c
+        _create_rectified_vrt_ex = None
+        _reproject_image_ex = None
+
     REFTOOLS_USABLE = True
 
 except OSError:
@@ -137,11 +160,66 @@ except OSError:
     REFTOOLS_USABLE = False
 
 
+@contextmanager
 def _open_ds(path_or_ds):
+    """ Context manager yielding the given dataset or a pooled dataset for the
+        given path.
+    """
     if isinstance(path_or_ds, basestring):
-        gdal.AllRegister()
-        return gdal.Open(str(path_or_ds))
-    return path_or_ds
+        with dataset_pool.open(path_or_ds) as ds:
+            yield ds
+    else:
+        yield path_or_ds
+
+
+def _get_warp_options(num_threads=None):
+    """ Returns the additional warper options as a NULL terminated C string 
+        list or ``None`` if no options are set. ``num_threads`` is either the 
+        number of threads or "ALL_CPUS".
+    """
+    options = []
+    if num_threads:
+        options.append("NUM_THREADS=%s" % num_threads)
+
+    if not options:
+        return None
+
+    return (C.c_char_p * (len(options) + 1))(*(options + [None]))
+
+
+def _set_vrt_block_size(vrt_path, block_size):
+    """ Sets the block size of a warped VRT, which is the size of the chunks
+        that are warped at once when the VRT is read. The VRT is accessed 
+        through the VSI layer, as it may reside in ``/vsimem``.
+    """
+    from xml.etree import ElementTree as ET
+
+    def vsi_open(mode):
+        handle = gdal.VSIFOpenL(vrt_path, mode)
+        if handle is None:
+            raise IOError("Could not open '%s'." % vrt_path)
+        return handle
+
+    handle = vsi_open("rb")
+    try:
+        content = gdal.VSIFReadL(1, gdal.VSIStatL(vrt_path).size, handle)
+    finally:
+        gdal.VSIFCloseL(handle)
+
+    root = ET.fromstring(content)
+    block_x, block_y = block_size
+    for tag, value in (("BlockXSize", block_x), ("BlockYSize", block_y)):
+        elem = root.find(tag)
+        if elem is None:
+            elem = ET.SubElement(root, tag)
+        elem.text = str(int(value))
+    content = ET.tostring(root)
+
+    handle = vsi_open("wb")
+    try:
+        gdal.VSIFWriteL(content, 1, len(content), handle)
+    finally:
+        gdal.VSIFCloseL(handle)
 
 
 def requires_reftools(func):
@@ -174,11 +252,19 @@ def suggest_transformer( path_or_ds ) :
     """
 
     # get info about the dataset 
-    ds = _open_ds(path_or_ds)
-
-    nn = ds.GetGCPCount()
-    sx = ds.RasterXSize
-    sy = ds.RasterYSize
+    with _open_ds(path_or_ds) as ds:
+        nn = ds.GetGCPCount()
+        sx = ds.RasterXSize
+        sy = ds.RasterYSize
+
+        # check if we deal with an outline along the image's vertical edges
+        if nn < 500 : # avoid check for large tie-point sets 
+            cnt = 0 
+            for gcp in ds.GetGCPs() : 
+                cnt += ( gcp.GCPPixel < 1 ) or ( gcp.GCPPixel >= ( sx-1 ) ) 
+            is_vertical_outline = ( cnt == nn ) 
+        else : 
+            is_vertical_outline = False
 
     # guess reasonable limit number of tie-points
     # (Assuming that the tiepoints cover but not execeed
@@ -187,15 +273,6 @@ def suggest_transformer( path_or_ds ) :
     nx = 5 
     ny = int(max(1,0.5*nx*float(sy)/float(sx))) 
     ng = (nx+1)*(ny+1)+10 
-
-    # check if we deal with an outline along the image's vertical edges
-    if nn < 500 : # avoid check for large tie-point sets 
-        cnt = 0 
-        for gcp in ds.GetGCPs() : 
-            cnt += ( gcp.GCPPixel < 1 ) or ( gcp.GCPPixel >= ( sx-1 ) ) 
-        is_vertical_outline = ( cnt == nn ) 
-    else : 
-        is_vertical_outline = False
     
     # check whether the GDAL extensions are available 
 
@@ -271,56 +348,109 @@ def get_footprint_wkt(path_or_ds, method=METHOD_GCP, order=0):
               They can be, however, often inappropriate!
     """
     
-    ds = _open_ds(path_or_ds)
-    
-    result = C.c_char_p()
-    
-    ret = _get_footprint_wkt(C.c_void_p(long(ds.this)), method, order, C.byref(result))
-    if ret != gdal.CE_None:
-        raise RuntimeError(gdal.GetLastErrorMsg())
-    
-    string = C.cast(result, C.c_char_p).value
-    
-    _free_string(result)
-    return string
+    with _open_ds(path_or_ds) as ds:
+        result = C.c_char_p()
+
+        ret = _get_footprint_wkt(C.c_void_p(long(ds.this)), method, order, C.byref(result))
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+        string = C.cast(result, C.c_char_p).value
+
+        _free_string(result)
+        return string
+
+@requires_reftools
+def sample_grid(path_or_ds, n_x, n_y, method=METHOD_GCP, order=0):
+    """ Samples the pixel to geo transformation of the dataset on a regular 
+        grid of ``(n_x + 1) * (n_y + 1)`` nodes spanning the whole image. 
+        Returns a list of tuples (pixel, line, x, y), row by row.
+    """
+    if _sample_grid is None:
+        raise ReftoolsException(
+            "The reftools extension library does not support grid sampling."
+        )
+
+    with _open_ds(path_or_ds) as ds:
+        n_points = (n_x + 1) * (n_y + 1)
+        x = (C.c_double * n_points)()
+        y = (C.c_double * n_points)()
+
+        ret = _sample_grid(
+            C.c_void_p(long(ds.this)), method, order, n_x, n_y, x, y
+        )
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+        size_x, size_y = ds.RasterXSize, ds.RasterYSize
+        return [
+            (
+                float(i) * size_x / n_x, float(j) * size_y / n_y, 
+                x[j * (n_x + 1) + i], y[j * (n_x + 1) + i]
+            )
+            for j in xrange(n_y + 1) for i in xrange(n_x + 1)
+        ]
 
 @requires_reftools
 def rect_from_subset(path_or_ds, srid, minx, miny, maxx, maxy,
                      method=METHOD_GCP, order=0):
     
-    ds = _open_ds(path_or_ds)
-    
-    rect = RECT()
-    ret = _rect_from_subset(
-        C.c_void_p(long(ds.this)),
-        C.byref(SUBSET(srid, minx, miny, maxx, maxy)),
-        method, order,
-        C.byref(rect)
-    )
-    if ret != gdal.CE_None:
-        raise RuntimeError(gdal.GetLastErrorMsg())
-    
-    return Rect(rect.x_off, rect.y_off, rect.x_size, rect.y_size)
+    with _open_ds(path_or_ds) as ds:
+        rect = RECT()
+        ret = _rect_from_subset(
+            C.c_void_p(long(ds.this)),
+            C.byref(SUBSET(srid, minx, miny, maxx, maxy)),
+            method, order,
+            C.byref(rect)
+        )
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+        return Rect(rect.x_off, rect.y_off, rect.x_size, rect.y_size)
 
 
 @requires_reftools
 def create_rectified_vrt(path_or_ds, vrt_path, srid=None,
     resample=gdal.GRA_NearestNeighbour, memory_limit=0.0,
-    max_error=APPROX_ERR_TOL, method=METHOD_GCP, order=0):
+    max_error=APPROX_ERR_TOL, method=METHOD_GCP, order=0,
+    num_threads=None, block_size=None):
+    """ Creates a warped VRT rectifying the referenceable dataset.
+
+        ``memory_limit`` is the warp memory in bytes (0 for the GDAL default),
+        ``max_error`` the error threshold of the approximating transformer 
+        in pixels (0 for the exact transformation), ``num_threads`` the 
+        number of warping threads (an integer or "ALL_CPUS") and 
+        ``block_size`` a tuple (x, y) for the size of the warped chunks.
+    """
 
-    ds = _open_ds(path_or_ds)
-    ptr = C.c_void_p(long(ds.this))
+    warp_options = _get_warp_options(num_threads)
 
-    # when not provided set SRID to 0 
-    if srid is None:
-        srid = 0 
+    with _open_ds(path_or_ds) as ds:
+        ptr = C.c_void_p(long(ds.this))
 
-    ret = _create_rectified_vrt(ptr, vrt_path, srid,
-        resample, memory_limit, max_error, 
-        method, order)
-    
-    if ret != gdal.CE_None:
-        raise RuntimeError(gdal.GetLastErrorMsg())
+        # when not provided set SRID to 0 
+        if srid is None:
+            srid = 0 
+
+        if _create_rectified_vrt_ex is not None:
+            ret = _create_rectified_vrt_ex(ptr, vrt_path, srid,
+                resample, memory_limit, max_error, 
+                method, order, warp_options)
+        else:
+            if warp_options is not None:
+                logger.warning(
+                    "The reftools extension library does not support "
+                    "additional warp options. Ignoring them."
+                )
+            ret = _create_rectified_vrt(ptr, vrt_path, srid,
+                resample, memory_limit, max_error, 
+                method, order)
+
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+    if block_size:
+        _set_vrt_block_size(vrt_path, block_size)
 
 
 @requires_reftools
@@ -350,30 +480,35 @@ def create_temporary_rectified_vrt(path_or_ds, srid=None,
 @requires_reftools
 def suggested_warp_output(path_or_ds, src_wkt, dst_wkt, method=METHOD_GCP, order=0):
 
-    ds = _open_ds(path_or_ds)
-    ptr = C.c_void_p(long(ds.this))
-    info = IMAGE_INFO()
-    
-    ret = _suggested_warp_output(
-        ptr,
-        src_wkt,
-        dst_wkt,
-        method, order,
-        C.byref(info)
-    )
-    
-    if ret != gdal.CE_None:
-        raise RuntimeError(gdal.GetLastErrorMsg())
-    
-    return info.x_size, info.y_size, info.geotransform
+    with _open_ds(path_or_ds) as ds:
+        ptr = C.c_void_p(long(ds.this))
+        info = IMAGE_INFO()
+
+        ret = _suggested_warp_output(
+            ptr,
+            src_wkt,
+            dst_wkt,
+            method, order,
+            C.byref(info)
+        )
+
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+        return info.x_size, info.y_size, info.geotransform
 
 
 @requires_reftools
 def reproject_image(src_ds, src_wkt, dst_ds, dst_wkt, 
                     resample=gdal.GRA_NearestNeighbour, memory_limit=0.0,
-                    max_error=APPROX_ERR_TOL, method=METHOD_GCP, order=0):
+                    max_error=APPROX_ERR_TOL, method=METHOD_GCP, order=0,
+                    num_threads=None):
+    """ Warps the source dataset into the destination dataset. The chunk size
+        is governed by ``memory_limit``. See ``create_rectified_vrt`` for the
+        other parameters.
+    """
     
-    ret = _reproject_image(
+    args = [
         C.c_void_p(long(src_ds.this)),
         src_wkt,
         C.c_void_p(long(dst_ds.this)),
@@ -382,7 +517,18 @@ def reproject_image(src_ds, src_wkt, dst_ds, dst_wkt,
         memory_limit,
         max_error,
         method, order
-    )
+    ]
+
+    warp_options = _get_warp_options(num_threads)
+    if _reproject_image_ex is not None:
+        ret = _reproject_image_ex(*(args + [warp_options]))
+    else:
+        if warp_options is not None:
+            logger.warning(
+                "The reftools extension library does not support additional "
+                "warp options. Ignoring them."
+            )
+        ret = _reproject_image(*args)
     
     if ret != gdal.CE_None:
         raise RuntimeError(gdal.GetLastErrorMsg())
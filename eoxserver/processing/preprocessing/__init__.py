@@ -27,8 +27,10 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
-from os.path import splitext
+from os.path import splitext, join
 from itertools import izip
+from tempfile import mkdtemp
+from shutil import rmtree
 import numpy
 import logging
 
@@ -38,7 +40,9 @@ from django.contrib.gis.gdal.geometries import OGRGeometry
 from eoxserver.contrib import  gdal, ogr, osr 
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.processing.preprocessing.util import (
-    create_mem, create_mem_copy, copy_projection
+    create_mem_copy, create_vrt_copy, create_temp, copy_projection, 
+    copy_metadata, copy_band_info, copy_blockwise, get_window_size, 
+    iter_windows
 )
 from eoxserver.processing.preprocessing.optimization import (
     BandSelectionOptimization, ColorIndexOptimization, NoDataValueOptimization,
@@ -125,9 +129,27 @@ class PreProcessor(object):
     def process(self, input_filename, output_filename, 
                 geo_reference=None, generate_metadata=True):
         
-        # open the dataset and create an In-Memory Dataset as copy
-        # to perform optimizations
-        ds = create_mem_copy(gdal.Open(input_filename))
+        # all intermediate datasets which cannot be expressed as views are 
+        # stored in a temporary directory, which is removed afterwards
+        temp_dir = mkdtemp(prefix="eoxs_preprocess_")
+        try:
+            return self._process(input_filename, output_filename, 
+                                 geo_reference, generate_metadata, temp_dir)
+        finally:
+            rmtree(temp_dir, ignore_errors=True)
+    
+    
+    def _process(self, input_filename, output_filename, geo_reference, 
+                 generate_metadata, temp_dir):
+        
+        # open the dataset and create a VRT as a view on it to perform
+        # optimizations without reading the pixel data
+        src_ds = gdal.Open(input_filename)
+        ds = create_vrt_copy(src_ds)
+        
+        # keep references to all intermediate datasets, as the views depend on
+        # their respective source datasets
+        datasets = [src_ds, ds]
         
         gt = ds.GetGeoTransform()
         footprint_wkt = None
@@ -139,27 +161,22 @@ class PreProcessor(object):
         else:
             logger.debug("Applying geo reference '%s'."
                          % type(geo_reference).__name__)
+            geo_reference.temp_dir = temp_dir
             ds, footprint_wkt = geo_reference.apply(ds)
+            datasets.append(ds)
         
         # apply optimizations
         for optimization in self.get_optimizations(ds):
             logger.debug("Applying optimization '%s'."
                          % type(optimization).__name__)
-            new_ds = optimization(ds)
-            ds = None
-            ds = new_ds
+            optimization.temp_dir = temp_dir
+            ds = optimization(ds)
+            datasets.append(ds)
             
         # generate the footprint from the dataset
         if not footprint_wkt:
             logger.debug("Generating footprint.")
-            footprint_wkt = self._generate_footprint_wkt(ds)
-        
-        
-        if self.footprint_alpha:
-            logger.debug("Applying optimization 'AlphaBandOptimization'.")
-            opt = AlphaBandOptimization()
-            opt(ds, footprint_wkt)
-        
+            footprint_wkt = self._generate_footprint_wkt(ds, temp_dir)
         
         output_filename = self.generate_filename(output_filename)
         
@@ -170,14 +187,37 @@ class PreProcessor(object):
                      % ", ".join(ds.GetMetadata_List("") or []))
         
         # save the file to the disc
-        driver = gdal.GetDriverByName(self.format_selection.driver_name)
-        ds = driver.CreateCopy(output_filename, ds,
-                               options=self.format_selection.creation_options)
+        if self.format_selection.cloud_optimized:
+            # write an intermediate file and apply the post optimizations (e.g:
+            # the overviews) to it. The result is then copied to the output 
+            # in the cloud optimized layout.
+            tmp_ds = self._write(
+                ds, join(temp_dir, "intermediate.tif"), footprint_wkt,
+                self.format_selection.intermediate_creation_options
+            )
+            
+            # release the intermediate datasets
+            del datasets[:]
+            
+            self._post_optimize(tmp_ds)
+            
+            driver = gdal.GetDriverByName(self.format_selection.driver_name)
+            ds = driver.CreateCopy(
+                output_filename, tmp_ds, 
+                options=self.format_selection.creation_options
+            )
+            tmp_ds = None
         
-        for optimization in self.get_post_optimizations(ds):
-            logger.debug("Applying post-optimization '%s'."
-                         % type(optimization).__name__)
-            optimization(ds)
+        else:
+            ds = self._write(
+                ds, output_filename, footprint_wkt, 
+                self.format_selection.creation_options
+            )
+            
+            # release the intermediate datasets
+            del datasets[:]
+            
+            self._post_optimize(ds)
         
         # generate metadata if requested
         footprint = None
@@ -225,39 +265,137 @@ class PreProcessor(object):
         return PreProcessResult(output_filename, footprint, num_bands)
     
     
+    def _post_optimize(self, ds):
+        for optimization in self.get_post_optimizations(ds):
+            logger.debug("Applying post-optimization '%s'."
+                         % type(optimization).__name__)
+            optimization(ds)
+    
+    
+    def _write(self, ds, output_filename, footprint_wkt, creation_options):
+        """ Write the (virtual) dataset to the output file. If the driver 
+            supports it, the output is created beforehand and the pixel data
+            is copied window by window.
+        """
+        driver = gdal.GetDriverByName(self.format_selection.driver_name)
+        
+        if driver.GetMetadataItem(gdal.DCAP_CREATE) != "YES":
+            # the driver only supports CreateCopy(), so the alpha band has to
+            # be added to an In-Memory copy
+            if self.footprint_alpha:
+                logger.debug("Applying optimization 'AlphaBandOptimization'.")
+                ds = create_mem_copy(ds)
+                AlphaBandOptimization()(ds, footprint_wkt)
+            
+            return driver.CreateCopy(
+                output_filename, ds, options=creation_options
+            )
+        
+        num_bands = ds.RasterCount
+        if self.footprint_alpha and num_bands == 3:
+            num_bands += 1
+        
+        out_ds = driver.Create(
+            output_filename, ds.RasterXSize, ds.RasterYSize, num_bands,
+            ds.GetRasterBand(1).DataType, creation_options
+        )
+        copy_projection(ds, out_ds)
+        copy_metadata(ds, out_ds)
+        copy_band_info(ds, out_ds)
+        
+        copy_blockwise(ds, out_ds)
+        
+        if self.footprint_alpha:
+            logger.debug("Applying optimization 'AlphaBandOptimization'.")
+            AlphaBandOptimization()(out_ds, footprint_wkt)
+        
+        return out_ds
+    
+    
     def generate_filename(self, filename):
         """ Adjust the filename with the correct extension. """
         base_filename, _ = splitext(filename)
         return base_filename + self.format_selection.extension 
     
     
-    def _generate_footprint_wkt(self, ds):
+    def _get_footprint_decimation(self):
+        """ Get the factor by which the raster is decimated for the footprint
+            generation. The factor is chosen so that the error introduced by 
+            the reduced grid does not exceed the simplification tolerance.
+        """
+        return max(1, int(self.simplification_factor))
+    
+    
+    def _generate_footprint_wkt(self, ds, temp_dir=None):
         """ Generate a fooptrint from a raster, using black/no-data as exclusion
+
+            The validity mask is built window by window on a grid decimated by
+            the factor `d` (see `_get_footprint_decimation`), where a cell is 
+            valid if any pixel of its d x d block is valid. The unsimplified 
+            polygon thus contains all valid pixels, is clipped to the extent 
+            of the raster and exceeds the valid pixels by less than `d` pixels
+            along each axis. With the simplification tolerance of `s` pixels
+            and d = s, the result differs from the one on the full resolution
+            mask by at most (2 + sqrt(2)) * s pixels (Hausdorff distance).
         """
         
-        # create an empty boolean array initialized as 'False' to store where
-        # values exist as a mask array.
-        nodata_map = numpy.zeros((ds.RasterYSize, ds.RasterXSize),
-                                 dtype=numpy.bool)
+        decimation = self._get_footprint_decimation()
+        size_x = -(-ds.RasterXSize // decimation)
+        size_y = -(-ds.RasterYSize // decimation)
         
+        # create a temporary dataset on the (possibly) decimated grid to store
+        # where values exist as a mask.
+        tmp_ds = create_temp(size_x, size_y, 1, gdal.GDT_Byte, temp_dir)
+        tmp_band = tmp_ds.GetRasterBand(1)
+        
+        gt = ds.GetGeoTransform()
+        tmp_ds.SetProjection(ds.GetProjection())
+        tmp_ds.SetGeoTransform([
+            gt[0], gt[1] * decimation, gt[2] * decimation,
+            gt[3], gt[4] * decimation, gt[5] * decimation
+        ])
+        
+        nodata_values = []
         for idx in range(1, ds.RasterCount + 1):
-            band = ds.GetRasterBand(idx)
-            raster_data = band.ReadAsArray()
-            nodata = band.GetNoDataValue()
+            nodata = ds.GetRasterBand(idx).GetNoDataValue()
+            nodata_values.append(nodata if nodata is not None else 0)
+        
+        # the windows have to be multiples of the decimation factor to map 
+        # exactly onto the reduced grid
+        window_x, window_y = get_window_size(ds)
+        window_x = max(decimation, window_x // decimation * decimation)
+        window_y = max(decimation, window_y // decimation * decimation)
+        
+        for x, y, win_x, win_y in iter_windows(ds.RasterXSize, ds.RasterYSize,
+                                               window_x, window_y):
+            buf_x = -(-win_x // decimation)
+            buf_y = -(-win_y // decimation)
             
-            if nodata is None:
-                nodata = 0
+            # create an empty boolean array initialized as 'False' to store 
+            # where values exist in the current window, padded to full blocks
+            nodata_map = numpy.zeros(
+                (buf_y * decimation, buf_x * decimation), dtype=numpy.bool
+            )
             
-            # apply the output to the map  
-            nodata_map |= (raster_data != nodata)
-        
-        # create a temporary in-memory dataset and write the nodata mask 
-        # into its single band
-        tmp_ds = create_mem(ds.RasterXSize + 2, ds.RasterYSize + 2, 1, 
-                            gdal.GDT_Byte)
-        copy_projection(ds, tmp_ds)
-        tmp_band = tmp_ds.GetRasterBand(1)
-        tmp_band.WriteArray(nodata_map.astype(numpy.uint8))
+            for idx, nodata in enumerate(nodata_values, 1):
+                raster_data = ds.GetRasterBand(idx).ReadAsArray(
+                    x, y, win_x, win_y
+                )
+                
+                # apply the output to the map  
+                nodata_map[:win_y, :win_x] |= (raster_data != nodata)
+            
+            # a cell of the decimated grid is valid if any pixel of its block
+            # is valid
+            if decimation > 1:
+                nodata_map = nodata_map.reshape(
+                    buf_y, decimation, buf_x, decimation
+                ).any(axis=3).any(axis=1)
+            
+            tmp_band.WriteArray(
+                nodata_map.astype(numpy.uint8), x // decimation, 
+                y // decimation
+            )
         
         # create an OGR in memory layer to hold the created polygon
         sr = osr.SpatialReference(); sr.ImportFromWkt(ds.GetProjectionRef())
@@ -285,6 +423,14 @@ class PreProcessor(object):
             feature = layer.GetNextFeature()
             geometry = feature.GetGeometryRef()
         
+        # the cells of the last column and row of the decimated grid may 
+        # exceed the raster
+        if not geometry.IsEmpty():
+            geometry = geometry.Intersection(_get_extent_polygon(ds))
+            if geometry.GetGeometryType() == ogr.wkbMultiPolygon:
+                geometry = geometry.ConvexHull()
+            geometry.AssignSpatialReference(sr.sr)
+        
         if geometry.GetGeometryType() != ogr.wkbPolygon:
             raise RuntimeError("Error during poligonization. Wrong geometry "
                                "type.")
@@ -297,7 +443,6 @@ class PreProcessor(object):
             except RuntimeError:
                 geometry.Transform(osr.CoordinateTransformation(sr.sr, dst_sr.sr))
         
-        gt = ds.GetGeoTransform()
         resolution = min(abs(gt[1]), abs(gt[5]))
 
         simplification_value = self.simplification_factor * resolution
@@ -313,6 +458,23 @@ class PreProcessor(object):
         return geometry.ExportToWkt()
 
 
+def _get_extent_polygon(ds):
+    """ Returns the extent of the dataset as an OGR polygon in the coordinates
+        of the dataset.
+    """
+    gt = ds.GetGeoTransform()
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for px, py in ((0, 0), (ds.RasterXSize, 0), 
+                   (ds.RasterXSize, ds.RasterYSize), (0, ds.RasterYSize), 
+                   (0, 0)):
+        ring.AddPoint_2D(
+            gt[0] + px * gt[1] + py * gt[2], gt[3] + px * gt[4] + py * gt[5]
+        )
+    polygon = ogr.Geometry(ogr.wkbPolygon)
+    polygon.AddGeometry(ring)
+    return polygon
+
+
 class WMSPreProcessor(PreProcessor):
     """
             
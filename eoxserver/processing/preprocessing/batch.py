@@ -0,0 +1,260 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Batch pre-processing of multiple datasets in a pool of worker processes.
+The status of every processed item is recorded in a state file, so an
+interrupted batch can be resumed.
+"""
+
+import os
+import csv
+import json
+import glob
+import logging
+import traceback
+from os.path import splitext, basename, join
+from multiprocessing import Pool
+from itertools import imap
+
+from eoxserver.contrib import gdal
+
+
+logger = logging.getLogger(__name__)
+
+# item status values
+PENDING, DONE, FAILED, REGISTERED = "pending", "done", "failed", "registered"
+
+
+class BatchItem(object):
+    """ A single input of a batch with optional metadata for registration.
+    """
+
+    def __init__(self, input_filename, output_basename=None, coverage_id=None,
+                 begin_time=None, end_time=None):
+        self.input_filename = input_filename
+        self.output_basename = output_basename
+        self.coverage_id = coverage_id
+        self.begin_time = begin_time
+        self.end_time = end_time
+
+
+def read_manifest(filename):
+    """ Read a batch manifest. Each line of the manifest is a comma separated 
+        list in the form 'input[,output_basename[,coverage_id,begin_time,
+        end_time]]'. Empty lines and lines starting with '#' are ignored.
+    """
+    items = []
+    with open(filename) as f:
+        for row in csv.reader(f):
+            row = [value.strip() for value in row]
+            if not row or not row[0] or row[0].startswith("#"):
+                continue
+            
+            items.append(BatchItem(*[value or None for value in row[:5]]))
+    return items
+
+
+def glob_items(pattern):
+    """ Create batch items from all files matching the given glob pattern.
+    """
+    return [BatchItem(filename) for filename in sorted(glob.glob(pattern))]
+
+
+class BatchState(object):
+    """ Persistent record of the status of each item of a batch, stored as a
+        JSON file. The file is replaced atomically on each update.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._items = {}
+
+        if os.path.exists(filename):
+            with open(filename) as f:
+                self._items = json.load(f)
+
+    def get_status(self, input_filename):
+        return self._items.get(input_filename, {}).get("status", PENDING)
+
+    def get(self, input_filename):
+        return self._items.get(input_filename, {})
+
+    def update(self, input_filename, status, **kwargs):
+        entry = self._items.setdefault(input_filename, {})
+        entry.update(kwargs)
+        entry["status"] = status
+        self.save()
+
+    def save(self):
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(self._items, f, indent=2, sort_keys=True)
+        os.rename(tmp_filename, self.filename)
+
+
+def get_output_filename(preprocessor, item, output_dir=None):
+    """ Get the output filename of a batch item, following the naming
+        convention of the `eoxserver-preprocess.py` script.
+    """
+    if item.output_basename:
+        output_basename = item.output_basename
+    elif output_dir:
+        output_basename = join(
+            output_dir, splitext(basename(item.input_filename))[0] + "_proc"
+        )
+    else:
+        output_basename = splitext(item.input_filename)[0] + "_proc"
+
+    return preprocessor.generate_filename(output_basename)
+
+
+def _init_worker(gdal_cache):
+    """ Initializer of each worker process. Sets the GDAL block cache size 
+        (in megabytes) per process.
+    """
+    if gdal_cache:
+        gdal.SetCacheMax(gdal_cache * 1024 * 1024)
+
+
+def _process_item(args):
+    """ Process a single item in a worker. Returns a tuple of the input 
+        filename, the status and a dict with additional information.
+    """
+    preprocessor, input_filename, output_filename, generate_metadata = args
+    try:
+        result = preprocessor.process(
+            input_filename, output_filename, 
+            generate_metadata=generate_metadata
+        )
+        info = {"output_filename": result.output_filename}
+        if result.footprint_geom is not None:
+            info["footprint"] = result.footprint_wkt
+        return input_filename, DONE, info
+
+    except Exception, e:
+        logger.debug(traceback.format_exc())
+        return input_filename, FAILED, {
+            "error": "%s: %s" % (type(e).__name__, str(e))
+        }
+
+
+def register_item(item, entry, range_type_name, collection_ids=None,
+                  visible=False):
+    """ Register the output of a processed item via the 
+        `eoxs_dataset_register` command. Requires a configured EOxServer 
+        instance (i.e: the DJANGO_SETTINGS_MODULE environment variable).
+    """
+    from django.core.management import call_command
+
+    kwargs = {
+        "data": [[entry["output_filename"]]],
+        "range_type_name": range_type_name,
+        "identifier": item.coverage_id,
+        "begin_time": item.begin_time,
+        "end_time": item.end_time,
+        "footprint": entry.get("footprint"),
+        "collection_ids": collection_ids,
+        "visible": visible
+    }
+    call_command("eoxs_dataset_register", **kwargs)
+
+
+def run_batch(preprocessor, items, state, workers=1, gdal_cache=None, 
+              output_dir=None, generate_metadata=True, range_type_name=None,
+              collection_ids=None, visible=False):
+    """ Process all items of a batch with the given pre-processor in a pool of
+        `workers` processes. Items already recorded as processed in the 
+        `state` are skipped. If a `range_type_name` is given, the outputs are
+        registered as datasets in the parent process. Returns the number of
+        failed items.
+    """
+    pending = [
+        item for item in items
+        if state.get_status(item.input_filename) not in (DONE, REGISTERED)
+    ]
+
+    logger.info("Processing %d of %d items with %d worker(s)."
+                % (len(pending), len(items), workers))
+
+    tasks = [
+        (preprocessor, item.input_filename, 
+         get_output_filename(preprocessor, item, output_dir),
+         generate_metadata)
+        for item in pending
+    ]
+
+    if workers > 1:
+        pool = Pool(workers, _init_worker, (gdal_cache,))
+        results = pool.imap_unordered(_process_item, tasks)
+    else:
+        pool = None
+        _init_worker(gdal_cache)
+        results = imap(_process_item, tasks)
+
+    failed = 0
+    try:
+        for input_filename, status, info in results:
+            state.update(input_filename, status, **info)
+            if status == FAILED:
+                failed += 1
+                logger.error("Failed to process '%s': %s" 
+                             % (input_filename, info["error"]))
+            else:
+                logger.info("Processed '%s'." % input_filename)
+
+        if pool:
+            pool.close()
+            pool.join()
+    
+    finally:
+        if pool:
+            pool.terminate()
+
+    # register all processed but not yet registered items
+    if range_type_name:
+        for item in items:
+            input_filename = item.input_filename
+            if state.get_status(input_filename) != DONE:
+                continue
+            
+            try:
+                register_item(
+                    item, state.get(input_filename), range_type_name, 
+                    collection_ids, visible
+                )
+            except Exception, e:
+                failed += 1
+                logger.error("Failed to register '%s': %s"
+                             % (input_filename, str(e)))
+                state.update(
+                    input_filename, DONE, 
+                    error="%s: %s" % (type(e).__name__, str(e))
+                )
+            else:
+                state.update(input_filename, REGISTERED)
+
+    return failed
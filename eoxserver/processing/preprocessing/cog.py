@@ -0,0 +1,125 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Helpers to convert existing raster files to cloud optimized GeoTIFFs.
+"""
+
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from eoxserver.contrib import gdal
+from eoxserver.processing.preprocessing.optimization import (
+    OverviewOptimization
+)
+
+
+def is_cloud_optimized(ds):
+    """ Check whether the given dataset is a cloud optimized GeoTIFF: a tiled
+        GeoTIFF with internal overviews, where the IFDs of the overviews follow
+        the IFD of the full resolution image and the image data of the 
+        overviews precedes the one of the full resolution image. If the layout
+        cannot be determined (e.g: GDAL does not report the offsets), the 
+        dataset is not considered to be cloud optimized.
+    """
+    if ds.GetDriver().ShortName != "GTiff":
+        return False
+
+    # GDAL reports the layout of files written by its COG driver directly
+    if ds.GetMetadataItem("LAYOUT", "IMAGE_STRUCTURE") == "COG":
+        return True
+
+    band = ds.GetRasterBand(1)
+    block_x, block_y = band.GetBlockSize()
+    if block_x == ds.RasterXSize and block_y != block_x:
+        # stripped
+        return False
+
+    # external overviews are not counted
+    if band.GetOverviewCount() == 0 or any(
+        filename.lower().endswith(".ovr") for filename in ds.GetFileList()
+    ):
+        return False
+
+    main_ifd = _get_offset(band, "IFD_OFFSET")
+    main_data = _get_offset(band, "BLOCK_OFFSET_0_0")
+    if main_ifd is None or main_data is None:
+        return False
+
+    previous_data = main_data
+    for i in xrange(band.GetOverviewCount()):
+        overview = band.GetOverview(i)
+        ifd = _get_offset(overview, "IFD_OFFSET")
+        data = _get_offset(overview, "BLOCK_OFFSET_0_0")
+        if ifd is None or data is None:
+            return False
+
+        # the IFDs are ordered from the full resolution to the smallest 
+        # overview, the image data the other way round
+        if ifd <= main_ifd or data >= previous_data:
+            return False
+        previous_data = data
+
+    return True
+
+
+def _get_offset(band, name):
+    """ Returns the file offset as reported by the GTiff driver in the "TIFF" 
+        metadata domain or ``None``, if it is not available.
+    """
+    value = band.GetMetadataItem(name, "TIFF")
+    if not value:
+        return None
+    return int(value)
+
+
+def cogify(input_filename, output_filename, format_selection, 
+           resampling=None, levels=None, minsize=None, temp_root=None):
+    """ Convert a raster file to a cloud optimized GeoTIFF. The input is copied
+        to an intermediate tiled GeoTIFF, the overviews are added and the 
+        result is copied to the output in the cloud optimized layout.
+    """
+    driver = gdal.GetDriverByName(format_selection.driver_name)
+    temp_dir = mkdtemp(prefix="eoxs_cogify_", dir=temp_root)
+    try:
+        src_ds = gdal.Open(input_filename)
+        tmp_ds = driver.CreateCopy(
+            join(temp_dir, "intermediate.tif"), src_ds, 
+            options=format_selection.intermediate_creation_options
+        )
+        src_ds = None
+        
+        OverviewOptimization(resampling, levels, minsize)(tmp_ds)
+        
+        out_ds = driver.CreateCopy(
+            output_filename, tmp_ds, options=format_selection.creation_options
+        )
+        out_ds = None
+        tmp_ds = None
+    
+    finally:
+        rmtree(temp_dir, ignore_errors=True)
@@ -42,8 +42,9 @@ class FormatSelectionMetaclass(type):
     """ Metaclass for format selections
     """
     def __init__(cls, name, bases, dct):
-        if isinstance(dct["driver_name"], basestring):
-            _registry[dct["driver_name"]] = cls
+        format_name = dct.get("format_name", dct.get("driver_name"))
+        if isinstance(format_name, basestring):
+            _registry[format_name] = cls
         super(FormatSelectionMetaclass, cls).__init__(name, bases, dct)
 
 
@@ -71,6 +72,10 @@ class FormatSelection(object):
     def creation_options(self):
         return []
     
+    
+    # whether the output shall be written in the cloud optimized layout
+    cloud_optimized = False
+    
 
 
 class GeoTIFFFormatSelection(FormatSelection):
@@ -82,7 +87,8 @@ class GeoTIFFFormatSelection(FormatSelection):
     
 
     def __init__(self, tiling=True, compression=None, 
-                 jpeg_quality=None, zlevel=None, creation_options=None):
+                 jpeg_quality=None, zlevel=None, creation_options=None,
+                 blocksize=None):
         self.final_options = {}
         if compression:
             compression = compression.upper()
@@ -106,6 +112,13 @@ class GeoTIFFFormatSelection(FormatSelection):
             
         if tiling:
             self.final_options["TILED"] = "YES"
+            
+            if blocksize is not None:
+                self.final_options["BLOCKXSIZE"] = blocksize
+                self.final_options["BLOCKYSIZE"] = blocksize
+        
+        elif blocksize is not None:
+            raise ValueError("'blocksize' can only be used with tiling")
         
         if creation_options:
             self.final_options.update(dict(creation_options))
@@ -120,3 +133,38 @@ class GeoTIFFFormatSelection(FormatSelection):
         return ["%s=%s" % (key, value) 
                 for key, value in self.final_options.items()]
 
+
+class COGFormatSelection(GeoTIFFFormatSelection):
+    """ Format selection for cloud optimized GeoTIFFs: tiled GeoTIFFs with 
+        internal overviews, where all IFDs precede the image data and the
+        overviews precede the full resolution data. The output is written to 
+        an intermediate tiled GeoTIFF first, which is copied including its 
+        overviews in the final layout.
+    """
+    
+    def __init__(self, tiling=True, compression=None, 
+                 jpeg_quality=None, zlevel=None, creation_options=None,
+                 blocksize=512):
+        if not tiling:
+            raise ValueError("Cloud optimized GeoTIFFs are always tiled")
+        
+        super(COGFormatSelection, self).__init__(
+            True, compression, jpeg_quality, zlevel, creation_options, 
+            blocksize
+        )
+        self.blocksize = blocksize
+        self.final_options["COPY_SRC_OVERVIEWS"] = "YES"
+    
+    format_name = "COG"
+    driver_name = "GTiff"
+    extension = ".tif"
+    cloud_optimized = True
+    
+    
+    @property
+    def intermediate_creation_options(self):
+        """ Creation options for the intermediate GeoTIFF. """
+        return [
+            "TILED=YES", "BIGTIFF=IF_SAFER", 
+            "BLOCKXSIZE=%d" % self.blocksize, "BLOCKYSIZE=%d" % self.blocksize
+        ]
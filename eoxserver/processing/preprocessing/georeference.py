@@ -31,7 +31,7 @@ import logging
 from eoxserver.contrib import gdal, ogr, osr
 from eoxserver.processing.gdal import reftools as rt 
 from eoxserver.processing.preprocessing.util import (
-    create_mem, copy_metadata
+    create_temp, copy_metadata
 )
 from eoxserver.processing.preprocessing.exceptions import GCPTransformException
 
@@ -44,7 +44,12 @@ logger = logging.getLogger(__name__)
 #===============================================================================
 
 class GeographicReference(object):
-    pass
+    """ Abstract base class for geographic references. If the reference 
+        requires the pixel data to be copied, the copy shall be created in the
+        `temp_dir` which is set by the pre-processor.
+    """
+    
+    temp_dir = None
 
 
 class Extent(GeographicReference):
@@ -137,9 +142,10 @@ class GCPList(GeographicReference):
                     logger.debug("New size is '%i x %i'" % (size_x, size_y))
                     
                     # create the output dataset
-                    dst_ds = create_mem(size_x, size_y,
-                                        src_ds.RasterCount, 
-                                        src_ds.GetRasterBand(1).DataType)
+                    dst_ds = create_temp(size_x, size_y,
+                                         src_ds.RasterCount, 
+                                         src_ds.GetRasterBand(1).DataType,
+                                         self.temp_dir)
                     
                     # reproject the image
                     dst_ds.SetProjection(dst_sr.ExportToWkt())
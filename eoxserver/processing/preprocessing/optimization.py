@@ -32,7 +32,8 @@ import numpy
 
 from eoxserver.contrib import gdal, gdal_array, osr, ogr
 from eoxserver.processing.preprocessing.util import ( 
-    get_limits, create_mem, copy_metadata, copy_projection
+    get_limits, create_temp, copy_metadata, copy_projection, get_window_size,
+    iter_windows
 )
 from eoxserver.resources.coverages.crss import (
     parseEPSGCode, fromShortCode, fromURL, fromURN, fromProj4Str
@@ -47,10 +48,13 @@ logger = logging.getLogger(__name__)
 
 class DatasetOptimization(object):
     """ Abstract base class for dataset optimization steps. Each optimization
-        step shall be callable and return the dataset or a copy thereof if 
-        necessary.
+        step shall be callable and return the dataset, a view (VRT) on it or a
+        copy thereof if necessary. Copies shall be created in the `temp_dir`
+        which is set by the pre-processor and must not be held in memory.
     """
     
+    temp_dir = None
+    
     def __call__(self, ds):
         raise NotImplementedError
 
@@ -86,33 +90,82 @@ class ReprojectionOptimization(DatasetOptimization):
                         "is not flipped. Thus, no reprojection is required.")
             return src_ds
         
-        # create a temporary dataset to get information about the output size
-        tmp_ds = gdal.AutoCreateWarpedVRT(src_ds, None, dst_sr.ExportToWkt(), 
+        # create a warped VRT as a view on the source dataset. The actual 
+        # reprojection is performed lazily when the pixels are read.
+        dst_ds = gdal.AutoCreateWarpedVRT(src_ds, None, dst_sr.ExportToWkt(), 
                                           gdal.GRA_Bilinear, 0.125)
         
-        # create the output dataset
-        dst_ds = create_mem(tmp_ds.RasterXSize, tmp_ds.RasterYSize,
-                            src_ds.RasterCount, 
-                            src_ds.GetRasterBand(1).DataType)
-        
-        
-        # reproject the image
-        dst_ds.SetProjection(dst_sr.ExportToWkt())
-        dst_ds.SetGeoTransform(tmp_ds.GetGeoTransform())
-        
-        gdal.ReprojectImage(src_ds, dst_ds,
-                            src_sr.ExportToWkt(),
-                            dst_sr.ExportToWkt(),
-                            gdal.GRA_Bilinear)
-        
-        tmp_ds = None
-        
         # copy the metadata
         copy_metadata(src_ds, dst_ds)
         
         return dst_ds
 
 
+def get_minmax(band):
+    """ Get the minimum and maximum value of a band. If available, stored 
+        statistics are used. Otherwise, the values are approximated from the 
+        overviews or calculated from the full resolution data as a last 
+        resort.
+    """
+    src_min = band.GetMetadataItem("STATISTICS_MINIMUM")
+    src_max = band.GetMetadataItem("STATISTICS_MAXIMUM")
+    if src_min is not None and src_max is not None:
+        return float(src_min), float(src_max)
+    
+    return band.ComputeRasterMinMax(band.GetOverviewCount() > 0)
+
+
+class BandScaler(object):
+    """ Clips and linearly scales the values of a data block from the range 
+        [dmin, dmax] to the full range of the destination data type. For 8 
+        and 16 bit integer sources a lookup table is used, which yields the 
+        same values as scaling in double precision; other data types are 
+        scaled in place in single precision. Except for 32 bit floating point
+        sources, the results of the latter may thus differ by one due to 
+        rounding.
+    """
+    
+    LUT_TYPES = {
+        gdal.GDT_Byte: 0, gdal.GDT_UInt16: 0, gdal.GDT_Int16: 32768
+    }
+    
+    def __init__(self, src_datatype, dmin, dmax, dst_datatype):
+        self.dmin = dmin
+        self.dmax = dmax
+        self.dst_dtype = gdal_array.codes[dst_datatype]
+        
+        dst_min, dst_max = get_limits(dst_datatype)
+        self.src_range = float(dmax) - float(dmin)
+        self.dst_range = float(dst_max - dst_min)
+        
+        self.lut = None
+        self.lut_offset = self.LUT_TYPES.get(src_datatype)
+        if self.lut_offset is not None:
+            src_min, src_max = get_limits(src_datatype)
+            values = numpy.arange(src_min, src_max + 1, dtype=numpy.float64)
+            self.lut = self._scale(values).astype(self.dst_dtype)
+    
+    
+    def _scale(self, data):
+        numpy.clip(data, self.dmin, self.dmax, out=data)
+        data -= self.dmin
+        if self.src_range > 0:
+            data /= self.src_range
+            data *= self.dst_range
+        else:
+            data *= 0
+        return data
+    
+    
+    def __call__(self, data):
+        if self.lut is not None:
+            if self.lut_offset:
+                return self.lut[data.astype(numpy.int32) + self.lut_offset]
+            return self.lut[data]
+        
+        return self._scale(data.astype(numpy.float32)).astype(self.dst_dtype)
+
+
 class BandSelectionOptimization(DatasetOptimization):
     """ Dataset optimization step which selects a number of bands and their 
     respective scale and copies them to the result dataset. 
@@ -126,31 +179,25 @@ class BandSelectionOptimization(DatasetOptimization):
         self.datatype = datatype
         
     def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            len(self.bands), self.datatype)
-        dst_range = get_limits(self.datatype)
-        
-        multiple = 0
-        
+        dst_ds = create_temp(src_ds.RasterXSize, src_ds.RasterYSize, 
+                             len(self.bands), self.datatype, self.temp_dir)
+        
+        # calculate the source ranges of all bands in advance; bands with the
+        # same source and range are only processed once per window
+        selections = []
+        scalers = {}
+        minmax = {}
         for dst_index, (src_index, dmin, dmax) in enumerate(self.bands, 1):
-            # check if next band is equal
-            if dst_index < len(self.bands) and (src_index, dmin, dmax) == self.bands[dst_index]:
-                multiple += 1
-                continue
-            # check that src band is available
-            if src_index > src_ds.RasterCount:
+            # check that src band is available and not the zero band. Skipped
+            # bands stay initialized with zeros.
+            if src_index == 0 or src_index > src_ds.RasterCount:
                 continue
             
-            # initialize with zeros if band is 0
-            if src_index == 0:
-                src_band = src_ds.GetRasterBand(1)
-                data = numpy.zeros((src_band.YSize, src_band.XSize), dtype=gdal_array.codes[self.datatype])
-                src_min, src_max = (0, 0)
-            # use src_ds band otherwise
-            else:
-                src_band = src_ds.GetRasterBand(src_index)
-                data = src_band.ReadAsArray()
-                src_min, src_max = src_band.ComputeRasterMinMax()
+            src_band = src_ds.GetRasterBand(src_index)
+            if dmin == "min" or dmax == "max":
+                if src_index not in minmax:
+                    minmax[src_index] = get_minmax(src_band)
+                src_min, src_max = minmax[src_index]
             
             # get min/max values or calculate from band
             if dmin is None:
@@ -161,26 +208,32 @@ class BandSelectionOptimization(DatasetOptimization):
                 dmax = get_limits(src_band.DataType)[1]
             elif dmax == "max":
                 dmax = src_max
-            src_range = (float(dmin), float(dmax))
-            
-            # perform clipping and scaling
-            data = ((dst_range[1] - dst_range[0]) * 
-                    ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
-                    (src_range[1] - src_range[0])))
-            
-            # set new datatype
-            data = data.astype(gdal_array.codes[self.datatype])
-            
-            # write result
-            dst_band = dst_ds.GetRasterBand(dst_index)
-            dst_band.WriteArray(data)
             
-            # write equal bands at once
-            if multiple > 0:
-                for i in range(multiple):
-                    dst_band = dst_ds.GetRasterBand(dst_index-1-i)
-                    dst_band.WriteArray(data)
-                multiple = 0
+            key = (src_index, float(dmin), float(dmax))
+            if key not in scalers:
+                scalers[key] = BandScaler(
+                    src_band.DataType, key[1], key[2], self.datatype
+                )
+            selections.append((dst_index, key))
+        
+        window_x, window_y = get_window_size(dst_ds)
+        for x, y, size_x, size_y in iter_windows(src_ds.RasterXSize, 
+                                                 src_ds.RasterYSize,
+                                                 window_x, window_y):
+            computed = {}
+            for dst_index, key in selections:
+                data = computed.get(key)
+                if data is None:
+                    data = src_ds.GetRasterBand(key[0]).ReadAsArray(
+                        x, y, size_x, size_y
+                    )
+                    
+                    # perform clipping and scaling
+                    data = scalers[key](data)
+                    computed[key] = data
+                
+                # write result
+                dst_ds.GetRasterBand(dst_index).WriteArray(data, x, y)
         
         copy_projection(src_ds, dst_ds)
         copy_metadata(src_ds, dst_ds)
@@ -200,8 +253,8 @@ class ColorIndexOptimization(DatasetOptimization):
     
     
     def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            1, gdal.GDT_Byte)
+        dst_ds = create_temp(src_ds.RasterXSize, src_ds.RasterYSize, 
+                             1, gdal.GDT_Byte, self.temp_dir)
         
         if not self.palette_file:
             # create a color table as a median of the given dataset
@@ -27,6 +27,8 @@
 #-------------------------------------------------------------------------------
 
 from os.path import exists
+from tempfile import mkstemp
+import os
 import numpy
 
 from eoxserver.contrib import gdal, gdal_array
@@ -65,6 +67,106 @@ def create_mem(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
     return mem_drv.Create('', sizex, sizey, numbands, datatype, options)
 
 
+def create_vrt_copy(ds):
+    """ Create a new in-memory VRT dataset referencing an existing dataset. In
+        contrast to `create_mem_copy` no pixel data is read, the returned
+        dataset is merely a view on the original one.
+    """
+    vrt_drv = gdal.GetDriverByName('VRT')
+    return vrt_drv.CreateCopy('', ds)
+
+
+def create_temp(sizex, sizey, numbands, datatype=gdal.GDT_Byte, temp_dir=None):
+    """ Create a new tiled GeoTIFF dataset in the given temporary directory to
+        hold intermediate results of pixel based operations. The file is not
+        deleted automatically; this is the responsibility of the owner of the
+        directory. If no directory is given, an In-Memory Dataset is created
+        instead.
+    """
+    if not temp_dir:
+        return create_mem(sizex, sizey, numbands, datatype)
+    
+    fd, filename = mkstemp(suffix=".tif", dir=temp_dir)
+    os.close(fd)
+    
+    tif_drv = gdal.GetDriverByName('GTiff')
+    return tif_drv.Create(
+        filename, sizex, sizey, numbands, datatype, 
+        ["TILED=YES", "BIGTIFF=IF_SAFER", "INTERLEAVE=BAND"]
+    )
+
+
+def get_window_size(ds, max_pixels=1048576):
+    """ Get the size of the processing window for a dataset. The window is
+        aligned to the block layout of the first band and covers up to 
+        `max_pixels` pixels (but at least a single block).
+    """
+    block_x, block_y = ds.GetRasterBand(1).GetBlockSize()
+    block_x = min(block_x, ds.RasterXSize)
+    block_y = min(block_y, ds.RasterYSize)
+    
+    blocks = max(1, max_pixels // (block_x * block_y))
+    
+    # grow the window along the X axis first, then along the Y axis
+    blocks_x = min(blocks, -(-ds.RasterXSize // block_x))
+    blocks_y = max(1, blocks // blocks_x)
+    
+    return block_x * blocks_x, block_y * blocks_y
+
+
+def iter_windows(sizex, sizey, window_x, window_y):
+    """ Iterate over all windows of the given size covering a raster. Yields 
+        tuples in the form (offset_x, offset_y, size_x, size_y). Windows at the
+        right and lower border are cropped accordingly.
+    """
+    for offset_y in xrange(0, sizey, window_y):
+        size_y = min(window_y, sizey - offset_y)
+        for offset_x in xrange(0, sizex, window_x):
+            yield offset_x, offset_y, min(window_x, sizex - offset_x), size_y
+
+
+def copy_band_info(src_ds, dst_ds):
+    """ Copy the band specific information (no-data value, color
+        interpretation and color table) from one dataset to another.
+    """
+    for index in range(1, min(src_ds.RasterCount, dst_ds.RasterCount) + 1):
+        src_band = src_ds.GetRasterBand(index)
+        dst_band = dst_ds.GetRasterBand(index)
+        
+        nodata = src_band.GetNoDataValue()
+        if nodata is not None:
+            dst_band.SetNoDataValue(nodata)
+        
+        color_table = src_band.GetRasterColorTable()
+        if color_table:
+            dst_band.SetRasterColorTable(color_table)
+        
+        dst_band.SetRasterColorInterpretation(
+            src_band.GetRasterColorInterpretation()
+        )
+
+
+def copy_blockwise(src_ds, dst_ds, max_pixels=1048576):
+    """ Copy the pixel data of all bands of `src_ds` to the (equally sized) 
+        `dst_ds` window by window. The windows are aligned to the block layout
+        of the destination dataset, so the peak memory usage is bounded by the
+        window size and not by the size of the raster.
+    """
+    band_list = range(1, src_ds.RasterCount + 1)
+    buf_type = dst_ds.GetRasterBand(1).DataType
+    window_x, window_y = get_window_size(dst_ds, max_pixels)
+    
+    for x, y, size_x, size_y in iter_windows(dst_ds.RasterXSize, 
+                                             dst_ds.RasterYSize,
+                                             window_x, window_y):
+        data = src_ds.ReadRaster(
+            x, y, size_x, size_y, buf_type=buf_type, band_list=band_list
+        )
+        dst_ds.WriteRaster(
+            x, y, size_x, size_y, data, buf_type=buf_type, band_list=band_list
+        )
+
+
 def copy_projection(src_ds, dst_ds):
     """ Copy the projection and geotransform from on dataset to another """
     dst_ds.SetProjection(src_ds.GetProjection())
@@ -34,6 +34,7 @@
 import re 
 import logging
 import math
+import threading
 
 from eoxserver.contrib import osr
 from eoxserver.core.config import get_eoxserver_config
@@ -242,7 +243,7 @@ _gerexProj4Str = re.compile(r"^\+init=epsg:(\d+)$")
 def validateEPSGCode( string ) : 
     """Check whether the given string is a valid EPSG code (True) or not (False)""" 
     try:
-        osr.SpatialReference().ImportFromEPSG(int(string)) 
+        registry.get(int(string))
     except (ValueError, RuntimeError): 
         return False
     return True
@@ -370,39 +371,147 @@ def getAxesSwapper( epsg , swapAxes = None ) :
 def isProjected( epsg ) : 
     """Is the coordinate system projected (True) or Geographic (False)? """
 
-    spat_ref = osr.SpatialReference() 
-    spat_ref.ImportFromEPSG(epsg)
-    return bool( spat_ref.IsProjected() ) 
+    return registry.get(epsg).is_projected
 
 
 def crs_bounds(srid):
     """ Get the maximum bounds of the CRS. """
 
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
-        
-    if srs.IsGeographic():
-        return (-180.0, -90.0, 180.0, 90.0)
-    else:
-        earth_circumference = 2 * math.pi * srs.GetSemiMajor()
-    
-        return (
-            -earth_circumference,
-            -earth_circumference,
-            earth_circumference,
-            earth_circumference
-        )
+    return registry.get(srid).bounds
+
 
 def crs_tolerance(srid):
     """ Get the "tolerance" of the CRS """
 
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
-        
-    if srs.IsGeographic():
-        return 1e-8
-    else:
-        return 1e-2
+    return registry.get(srid).tolerance
+
+#-------------------------------------------------------------------------------
+# CRS registry
+
+class CRSInfo(object):
+    """ Parsed spatial reference of an EPSG code and its derived properties. 
+    Instances are shared within the process and must not be modified. """
+
+    def __init__(self, epsg):
+        self.epsg = epsg
+        self.spatial_reference = sr = osr.SpatialReference(epsg)
+
+        self.is_projected = bool(sr.IsProjected())
+        self.is_geographic = bool(sr.IsGeographic())
+        self.swapped_axes = hasSwappedAxes_slow(epsg)
+
+        self.wkt = sr.wkt
+        self.proj = sr.proj
+        self.short_code = asShortCode(epsg)
+        self.url = asURL(epsg)
+        self.urn = asURN(epsg)
+
+        if self.is_geographic:
+            self.bounds = (-180.0, -90.0, 180.0, 90.0)
+            self.tolerance = 1e-8
+        else:
+            earth_circumference = 2 * math.pi * sr.GetSemiMajor()
+            self.bounds = (
+                -earth_circumference,
+                -earth_circumference,
+                earth_circumference,
+                earth_circumference
+            )
+            self.tolerance = 1e-2
+
+
+class CRSRegistry(object):
+    """ Process wide and thread-safe registry of parsed spatial references 
+    (see `CRSInfo`) and coordinate transformations keyed by EPSG codes. As
+    coordinate transformations must not be shared between threads, they are
+    cached per thread. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._crss = {}
+        self._local = threading.local()
+
+    def get(self, epsg):
+        """ Get the `CRSInfo` for the given EPSG code. Raises a `RuntimeError`
+        if the code is not recognized by GDAL/Proj. """
+        epsg = int(epsg)
+        try:
+            return self._crss[epsg]
+        except KeyError:
+            pass
+
+        info = CRSInfo(epsg)
+        with self._lock:
+            return self._crss.setdefault(epsg, info)
+
+    def _get_local_cache(self, name):
+        cache = getattr(self._local, name, None)
+        if cache is None:
+            cache = {}
+            setattr(self._local, name, cache)
+        return cache
+
+    def get_transformation(self, src_epsg, dst_epsg):
+        """ Get the (OSR) coordinate transformation between the given EPSG 
+        codes. """
+        cache = self._get_local_cache("transformations")
+        key = (int(src_epsg), int(dst_epsg))
+        try:
+            return cache[key]
+        except KeyError:
+            transformation = cache[key] = osr.CoordinateTransformation(
+                self.get(key[0]).spatial_reference.sr,
+                self.get(key[1]).spatial_reference.sr
+            )
+            return transformation
+
+    def get_coord_transform(self, src_epsg, dst_epsg):
+        """ Get the coordinate transformation between the given EPSG codes as 
+        object usable with the ``transform()`` method of GeoDjango 
+        geometries. """
+        from django.contrib.gis.gdal import CoordTransform, SpatialReference
+
+        cache = self._get_local_cache("coord_transforms")
+        key = (int(src_epsg), int(dst_epsg))
+        try:
+            return cache[key]
+        except KeyError:
+            transform = cache[key] = CoordTransform(
+                SpatialReference(key[0]), SpatialReference(key[1])
+            )
+            return transform
+
+    def clear(self):
+        """ Clear the registry. Only the transformations of the current thread
+        are discarded. """
+        with self._lock:
+            self._crss = {}
+        self._local.__dict__.clear()
+
+
+#: The process wide CRS registry
+registry = CRSRegistry()
+
+
+def get_crs(epsg):
+    """ Get the shared `CRSInfo` of the given EPSG code. """
+    return registry.get(epsg)
+
+def get_spatial_reference(epsg):
+    """ Get the shared spatial reference of the given EPSG code. The returned
+    object must not be modified. """
+    return registry.get(epsg).spatial_reference
+
+def get_transformation(src_epsg, dst_epsg):
+    """ Get the cached (OSR) coordinate transformation between the given EPSG
+    codes. """
+    return registry.get_transformation(src_epsg, dst_epsg)
+
+def get_coord_transform(src_epsg, dst_epsg):
+    """ Get the cached GeoDjango coordinate transformation between the given 
+    EPSG codes. """
+    return registry.get_coord_transform(src_epsg, dst_epsg)
+
 
 image_crss_ids = set((
     "urn:ogc:def:crs:OGC::imageCRS", "imageCRS",
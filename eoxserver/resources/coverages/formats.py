@@ -39,7 +39,7 @@ import os.path
 from django.conf import settings
 
 from eoxserver.contrib import gdal
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.config import get_eoxserver_config, get_files_stamp
 from eoxserver.core.decoders import config, typelist, strip
 
 
@@ -138,6 +138,11 @@ class FormatRegistry(object):
             path_formats_opt = None # no user defined formats' configuration 
             logger.debug( "Optional, user-defined file formats' specification not found. Only the installation defaults will be used.") 
 
+        # stamp of the formats' configuration files 
+        self.stamp, self.modified = get_files_stamp( 
+            [ path_formats_def , path_formats_opt ] 
+        ) 
+
         # load the formats' configuaration 
         self.__load_formats( path_formats_def , path_formats_opt )
 
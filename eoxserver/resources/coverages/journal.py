@@ -0,0 +1,133 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Query helpers for the catalog change journal (see `CatalogChange`).
+
+Each change of an EO object, its membership in collections, its data items or
+its range type appends entries to the journal. The identifiers of these
+entries are used as revisions: the revision of the whole catalog, of a single
+object or of a collection (including all of its contents) is the identifier of
+the latest entry affecting it. Revisions only ever increase and are thus
+suitable as `updateSequence` and as invalidation keys for caches.
+"""
+
+from django.db.models import Max, Q
+
+from eoxserver.resources.coverages.models import CatalogChange
+
+
+# maximum number of objects looked up with a single query
+QUERY_CHUNK_SIZE = 500
+
+
+def get_revision():
+    """ Get the current revision of the whole catalog. """
+    return CatalogChange.objects.aggregate(revision=Max("id"))["revision"] or 0
+
+
+def get_timestamp(revision):
+    """ Get the time of the change with the given revision or `None`. """
+    try:
+        return CatalogChange.objects.get(pk=revision).timestamp
+    except CatalogChange.DoesNotExist:
+        return None
+
+
+def get_object_revision(eo_object):
+    """ Get the revision of a single EO object. For collections, changes of
+        the contained objects are included. For coverages, changes of their
+        range type are included.
+    """
+    return get_object_revisions([eo_object])[eo_object.pk]
+
+
+def get_object_revisions(eo_objects):
+    """ Get a dict mapping the primary keys of the given EO objects to their
+        revisions (see `get_object_revision`).
+    """
+    eo_objects = list(eo_objects)
+    revisions = dict((eo_object.pk, 0) for eo_object in eo_objects)
+
+    def merge(qs, field, keys):
+        for key, revision in qs.values_list(field).annotate(Max("id")):
+            for pk in keys.get(key, ()):
+                revisions[pk] = max(revisions[pk], revision)
+
+    for i in xrange(0, len(eo_objects), QUERY_CHUNK_SIZE):
+        chunk = eo_objects[i:i + QUERY_CHUNK_SIZE]
+        pks = dict((eo_object.pk, [eo_object.pk]) for eo_object in chunk)
+
+        range_types = {}
+        for eo_object in chunk:
+            range_type_id = getattr(eo_object, "range_type_id", None)
+            if range_type_id is not None:
+                range_types.setdefault(range_type_id, []).append(eo_object.pk)
+
+        merge(
+            CatalogChange.objects.filter(object_id__in=pks.keys()),
+            "object_id", pks
+        )
+        merge(
+            CatalogChange.objects.filter(collection_id__in=pks.keys()),
+            "collection_id", pks
+        )
+        if range_types:
+            merge(
+                CatalogChange.objects.filter(
+                    range_type_id__in=range_types.keys()
+                ), "range_type_id", range_types
+            )
+
+    return revisions
+
+
+def get_range_type_revision():
+    """ Get the latest revision of any range type.
+    """
+    return CatalogChange.objects.filter(range_type_id__isnull=False) \
+        .aggregate(revision=Max("id"))["revision"] or 0
+
+
+def get_collection_revision(collection):
+    """ Get the revision of a collection, including all changes of its
+        (directly or indirectly) contained objects.
+    """
+    return CatalogChange.objects.filter(
+        Q(object_id=collection.pk) | Q(collection_id=collection.pk)
+    ).aggregate(revision=Max("id"))["revision"] or 0
+
+
+def get_update_sequence(prefix=None):
+    """ Get the `updateSequence` for capabilities documents. The catalog
+        revision is zero-padded so that the values are increasing in
+        lexicographical order, too. An optional (configured) `prefix` is
+        prepended.
+    """
+    revision = "%010d" % get_revision()
+    if prefix and prefix != "0":
+        return "%s-%s" % (prefix, revision)
+    return revision
@@ -0,0 +1,180 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+import os
+from os.path import dirname
+from optparse import make_option
+
+from django.core.management.base import CommandError, BaseCommand
+
+from eoxserver.contrib import gdal
+from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn
+)
+from eoxserver.processing.preprocessing.format import (
+    get_format_selection, GeoTIFFFormatSelection
+)
+from eoxserver.processing.preprocessing.cog import cogify, is_cloud_optimized
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+
+    args = "-i <coverage-id> [-i <coverage-id> ...] | --all"
+    help = (
+    """
+    Converts the raster data items of registered coverages in place to cloud
+    optimized GeoTIFFs: tiled GeoTIFFs with internal overviews stored in front
+    of the full resolution data. Only GeoTIFF data items stored on the local 
+    file system are converted.
+    """
+    )
+
+    option_list = BaseCommand.option_list + (
+        make_option("-i", "--identifier", dest="identifiers", 
+            action="append", default=None,
+            help=("Coverage identifier. Can be present multiple times.")
+        ),
+        make_option("--all", dest="all_coverages",
+            action="store_true", default=False,
+            help=("Convert the data items of all coverages.")
+        ),
+        make_option("--compression", dest="compression",
+            action="store", default=None,
+            choices=GeoTIFFFormatSelection.SUPPORTED_COMPRESSIONS,
+            help=("The compression technique of the output.")
+        ),
+        make_option("--blocksize", dest="blocksize",
+            action="store", type="int", default=512,
+            help=("The tile size of the output. Default is 512.")
+        ),
+        make_option("--resampling", dest="resampling",
+            action="store", default=None,
+            help=("The resampling method for the overviews.")
+        ),
+        make_option("--force", dest="force",
+            action="store_true", default=False,
+            help=("Convert data items even if they already are cloud "
+                  "optimized.")
+        ),
+    )
+
+    def handle(self, identifiers, all_coverages, compression, blocksize, 
+               resampling, force, *args, **kwargs):
+        self.verbosity = int(kwargs.get("verbosity", 1))
+
+        if all_coverages:
+            coverages = models.Coverage.objects.all()
+        elif identifiers:
+            coverages = models.Coverage.objects.filter(
+                identifier__in=identifiers
+            )
+            missing = set(identifiers) - set(
+                coverages.values_list("identifier", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    "No coverage(s) with ID(s) %s found." 
+                    % ", ".join("'%s'" % i for i in missing)
+                )
+        else:
+            raise CommandError("No coverage ID(s) given.")
+
+        format_selection = get_format_selection(
+            "COG", compression=compression, blocksize=blocksize
+        )
+
+        failed = 0
+        for coverage in coverages:
+            for data_item in coverage.data_items.filter(
+                semantic__startswith="bands"
+            ):
+                if data_item.storage or data_item.package:
+                    self.print_wrn(
+                        "Skipping data item '%s' of coverage '%s', as it is "
+                        "not stored locally." 
+                        % (data_item.location, coverage.identifier)
+                    )
+                    continue
+
+                if data_item.format and data_item.format != "GDAL/GTiff":
+                    self.print_wrn(
+                        "Skipping data item '%s' of coverage '%s', as it is "
+                        "not a GeoTIFF." 
+                        % (data_item.location, coverage.identifier)
+                    )
+                    continue
+
+                try:
+                    self._cogify(
+                        data_item.location, format_selection, resampling, 
+                        force
+                    )
+                except Exception, e:
+                    failed += 1
+                    self.print_traceback(e, kwargs)
+                    self.print_err(
+                        "Failed to convert '%s' of coverage '%s': %s"
+                        % (data_item.location, coverage.identifier, e)
+                    )
+
+        if failed:
+            raise CommandError("%d data item(s) could not be converted." 
+                               % failed)
+
+
+    def _cogify(self, filename, format_selection, resampling, force):
+        """ Convert a single file in place. The output is written to a 
+            temporary file next to the original, which is then replaced 
+            atomically. Only GeoTIFFs are converted, as the file name and the 
+            format of the data item are kept.
+        """
+        ds = gdal.Open(filename)
+        if ds.GetDriver().ShortName != "GTiff":
+            raise ValueError(
+                "Unsupported format '%s', only GeoTIFFs can be converted." 
+                % ds.GetDriver().ShortName
+            )
+        optimized = is_cloud_optimized(ds)
+        ds = None
+
+        if optimized and not force:
+            self.print_msg("'%s' is already cloud optimized." % filename, 2)
+            return
+
+        self.print_msg("Converting '%s'." % filename)
+
+        tmp_filename = filename + ".cog"
+        try:
+            cogify(
+                filename, tmp_filename, format_selection, resampling, 
+                temp_root=dirname(filename) or None
+            )
+            os.rename(tmp_filename, filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
@@ -38,13 +38,15 @@ from django.utils.dateparse import parse_datetime
 from django.contrib.gis import geos 
 
 from eoxserver.core import env
-from eoxserver.contrib import gdal, osr, ogr
+from eoxserver.contrib import osr, ogr
 from eoxserver.backends import models as backends
 from eoxserver.backends.component import BackendComponent
 from eoxserver.backends.cache import CacheContext
 from eoxserver.backends.access import connect
 from eoxserver.resources.coverages import models
 from eoxserver.resources.coverages.metadata.component import MetadataComponent
+from eoxserver.resources.coverages.metadata.fragments import fragment_cache
+from eoxserver.processing.gdal.pool import dataset_pool
 from eoxserver.resources.coverages.management.commands import (
     CommandOutputMixIn, _variable_args_cb, nested_commit_on_success
 )
@@ -260,7 +262,8 @@ class Command(CommandOutputMixIn, BaseCommand):
             data_item.save()
             all_data_items.append(data_item)
 
-            with open(connect(data_item, cache)) as f:
+            path = connect(data_item, cache)
+            with open(path) as f:
                 content = etree.parse(f)
                 reader = metadata_component.get_reader_by_test(content)
                 if reader:
@@ -272,6 +275,10 @@ class Command(CommandOutputMixIn, BaseCommand):
                         data_item.full_clean()
                         data_item.save()
 
+                    # store the pre-serialized metadata for the encoders
+                    if format == "eogml":
+                        fragment_cache.update(data_item, content, path)
+
                     for key, value in values.items():
                         if key in metadata_keys:
                             retrieved_metadata.setdefault(key, value)
@@ -379,21 +386,20 @@ class Command(CommandOutputMixIn, BaseCommand):
             all_data_items.append(data_item)
 
             # TODO: other opening methods than GDAL
-            ds = gdal.Open(connect(data_item, cache))
-            reader = metadata_component.get_reader_by_test(ds)
-            if reader:
-                values = reader.read(ds)
-
-                format = values.pop("format", None)
-                if format:
-                    data_item.format = format
-                    data_item.full_clean()
-                    data_item.save()
-
-                for key, value in values.items():
-                    if key in metadata_keys:
-                        retrieved_metadata.setdefault(key, value)
-            ds = None
+            with dataset_pool.open(connect(data_item, cache)) as ds:
+                reader = metadata_component.get_reader_by_test(ds)
+                if reader:
+                    values = reader.read(ds)
+
+                    format = values.pop("format", None)
+                    if format:
+                        data_item.format = format
+                        data_item.full_clean()
+                        data_item.save()
+
+                    for key, value in values.items():
+                        if key in metadata_keys:
+                            retrieved_metadata.setdefault(key, value)
 
         if len(metadata_keys - set(retrieved_metadata.keys())):
             raise CommandError(
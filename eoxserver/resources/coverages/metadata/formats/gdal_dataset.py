@@ -26,6 +26,8 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+from contextlib import contextmanager
+
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 
 from eoxserver.core import Component, ExtensionPoint, implements
@@ -33,18 +35,29 @@ from eoxserver.contrib import gdal
 from eoxserver.resources.coverages.metadata.interfaces import (
     MetadataReaderInterface, GDALDatasetMetadataReaderInterface
 )
-from eoxserver.processing.gdal import reftools as rt
+from eoxserver.processing.gdal import refcache
+from eoxserver.processing.gdal.pool import dataset_pool
 from eoxserver.contrib import osr
 from eoxserver.resources.coverages.formats import getFormatRegistry
 
 
+@contextmanager
 def open_gdal(obj):
+    """ Context manager yielding the given dataset, a pooled dataset for the 
+        given path or ``None`` if it cannot be opened.
+    """
     if isinstance(obj, gdal.Dataset):
-        return obj
+        yield obj
+        return
     try:
-        return gdal.Open(obj)
+        ds = dataset_pool.acquire(obj)
     except RuntimeError:
-        return None
+        yield None
+        return
+    try:
+        yield ds
+    finally:
+        dataset_pool.release(ds)
 
 
 class GDALDatasetMetadataReader(Component):
@@ -53,21 +66,24 @@ class GDALDatasetMetadataReader(Component):
     additional_readers = ExtensionPoint(GDALDatasetMetadataReaderInterface)
 
     def test(self, obj):
-        return open_gdal(obj) is not None
+        with open_gdal(obj) as ds:
+            return ds is not None
 
     def get_format_name(self, obj):
-        ds = open_gdal(obj)
-        if not ds:
-            return None
+        with open_gdal(obj) as ds:
+            if not ds:
+                return None
 
-        driver = ds.GetDriver()
-        return "GDAL/" + driver.ShortName
+            driver = ds.GetDriver()
+            return "GDAL/" + driver.ShortName
 
     def read(self, obj):
-        ds = open_gdal(obj)
-        if ds is None:
-            raise Exception("Could not parse from obj '%s'." % repr(obj))
+        with open_gdal(obj) as ds:
+            if ds is None:
+                raise Exception("Could not parse from obj '%s'." % repr(obj))
+            return self._read_ds(ds)
 
+    def _read_ds(self, ds):
         driver = ds.GetDriver()
         size = (ds.RasterXSize, ds.RasterYSize)
         values = {"size": size}
@@ -108,9 +124,8 @@ class GDALDatasetMetadataReader(Component):
             if sr.GetAuthorityName(None) == "EPSG":
                 srid = int(sr.GetAuthorityCode(None))
 
-                # get the footprint
-                rt_prm = rt.suggest_transformer(ds)
-                fp_wkt = rt.get_footprint_wkt(ds, **rt_prm)
+                # get the (cached) footprint
+                fp_wkt = refcache.get_footprint_wkt(ds)
                 footprint = GEOSGeometry(fp_wkt, srid)
 
                 if isinstance(footprint, Polygon):
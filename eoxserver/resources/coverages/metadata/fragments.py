@@ -0,0 +1,147 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+""" Cache of pre-serialized EO metadata fragments.
+
+The content of metadata data items (e.g: EO-GML) is stored in the database as
+a `MetadataFragment` when a dataset is registered. Each fragment is tagged 
+with a stamp of the data item: its location and, for locally stored files, 
+the modification time and size. Parsed fragments are additionally kept in a 
+small in-process LRU cache, so encoding a response does neither have to read 
+nor to parse the metadata file as long as it is unchanged.
+"""
+
+import os
+import threading
+from copy import deepcopy
+from collections import OrderedDict
+import logging
+
+from lxml import etree
+
+from eoxserver.backends.access import retrieve
+from eoxserver.resources.coverages.models import MetadataFragment
+
+
+logger = logging.getLogger(__name__)
+
+# maximum number of parsed fragments kept in memory
+MAX_PARSED_FRAGMENTS = 256
+
+
+def get_stamp(data_item, path=None):
+    """ Get the stamp identifying the current state of the data item. For local
+        files, this includes the modification time and the file size. Items 
+        from storages or packages are assumed not to change. Returns `None` if
+        the local file cannot be accessed.
+    """
+    if data_item.storage_id is None and data_item.package_id is None:
+        try:
+            stat = os.stat(path or data_item.location)
+        except OSError:
+            return None
+        return "%s:%r:%d" % (data_item.location, stat.st_mtime, stat.st_size)
+
+    return "%s:%s:%s" % (
+        data_item.storage_id, data_item.package_id, data_item.location
+    )
+
+
+class FragmentCache(object):
+    """ Cache for the parsed content of metadata data items. Callers receive 
+        a private copy of the cached element and are free to modify it.
+    """
+
+    def __init__(self, max_size=MAX_PARSED_FRAGMENTS):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._parsed = OrderedDict()
+
+    def get(self, data_item):
+        """ Get the root element of the metadata of the given data item. The
+            stored fragment is refreshed if it is missing or outdated.
+        """
+        stamp = get_stamp(data_item)
+        key = (data_item.pk, stamp)
+
+        with self._lock:
+            element = self._parsed.pop(key, None)
+            if element is not None:
+                self._parsed[key] = element
+                return deepcopy(element)
+
+        try:
+            fragment = data_item.metadata_fragment
+        except MetadataFragment.DoesNotExist:
+            fragment = None
+
+        if fragment is not None and stamp in (fragment.stamp, None):
+            element = etree.fromstring(fragment.content.encode("utf-8"))
+        else:
+            element = self.update(data_item)
+
+        self._remember(key, element)
+        return deepcopy(element)
+
+    def update(self, data_item, tree=None, path=None):
+        """ (Re-)create the stored fragment of a data item. If the already 
+            parsed `tree` is passed, the file is not read again. Returns the 
+            root element.
+        """
+        if tree is None:
+            path = path or retrieve(data_item)
+            with open(path) as f:
+                tree = etree.parse(f)
+
+        element = tree.getroot() if hasattr(tree, "getroot") else tree
+        stamp = get_stamp(data_item, path) or ""
+
+        logger.debug("Storing metadata fragment for %s." % data_item)
+
+        try:
+            fragment = MetadataFragment.objects.get(data_item=data_item)
+        except MetadataFragment.DoesNotExist:
+            fragment = MetadataFragment(data_item=data_item)
+
+        fragment.stamp = stamp
+        fragment.content = etree.tostring(element, encoding=unicode)
+        fragment.save()
+        data_item.metadata_fragment = fragment
+        return element
+
+    def clear(self):
+        with self._lock:
+            self._parsed.clear()
+
+    def _remember(self, key, element):
+        with self._lock:
+            self._parsed[key] = element
+            while len(self._parsed) > self._max_size:
+                self._parsed.popitem(last=False)
+
+
+#: the process wide fragment cache
+fragment_cache = FragmentCache()
@@ -33,10 +33,13 @@ from itertools import chain
 from django.core.exceptions import ValidationError
 from django.contrib.gis.db import models
 from django.utils.timezone import now
+from django.db.models import Min, Max
+from django.db.models.signals import post_save, post_delete
 
 from eoxserver.core import models as base
 from eoxserver.contrib import gdal, osr
 from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import crss, tileindex
 from eoxserver.resources.coverages.util import (
     detect_circular_reference, collect_eo_metadata, is_same_grid
 )
@@ -101,9 +104,8 @@ class Extent(models.Model):
     @property
     def spatial_reference(self):
         if self.srid is not None:
-            sr = osr.SpatialReference()
-            sr.ImportFromEPSG(self.srid)
-            return sr
+            # shared instance from the CRS registry; must not be modified
+            return crss.get_spatial_reference(self.srid)
         else:
             return self.projection.spatial_reference
     
@@ -180,7 +182,7 @@ class EOObject(base.Castable, EOMetadata):
     type_registry = EO_OBJECT_TYPE_REGISTRY
 
 
-    objects = models.GeoManager()
+    objects = base.CastableManager()
 
 
     def __init__(self, *args, **kwargs):
@@ -230,6 +232,22 @@ class MetadataItem(models.Model):
         verbose_name_plural = "Metadata Items"
 
 
+class MetadataFragment(models.Model):
+    """ Pre-serialized content of a metadata data item (e.g: EO-GML). The
+        `stamp` identifies the state of the file the fragment was created from
+        (see `eoxserver.resources.coverages.metadata.fragments`).
+    """
+    data_item = models.OneToOneField(
+        backends.DataItem, related_name="metadata_fragment"
+    )
+    stamp = models.CharField(max_length=256)
+    content = models.TextField()
+
+    class Meta:
+        verbose_name = "Metadata Fragment"
+        verbose_name_plural = "Metadata Fragments"
+
+
 #===============================================================================
 # Identifier reservation
 #===============================================================================
@@ -498,6 +516,9 @@ class Coverage(EOObject, Extent, backends.Dataset):
 
     visible = models.BooleanField(default=False) # True means that the dataset is visible in the GetCapabilities response
 
+    cast_select_related = ("range_type",)
+    cast_prefetch_related = ("data_items",)
+
     @property
     def size(self):
         return self.size_x, self.size_y
@@ -518,7 +539,7 @@ class Coverage(EOObject, Extent, backends.Dataset):
     def resolution(self):
         return (self.resolution_x, self.resolution_y)
 
-    objects = models.GeoManager()
+    objects = base.CastableManager()
     
 
 class Collection(EOObject):
@@ -527,7 +548,7 @@ class Collection(EOObject):
 
     eo_objects = models.ManyToManyField(EOObject, through="EOObjectToCollectionThrough", related_name="collections")
 
-    objects = models.GeoManager()
+    objects = base.CastableManager()
 
     def insert(self, eo_object, through=None):
         # TODO: a collection shall not contain itself!
@@ -596,8 +617,8 @@ class Collection(EOObject):
             return True
 
         if recursive:
-            for collection in self.eo_objects.filter(collection__isnull=False):
-                collection = collection.cast()
+            collections = self.eo_objects.filter(collection__isnull=False)
+            for collection in collections.iter_cast_bulk():
                 if collection.contains(eo_object, recursive):
                     return True
 
@@ -612,13 +633,35 @@ class Collection(EOObject):
         return iter(self.eo_objects.all())
 
     def iter_cast(self, recursive=False):
-        for eo_object in self.eo_objects.all():
-            eo_object = eo_object.cast()
+        for eo_object in self.eo_objects.iter_cast_bulk():
             yield eo_object
             if recursive and iscollection(eo_object):
                 for item in eo_object.iter_cast(recursive):
                     yield item
 
+    def iter_cast_batched(self):
+        """ Recursively iterate over all contained EO objects, casted to their
+        actual type. Other than `iter_cast()`, the collection tree is 
+        traversed level by level, issuing a single membership query per level 
+        (plus one query per actual type). Objects contained in multiple 
+        collections are only yielded once.
+        """
+        seen = set([self.pk])
+        collection_pks = [self.pk]
+        while collection_pks:
+            eo_objects = EOObject.objects.filter(
+                collections__in=collection_pks
+            ).distinct()
+
+            collection_pks = []
+            for eo_object in eo_objects.iter_cast_bulk():
+                if eo_object.pk in seen:
+                    continue
+                seen.add(eo_object.pk)
+                if iscollection(eo_object):
+                    collection_pks.append(eo_object.pk)
+                yield eo_object
+
     def __len__(self):
         if self.id == None:
             return 0
@@ -699,7 +742,7 @@ class RectifiedDataset(Coverage):
     """ Coverage type using a rectified grid.
     """
     
-    objects = models.GeoManager()
+    objects = base.CastableManager()
     
     class Meta:
         verbose_name = "Rectified Dataset"
@@ -712,7 +755,7 @@ class ReferenceableDataset(Coverage):
     """ Coverage type using a referenceable grid.
     """
     
-    objects = models.GeoManager()
+    objects = base.CastableManager()
     
     class Meta:
         verbose_name = "Referenceable Dataset"
@@ -727,7 +770,7 @@ class RectifiedStitchedMosaic(Coverage, Collection):
         NOTE: Geometry shall always be stored in the WGS84 lat/lon coordinates!
     """
     
-    objects = models.GeoManager()
+    objects = base.CastableManager()
     
     class Meta:
         verbose_name = "Rectified Stitched Mosaic"
@@ -753,23 +796,70 @@ class RectifiedStitchedMosaic(Coverage, Collection):
                 "Stitched Mosaic '%s'."  % (rectified_dataset, self.identifier)
             )
 
+        # the grid of an empty mosaic is the one of the first dataset
+        if self.eo_objects.exists():
+            extent = (
+                min(self.min_x, rectified_dataset.min_x),
+                min(self.min_y, rectified_dataset.min_y),
+                max(self.max_x, rectified_dataset.max_x),
+                max(self.max_y, rectified_dataset.max_y)
+            )
+        else:
+            extent = rectified_dataset.extent
+        self.set_grid(extent, rectified_dataset.resolution)
+
         self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
             self.eo_objects.all(), insert=[eo_object]
         )
-        # TODO: recalculate size and extent!
         self.full_clean()
-        self.save()
+
+        # update the tile index before the grid is persisted, so that a failed
+        # update does not leave an extended mosaic without the tile
+        tileindex.insert_tile(self, rectified_dataset)
+        try:
+            self.save()
+        except:
+            tileindex.remove_tile(self, rectified_dataset)
+            raise
         return
 
     def perform_removal(self, eo_object):
+        # the grid of the mosaic stays unchanged when the last dataset is 
+        # removed
+        values = RectifiedDataset.objects.filter(
+            collections=self.pk
+        ).exclude(pk=eo_object.pk).aggregate(
+            Min("min_x"), Min("min_y"), Max("max_x"), Max("max_y")
+        )
+        if values["min_x__min"] is not None:
+            self.set_grid((
+                values["min_x__min"], values["min_y__min"], 
+                values["max_x__max"], values["max_y__max"]
+            ), self.resolution)
+
         self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
             self.eo_objects.all(), exclude=[eo_object]
         )
-        # TODO: recalculate size and extent!
         self.full_clean()
-        self.save()
+
+        tileindex.remove_tile(self, eo_object)
+        try:
+            self.save()
+        except:
+            tileindex.insert_tile(self, eo_object.cast())
+            raise
         return
 
+    def set_grid(self, extent, resolution):
+        """ Sets the extent and the size of the mosaic for the given extent 
+            and resolution.
+        """
+        self.extent = extent
+        self.size = (
+            int(round((extent[2] - extent[0]) / resolution[0])),
+            int(round((extent[3] - extent[1]) / resolution[1]))
+        )
+
 EO_OBJECT_TYPE_REGISTRY[20] = RectifiedStitchedMosaic
 
 
@@ -778,7 +868,7 @@ class DatasetSeries(Collection):
         collections.
     """
 
-    objects = models.GeoManager()
+    objects = base.CastableManager()
 
     class Meta:
         verbose_name = "Dataset Series"
@@ -834,3 +924,124 @@ class VectorMask(models.Model):
     class Meta:
         verbose_name = "Vector Mask"
         verbose_name_plural = "Vector Masks"
+
+
+#===============================================================================
+# Catalog change journal
+#===============================================================================
+
+
+class CatalogChange(models.Model):
+    """ Append-only journal of changes in the catalog. The (auto-incremented)
+        primary key serves as monotonically increasing revision. Entries
+        referring to a `collection_id` record changes of objects contained
+        (directly or indirectly) in that collection. The referenced objects
+        are not linked via foreign keys, as entries outlive deleted objects.
+        See `eoxserver.resources.coverages.journal` for the query helpers.
+    """
+
+    object_id = models.IntegerField(null=True, blank=True, db_index=True)
+    collection_id = models.IntegerField(null=True, blank=True, db_index=True)
+    range_type_id = models.IntegerField(null=True, blank=True, db_index=True)
+    change = models.CharField(max_length=16)
+    timestamp = models.DateTimeField(default=now)
+
+    class Meta:
+        verbose_name = "Catalog Change"
+        verbose_name_plural = "Catalog Changes"
+
+
+def _get_containing_collection_ids(pks):
+    """ Get the IDs of all collections containing (directly or indirectly) any
+        of the given objects.
+    """
+    collection_ids = set()
+    level = set(pks)
+    while level:
+        level = set(
+            EOObjectToCollectionThrough.objects.filter(eo_object__in=level)
+            .values_list("collection", flat=True)
+        ) - collection_ids
+        collection_ids |= level
+    return collection_ids
+
+
+def _record_change(change, object_id=None, collection_id=None,
+                   range_type_id=None):
+    """ Add journal entries for the change of an object and for each
+        collection containing it.
+    """
+    entries = [
+        CatalogChange(
+            change=change, object_id=object_id, range_type_id=range_type_id
+        )
+    ]
+    if object_id is not None or collection_id is not None:
+        collection_ids = _get_containing_collection_ids(
+            [pk for pk in (object_id, collection_id) if pk is not None]
+        )
+        if collection_id is not None:
+            collection_ids.add(collection_id)
+
+        entries.extend(
+            CatalogChange(
+                change=change, object_id=object_id, collection_id=pk
+            ) for pk in collection_ids
+        )
+    CatalogChange.objects.bulk_create(entries)
+
+
+def _eo_object_saved(sender, instance, created, raw=False, **kwargs):
+    if isinstance(instance, EOObject) and not raw:
+        _record_change("created" if created else "updated", instance.pk)
+
+def _eo_object_deleted(sender, instance, **kwargs):
+    if isinstance(instance, EOObject):
+        _record_change("deleted", instance.pk)
+
+def _relation_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _record_change(
+            "inserted", instance.eo_object_id, instance.collection_id
+        )
+
+def _relation_deleted(sender, instance, **kwargs):
+    _record_change("removed", instance.eo_object_id, instance.collection_id)
+
+def _data_item_changed(sender, instance, raw=False, **kwargs):
+    if raw or instance.dataset_id is None:
+        return
+    for pk in Coverage.objects.filter(dataset_ptr=instance.dataset_id)\
+            .values_list("pk", flat=True):
+        _record_change("data", pk)
+
+def _range_type_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _record_change(
+            "rangetype", range_type_id=getattr(
+                instance, "range_type_id", instance.pk
+            )
+        )
+
+def _nil_value_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nil_value_set_id = getattr(instance, "nil_value_set_id", instance.pk)
+    for pk in Band.objects.filter(nil_value_set=nil_value_set_id)\
+            .values_list("range_type", flat=True).distinct():
+        _record_change("rangetype", range_type_id=pk)
+
+
+post_save.connect(_eo_object_saved, dispatch_uid="journal_eo_object_saved")
+post_delete.connect(_eo_object_deleted, dispatch_uid="journal_eo_object_deleted")
+post_save.connect(_relation_saved, sender=EOObjectToCollectionThrough)
+post_delete.connect(_relation_deleted, sender=EOObjectToCollectionThrough)
+post_save.connect(_data_item_changed, sender=backends.DataItem)
+post_delete.connect(_data_item_changed, sender=backends.DataItem)
+post_save.connect(_range_type_changed, sender=RangeType)
+post_delete.connect(_range_type_changed, sender=RangeType)
+post_save.connect(_range_type_changed, sender=Band)
+post_delete.connect(_range_type_changed, sender=Band)
+post_save.connect(_nil_value_changed, sender=NilValueSet)
+post_save.connect(_nil_value_changed, sender=NilValue)
+post_delete.connect(_nil_value_changed, sender=NilValue)
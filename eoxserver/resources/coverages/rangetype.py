@@ -27,7 +27,11 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import threading
+
 from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
 from eoxserver.contrib import gdal
 
 #TODO: get rid of the W* wrapper classes 
@@ -408,3 +412,105 @@ def setRangeType( rtype ) :
                     range_type = rt,
                     nil_value_set = nvset 
                     )
+
+#==============================================================================
+# process wide range type cache 
+
+class RangeTypeCache(object):
+    """ Process wide cache of fully materialized range types. The cached 
+    ``RangeType`` instances have their bands, nil value sets and nil values 
+    pre-loaded, so that iterating them does not hit the database. The cache is
+    cleared whenever any range type, band, nil value set or nil value is 
+    saved or deleted (see the signal handlers below). 
+
+    The returned objects are shared between requests and threads and must be 
+    treated as read-only. 
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._by_pk = {}
+        self._by_name = {}
+
+    def get(self, pk):
+        """ Get the range type with the given primary key. Raises 
+        ``RangeType.DoesNotExist`` if there is no such range type. """
+        try:
+            return self._by_pk[pk]
+        except KeyError:
+            return self._load(pk=pk)
+
+    def get_by_name(self, name):
+        """ Get the range type with the given name. Raises 
+        ``RangeType.DoesNotExist`` if there is no such range type. """
+        try:
+            return self._by_name[name]
+        except KeyError:
+            return self._load(name=name)
+
+    def get_for_coverage(self, coverage):
+        """ Shorthand to get the range type of a coverage. """
+        return self.get(coverage.range_type_id)
+
+    def clear(self):
+        """ Invalidate all cached range types. """
+        with self._lock:
+            self._generation += 1
+            self._by_pk = {}
+            self._by_name = {}
+
+    def _load(self, **lookup):
+        generation = self._generation
+        range_type = RangeType.objects.get(**lookup)
+
+        bands = list(
+            Band.objects.filter(range_type=range_type)
+            .select_related("nil_value_set")
+        )
+
+        nil_value_sets = dict(
+            (band.nil_value_set_id, band.nil_value_set) for band in bands
+            if band.nil_value_set_id is not None
+        )
+        nil_values = dict((pk, []) for pk in nil_value_sets)
+        for nil_value in NilValue.objects.filter(
+                nil_value_set__in=nil_value_sets.keys()):
+            nil_value.nil_value_set = nil_value_sets[nil_value.nil_value_set_id]
+            nil_values[nil_value.nil_value_set_id].append(nil_value)
+
+        for pk, nil_value_set in nil_value_sets.items():
+            nil_value_set._cached_nil_values = nil_values[pk]
+
+        for band in bands:
+            band.range_type = range_type
+            # bands sharing a nil value set share the cached instance
+            if band.nil_value_set_id is not None:
+                band.nil_value_set = nil_value_sets[band.nil_value_set_id]
+        range_type._cached_bands = bands
+
+        with self._lock:
+            # do not store structures loaded before a concurrent invalidation
+            if generation == self._generation:
+                self._by_pk[range_type.pk] = range_type
+                self._by_name[range_type.name] = range_type
+
+        return range_type
+
+
+#: the process wide range type cache
+range_type_cache = RangeTypeCache()
+
+
+def _invalidate_range_type_cache(sender, **kwargs):
+    range_type_cache.clear()
+
+for _model in (RangeType, Band, NilValueSet, NilValue):
+    post_save.connect(
+        _invalidate_range_type_cache, sender=_model, 
+        dispatch_uid="range_type_cache_%s" % _model.__name__
+    )
+    post_delete.connect(
+        _invalidate_range_type_cache, sender=_model,
+        dispatch_uid="range_type_cache_delete_%s" % _model.__name__
+    )
@@ -27,17 +27,52 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
 from datetime import datetime
+import shutil
+from tempfile import mkstemp, mkdtemp
 from StringIO import StringIO
 from textwrap import dedent
+from uuid import uuid4
+
+import numpy
 
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import utc
 
 from eoxserver.core import env
+from eoxserver.contrib import gdal, gdal_array, ogr
+from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import crss, journal, tileindex, vrtcache
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.resources.coverages.metadata.fragments import FragmentCache
+from eoxserver.core.util.rect import Rect
+from eoxserver.processing.gdal.pool import DatasetPool
+from eoxserver.processing.gdal import refcache
+from eoxserver.processing.gdal.refcache import GeoReferenceCache
+from eoxserver.processing.gdal import reftools
+from eoxserver.processing.preprocessing import (
+    PreProcessor, WMSPreProcessor, ORIG_BANDS, batch
+)
+from eoxserver.processing.preprocessing.format import (
+    FormatSelection, GeoTIFFFormatSelection, COGFormatSelection
+)
+from eoxserver.processing.preprocessing.cog import cogify, is_cloud_optimized
+from eoxserver.processing.preprocessing.optimization import (
+    AlphaBandOptimization, BandScaler, get_minmax
+)
+from eoxserver.processing.preprocessing.util import (
+    create_mem_copy, create_vrt_copy, create_temp, copy_blockwise, 
+    iter_windows, get_limits
+)
+from eoxserver.processing.gdal.overviews import (
+    parse_overview_policy, get_overview_level, get_overview_rect
+)
 from eoxserver.resources.coverages.models import *
 from eoxserver.resources.coverages.metadata.formats import (
     native, eoom, dimap_general
@@ -308,6 +343,234 @@ class ModelTests(GeometryMixIn, TestCase):
             series_2.insert(series_1)
 
 
+    def test_cast_all(self):
+        eo_objects = EOObject.objects.order_by("identifier")
+        expected = [type(eo_object.cast()) for eo_object in eo_objects]
+
+        casted = eo_objects.cast_all()
+        self.assertEqual(expected, map(type, casted))
+        self.assertEqual(
+            [eo_object.identifier for eo_object in eo_objects],
+            [eo_object.identifier for eo_object in casted]
+        )
+
+
+    def test_iter_cast_batched(self):
+        series_1, series_2 = self.series_1, self.series_2
+        series_1.insert(self.rectified_1)
+        series_1.insert(series_2)
+        series_2.insert(self.rectified_2)
+        series_2.insert(self.referenceable)
+
+        self.assertItemsEqual(
+            ["rectified-1", "series-2", "rectified-2", "referenceable-1"],
+            [eo_object.identifier for eo_object in series_1.iter_cast_batched()]
+        )
+        self.assertItemsEqual(
+            [RectifiedDataset, DatasetSeries, RectifiedDataset, 
+             ReferenceableDataset],
+            map(type, series_1.iter_cast(recursive=True))
+        )
+
+
+    def test_mosaic_grid(self):
+        mosaic = self.mosaic
+        rectified_4 = create(RectifiedDataset,
+            identifier="rectified-4",
+            footprint=MultiPolygon(Polygon.from_bbox((20, 10, 30, 15))),
+            begin_time=parse_datetime("2013-06-10T18:55:54Z"),
+            end_time=parse_datetime("2013-06-10T18:55:54Z"),
+            min_x=20, min_y=10, max_x=30, max_y=15, srid=4326, 
+            size_x=100, size_y=50,
+            range_type=self.range_type
+        )
+
+        mosaic.insert(self.rectified_1)
+        mosaic.insert(rectified_4)
+        mosaic = refresh(mosaic)
+        self.assertEqual((10, 10, 30, 20), mosaic.extent)
+        self.assertEqual((200, 100), mosaic.size)
+
+        mosaic.remove(rectified_4)
+        mosaic = refresh(mosaic)
+        self.assertEqual((10, 10, 20, 20), mosaic.extent)
+        self.assertEqual((100, 100), mosaic.size)
+
+
+    def test_mosaic_tileindex(self):
+        directory = mkdtemp()
+        try:
+            create(backends.DataItem,
+                dataset=self.mosaic, semantic="tileindex",
+                location=os.path.join(directory, "mosaic.shp")
+            )
+            for i, rectified in enumerate((self.rectified_1, self.rectified_2)):
+                create(backends.DataItem,
+                    dataset=rectified, semantic="bands[1:3]",
+                    location=os.path.join(directory, "tile-%d.tif" % i)
+                )
+                self.mosaic.insert(rectified)
+
+            self.mosaic.remove(self.rectified_1)
+
+            ds = ogr.Open(os.path.join(directory, "mosaic.shp"))
+            layer = ds.GetLayer(0)
+            self.assertEqual(1, layer.GetFeatureCount())
+            self.assertEqual(
+                os.path.join(directory, "tile-1.tif"), 
+                layer.GetNextFeature().GetField("location")
+            )
+            ds = None
+
+            # modifications only drop the spatial index, it is rebuilt lazily
+            qix = os.path.join(directory, "mosaic.qix")
+            self.assertFalse(os.path.exists(qix))
+            tileindex.ensure_spatial_index(os.path.join(directory, "mosaic.shp"))
+            self.assertTrue(os.path.exists(qix))
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_mosaic_vrt(self):
+        directory = mkdtemp()
+        try:
+            create(Band, index=0, name="gray", identifier="gray", uom="DN",
+                data_type=gdal.GDT_Byte, range_type=self.range_type
+            )
+            rectified_4 = create(RectifiedDataset,
+                identifier="rectified-4",
+                footprint=MultiPolygon(Polygon.from_bbox((20, 10, 30, 15))),
+                begin_time=parse_datetime("2013-06-10T18:55:54Z"),
+                end_time=parse_datetime("2013-06-10T18:55:54Z"),
+                min_x=20, min_y=10, max_x=30, max_y=15, srid=4326, 
+                size_x=100, size_y=50,
+                range_type=self.range_type
+            )
+            driver = gdal.GetDriverByName("GTiff")
+            for i, rectified in enumerate((self.rectified_1, rectified_4)):
+                location = os.path.join(directory, "tile-%d.tif" % i)
+                driver.Create(location, rectified.size_x, rectified.size_y, 1)
+                create(backends.DataItem,
+                    dataset=rectified, semantic="bands[1]", location=location
+                )
+                self.mosaic.insert(rectified)
+
+            path = vrtcache.get_mosaic_vrt(refresh(self.mosaic))
+            self.assertEqual(path, vrtcache.get_mosaic_vrt(self.mosaic))
+            ds = gdal.Open(path)
+            self.assertEqual((200, 100), (ds.RasterXSize, ds.RasterYSize))
+            self.assertEqual(
+                (10, 0.1, 0, 20, 0, -0.1), ds.GetGeoTransform()
+            )
+            ds = None
+
+            # a new revision invalidates the cached VRT
+            self.mosaic.remove(rectified_4)
+            updated_path = vrtcache.get_mosaic_vrt(refresh(self.mosaic))
+            self.assertNotEqual(path, updated_path)
+            self.assertFalse(os.path.exists(path))
+            os.remove(updated_path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_unavailable_vrt(self):
+        builds = []
+        def build(path):
+            builds.append(path)
+            raise ValueError("Not persistently accessible.")
+
+        # the failure is remembered for the revision of the mosaic
+        try:
+            for _ in range(2):
+                self.assertRaises(
+                    ValueError, vrtcache.get_cached_vrt, self.mosaic, build
+                )
+            self.assertEqual(1, len(builds))
+        finally:
+            directory = vrtcache.get_vrt_directory()
+            for filename in os.listdir(directory):
+                if filename.startswith("%d_" % self.mosaic.pk):
+                    os.remove(os.path.join(directory, filename))
+
+
+    def test_band_vrt(self):
+        self.assertEqual((2, 4), vrtcache.parse_band_semantic("bands[2:4]"))
+        self.assertEqual((3, 3), vrtcache.parse_band_semantic("bands[3]"))
+        self.assertEqual(None, vrtcache.parse_band_semantic("bands"))
+
+        directory = mkdtemp()
+        try:
+            driver = gdal.GetDriverByName("GTiff")
+            for index, name in enumerate(("red", "green", "blue")):
+                create(Band, index=index, name=name, identifier=name, 
+                    uom="DN", data_type=gdal.GDT_Byte, 
+                    range_type=self.range_type
+                )
+            # bands are assigned by semantic, not by insertion order
+            for semantic, values in (("bands[3]", (3,)), ("bands[1:2]", (1, 2))):
+                location = os.path.join(directory, "%s.tif" % semantic)
+                ds = driver.Create(location, 100, 100, len(values))
+                for i, value in enumerate(values, start=1):
+                    ds.GetRasterBand(i).Fill(value)
+                ds = None
+                create(backends.DataItem,
+                    dataset=self.rectified_1, semantic=semantic, 
+                    location=location
+                )
+
+            path = vrtcache.get_band_vrt(
+                self.rectified_1, self.rectified_1.data_items.all()
+            )
+            ds = gdal.Open(path)
+            self.assertEqual(3, ds.RasterCount)
+            for i in range(1, 4):
+                self.assertEqual(
+                    (i, i), ds.GetRasterBand(i).ComputeRasterMinMax()
+                )
+            ds = None
+            os.remove(path)
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_journal_revisions(self):
+        series_1, series_2 = self.series_1, self.series_2
+        series_1.insert(series_2)
+
+        revision = journal.get_revision()
+        series_1_revision = journal.get_collection_revision(series_1)
+        rectified_revision = journal.get_object_revision(self.rectified_1)
+
+        # changes of contained objects propagate to all containing collections
+        series_2.insert(self.rectified_1)
+        self.assertGreater(journal.get_revision(), revision)
+        self.assertGreater(
+            journal.get_collection_revision(series_1), series_1_revision
+        )
+        self.assertGreater(
+            journal.get_object_revision(self.rectified_1), rectified_revision
+        )
+
+        series_1_revision = journal.get_collection_revision(series_1)
+        self.rectified_1.save()
+        self.assertGreater(
+            journal.get_collection_revision(series_1), series_1_revision
+        )
+
+        series_1_revision = journal.get_collection_revision(series_1)
+        series_2.remove(self.rectified_1)
+        self.assertGreater(
+            journal.get_collection_revision(series_1), series_1_revision
+        )
+
+        # unrelated objects are not affected
+        rectified_revision = journal.get_object_revision(self.rectified_2)
+        self.rectified_1.save()
+        self.assertEqual(
+            journal.get_object_revision(self.rectified_2), rectified_revision
+        )
+
+
 class MetadataFormatTests(GeometryMixIn, TestCase):
     def test_native_reader(self):
         xml = """
@@ -523,3 +786,747 @@ class MetadataFormatTests(GeometryMixIn, TestCase):
         
 
 
+class CRSRegistryTests(TestCase):
+    def test_shared_spatial_reference(self):
+        sr = crss.get_spatial_reference(4326)
+        self.assertTrue(sr is crss.get_spatial_reference("4326"))
+        self.assertEqual(4326, sr.srid)
+
+    def test_crs_info(self):
+        info = crss.get_crs(3857)
+        self.assertTrue(info.is_projected)
+        self.assertFalse(crss.get_crs(4326).is_projected)
+        self.assertEqual(crss.crs_tolerance(4326), 1e-8)
+        self.assertEqual(crss.crs_bounds(4326), (-180.0, -90.0, 180.0, 90.0))
+
+    def test_cached_transformation(self):
+        ct = crss.get_transformation(4326, 3857)
+        self.assertTrue(ct is crss.get_transformation(4326, 3857))
+
+        poly = Polygon.from_bbox((0, 0, 1, 1))
+        poly.srid = 3857
+        poly.transform(crss.get_coord_transform(3857, 4326))
+        self.assertEqual(4326, poly.srid)
+
+    def test_invalid_code(self):
+        self.assertFalse(crss.validateEPSGCode("123456789"))
+
+
+class RangeTypeCacheTests(TestCase):
+    def setUp(self):
+        range_type_cache.clear()
+        self.range_type = create(RangeType, name="RGB")
+        self.nil_value_set = create(NilValueSet, name="nil", data_type=1)
+        create(NilValue, raw_value="0", nil_value_set=self.nil_value_set,
+            reason="http://www.opengis.net/def/nil/OGC/0/unknown"
+        )
+        for index, name in enumerate(("red", "green", "blue")):
+            create(Band, index=index, name=name, identifier=name, uom="DN",
+                data_type=1, range_type=self.range_type, 
+                nil_value_set=self.nil_value_set
+            )
+
+    def test_materialized(self):
+        range_type = range_type_cache.get(self.range_type.pk)
+        self.assertTrue(range_type is range_type_cache.get_by_name("RGB"))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                ["red", "green", "blue"], [band.name for band in range_type]
+            )
+            self.assertEqual([0], range_type[0].nil_value_set.values)
+
+    def test_invalidation(self):
+        range_type = range_type_cache.get(self.range_type.pk)
+        band = Band.objects.get(range_type=self.range_type, index=0)
+        band.name = "r"
+        band.save()
+
+        updated = range_type_cache.get(self.range_type.pk)
+        self.assertFalse(range_type is updated)
+        self.assertEqual("r", updated[0].name)
+
+
+class MetadataFragmentTests(TestCase):
+    def setUp(self):
+        fd, self.filename = mkstemp(suffix=".xml")
+        os.close(fd)
+        self.write('<a><b>1</b></a>', mtime=999999999)
+        self.data_item = create(backends.DataItem,
+            location=self.filename, format="eogml", semantic="metadata"
+        )
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def write(self, content, mtime=None):
+        with open(self.filename, "w") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+
+    def test_stored_fragment(self):
+        FragmentCache().update(self.data_item)
+
+        # same size and modification time: the file must not be read again
+        self.write('<a><b>2</b></a>', mtime=999999999)
+
+        element = FragmentCache().get(
+            backends.DataItem.objects.get(pk=self.data_item.pk)
+        )
+        self.assertEqual("1", element.find("b").text)
+
+    def test_refresh_on_change(self):
+        cache = FragmentCache()
+        element = cache.get(self.data_item)
+        self.assertEqual("1", element.find("b").text)
+
+        # returned elements are private copies
+        element.find("b").text = "x"
+        self.assertEqual("1", cache.get(self.data_item).find("b").text)
+
+        self.write('<a><b>22</b></a>', mtime=1000000000)
+        self.assertEqual("22", cache.get(self.data_item).find("b").text)
+        self.assertIn("<b>22</b>", MetadataFragment.objects.get().content)
+
+
+class DatasetPoolTests(TestCase):
+    def setUp(self):
+        fd, self.filename = mkstemp(suffix=".tif")
+        os.close(fd)
+        self.write(10)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def write(self, size, mtime=999999999):
+        ds = gdal.GetDriverByName("GTiff").Create(self.filename, size, size)
+        ds = None
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_reuse(self):
+        pool = DatasetPool(max_size=1)
+        with pool.open(self.filename) as ds_1:
+            # handles in use are not shared
+            with pool.open(self.filename) as ds_2:
+                self.assertIsNot(ds_1, ds_2)
+
+        # only a single idle handle is kept
+        self.assertEqual(1, len(pool))
+        with pool.open(self.filename) as ds_3:
+            self.assertIn(ds_3, (ds_1, ds_2))
+
+    def test_revalidation(self):
+        pool = DatasetPool()
+        with pool.open(self.filename) as ds:
+            self.assertEqual(10, ds.RasterXSize)
+
+        self.write(20, mtime=1000000000)
+        with pool.open(self.filename) as ds:
+            self.assertEqual(20, ds.RasterXSize)
+
+
+class OverviewSelectionTests(TestCase):
+    def setUp(self):
+        self.ds = gdal.GetDriverByName("MEM").Create("", 1024, 1024)
+        self.ds.BuildOverviews("NEAREST", [2, 4, 8])
+        self.band = self.ds.GetRasterBand(1)
+
+    def test_policy(self):
+        self.assertEqual(0, parse_overview_policy("auto"))
+        self.assertEqual(2, parse_overview_policy("AUTO-2"))
+        self.assertEqual(None, parse_overview_policy("NONE"))
+        self.assertRaises(ValueError, parse_overview_policy, "AUTO+1")
+
+    def test_level(self):
+        # full resolution for upscaling or slight downscaling
+        self.assertEqual(
+            None, get_overview_level(self.band, (1024, 1024), (2048, 2048))
+        )
+        self.assertEqual(
+            None, get_overview_level(self.band, (1024, 1024), (700, 700))
+        )
+        # the coarsest overview at least as fine as requested
+        self.assertEqual(
+            1, get_overview_level(self.band, (1024, 1024), (200, 200))
+        )
+        self.assertEqual(
+            2, get_overview_level(self.band, (1024, 1024), (100, 100))
+        )
+        # the policy steps back to finer levels
+        self.assertEqual(
+            0, get_overview_level(self.band, (1024, 1024), (200, 200), 1)
+        )
+        self.assertEqual(
+            None, get_overview_level(self.band, (1024, 1024), (200, 200), None)
+        )
+
+    def test_rect(self):
+        self.assertEqual(
+            (25, 50, 100, 50), 
+            get_overview_rect(self.band, 1, Rect(100, 200, 400, 200))
+        )
+
+
+class GeoReferenceCacheTests(TestCase):
+    def setUp(self):
+        fd, self.filename = mkstemp(suffix=".tif")
+        os.close(fd)
+        ds = gdal.GetDriverByName("GTiff").Create(self.filename, 200, 100)
+        ds.SetGCPs([
+            gdal.GCP(10 + x * 0.05 + y * 0.01, 50 - y * 0.05, 0, x, y)
+            for x in range(0, 201, 20) for y in range(0, 101, 20)
+        ], crss.get_spatial_reference(4326).wkt)
+        ds = None
+        os.utime(self.filename, (999999999, 999999999))
+
+        # keep the cached VRTs out of the configured cache directory
+        self.directory = mkdtemp()
+        self.previous_cache = refcache.georeference_cache
+        refcache.georeference_cache = GeoReferenceCache(
+            directory=self.directory
+        )
+
+    def tearDown(self):
+        refcache.georeference_cache = self.previous_cache
+        shutil.rmtree(self.directory)
+        os.remove(self.filename)
+
+    def test_cache(self):
+        cache = GeoReferenceCache(directory=self.directory)
+        entry = cache.get(self.filename)
+        self.assertEqual(17 * 17, len(entry.grid))
+        self.assertTrue(
+            GEOSGeometry(entry.footprint_wkt).contains(
+                GEOSGeometry("POINT(15 47.5)")
+            )
+        )
+        self.assertIs(entry, cache.get(self.filename))
+        self.assertEqual(self.directory, os.path.dirname(entry.vrt_path))
+
+        # another process reads the entry from the stored VRT
+        loaded = GeoReferenceCache(directory=self.directory).get(self.filename)
+        self.assertIsNot(entry, loaded)
+        self.assertEqual(entry.transformer_options, loaded.transformer_options)
+        self.assertEqual(entry.footprint_wkt, loaded.footprint_wkt)
+        self.assertEqual(entry.vrt_path, loaded.vrt_path)
+
+        # modifications of the file invalidate the entry
+        os.utime(self.filename, (1000000000, 1000000000))
+        self.assertIsNot(entry, cache.get(self.filename))
+
+    def test_grid_approximation(self):
+        entry = GeoReferenceCache(directory=self.directory).get(self.filename)
+        exact = reftools.rect_from_subset(
+            self.filename, 4326, 12, 47, 14, 49, **entry.transformer_options
+        )
+        approximated = reftools.rect_from_subset(
+            entry.get_grid_dataset(), 4326, 12, 47, 14, 49, 
+            reftools.METHOD_TPS, 1
+        )
+        for value, approximated_value in zip(exact, approximated):
+            self.assertLessEqual(abs(value - approximated_value), 1)
+
+    def test_multithreaded_rectification(self):
+        ds = gdal.Open(self.filename, gdal.GA_Update)
+        ds.GetRasterBand(1).WriteRaster(
+            0, 0, 200, 100, str(bytearray(i % 251 for i in range(20000)))
+        )
+        ds = None
+
+        fd, single_vrt = mkstemp(suffix=".vrt")
+        os.close(fd)
+        fd, multi_vrt = mkstemp(suffix=".vrt")
+        os.close(fd)
+        # VRTs of the MapServer connectors are created in memory
+        vsimem_vrt = "/vsimem/%s.vrt" % uuid4().hex
+        try:
+            reftools.create_rectified_vrt(
+                self.filename, single_vrt, max_error=0, 
+                method=reftools.METHOD_TPS, order=1
+            )
+            single_ds = gdal.Open(single_vrt)
+            expected = single_ds.GetRasterBand(1).ReadRaster(
+                0, 0, single_ds.RasterXSize, single_ds.RasterYSize
+            )
+            single_ds = None
+
+            for vrt_path in (multi_vrt, vsimem_vrt):
+                reftools.create_rectified_vrt(
+                    self.filename, vrt_path, max_error=0, 
+                    method=reftools.METHOD_TPS, order=1,
+                    num_threads=2, block_size=(64, 32)
+                )
+                multi_ds = gdal.Open(vrt_path)
+                self.assertEqual(
+                    [64, 32], multi_ds.GetRasterBand(1).GetBlockSize()
+                )
+                self.assertEqual(expected, 
+                    multi_ds.GetRasterBand(1).ReadRaster(
+                        0, 0, multi_ds.RasterXSize, multi_ds.RasterYSize
+                    )
+                )
+                multi_ds = None
+        finally:
+            os.remove(single_vrt)
+            os.remove(multi_vrt)
+            gdal.Unlink(vsimem_vrt)
+
+
+class PreProcessorFootprintTests(TestCase):
+    """ Compares the footprints generated on the decimated grid with the ones
+        of the full resolution mask.
+    """
+
+    resolution = 0.01
+
+    def setUp(self):
+        # the raster size is not a multiple of the decimation factors, the 
+        # valid area reaches the right border
+        self.ds = gdal.GetDriverByName("MEM").Create("", 203, 157, 2)
+        self.ds.SetGeoTransform(
+            [10, self.resolution, 0, 50, 0, -self.resolution]
+        )
+        self.ds.SetProjection(crss.get_spatial_reference(4326).wkt)
+        y, x = numpy.mgrid[0:157, 0:203]
+        valid = (y >= 10) & (y < 150) & (x >= 20 + y // 4)
+        self.ds.GetRasterBand(1).WriteArray(
+            numpy.where(valid, 1 + (x + y) % 200, 0).astype(numpy.uint8)
+        )
+        self.ds.GetRasterBand(2).WriteArray(
+            numpy.where(valid & (x % 2 == 0), 7, 0).astype(numpy.uint8)
+        )
+
+    def full_resolution_footprint(self, simplification_factor):
+        """ The footprint as generated on the full resolution mask. """
+        mask = numpy.zeros((157, 203), dtype=numpy.bool)
+        for i in (1, 2):
+            mask |= self.ds.GetRasterBand(i).ReadAsArray() != 0
+
+        tmp_ds = gdal.GetDriverByName("MEM").Create("", 205, 159, 1)
+        tmp_ds.SetGeoTransform(self.ds.GetGeoTransform())
+        tmp_band = tmp_ds.GetRasterBand(1)
+        tmp_band.WriteArray(mask.astype(numpy.uint8))
+
+        ogr_ds = ogr.GetDriverByName("Memory").CreateDataSource("out")
+        layer = ogr_ds.CreateLayer("poly", None, ogr.wkbPolygon)
+        layer.CreateField(ogr.FieldDefn("DN", ogr.OFTInteger))
+        gdal.Polygonize(tmp_band, tmp_band, layer, 0)
+        self.assertEqual(1, layer.GetFeatureCount())
+
+        geometry = layer.GetNextFeature().GetGeometryRef().Clone()
+        return geometry.SimplifyPreserveTopology(
+            simplification_factor * self.resolution
+        )
+
+    def test_tolerance(self):
+        extent = ogr.CreateGeometryFromWkt(
+            Polygon.from_bbox((10, 48.43, 12.03, 50)).wkt
+        ).Buffer(self.resolution / 100)
+
+        for factor in (1, 2, 5):
+            expected = self.full_resolution_footprint(factor)
+            footprint = ogr.CreateGeometryFromWkt(
+                PreProcessor(
+                    None, simplification_factor=factor
+                )._generate_footprint_wkt(self.ds)
+            )
+
+            # the bound stated in PreProcessor._generate_footprint_wkt
+            tolerance = 1.01 * (2 + 2 ** 0.5) * factor * self.resolution
+            self.assertTrue(footprint.Buffer(tolerance).Contains(expected))
+            self.assertTrue(expected.Buffer(tolerance).Contains(footprint))
+            self.assertTrue(extent.Contains(footprint))
+
+
+class PNGFormatSelection(FormatSelection):
+    """ Format selection of a driver without `Create()` support. """
+    format_name = None # not registered
+    driver_name = "PNG"
+    extension = ".png"
+
+
+class PreProcessorWriteTests(TestCase):
+    """ Checks that the output written window by window equals a plain 
+        `CreateCopy()` of the same processing chain.
+    """
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = os.path.join(self.directory, "input.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(self.filename, 301, 203, 3)
+        ds.SetGeoTransform([10, 0.01, 0, 50, 0, -0.01])
+        ds.SetProjection(crss.get_spatial_reference(4326).wkt)
+        y, x = numpy.mgrid[0:203, 0:301]
+        valid = (y >= 10) & (x >= 30 + y // 3)
+        for i in (1, 2, 3):
+            ds.GetRasterBand(i).WriteArray(
+                numpy.where(valid, 1 + (x * i + y) % 250, 0).astype(numpy.uint8)
+            )
+        ds = None
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, ds):
+        return [
+            ds.GetRasterBand(i).ReadRaster(0, 0, ds.RasterXSize, ds.RasterYSize)
+            for i in range(1, ds.RasterCount + 1)
+        ]
+
+    def assertSameOutput(self, format_selection, footprint_alpha):
+        preprocessor = PreProcessor(
+            format_selection, footprint_alpha=footprint_alpha, 
+            bandmode=ORIG_BANDS
+        )
+        src_ds = gdal.Open(self.filename)
+        footprint_wkt = preprocessor._generate_footprint_wkt(
+            create_vrt_copy(src_ds)
+        )
+        driver = gdal.GetDriverByName(format_selection.driver_name)
+
+        # the previous implementation: a full In-Memory copy of the chain
+        mem_ds = create_mem_copy(src_ds)
+        if footprint_alpha:
+            AlphaBandOptimization()(mem_ds, footprint_wkt)
+        expected_ds = driver.CreateCopy(
+            os.path.join(self.directory, "expected" + format_selection.extension),
+            mem_ds, options=format_selection.creation_options
+        )
+
+        out_ds = preprocessor._write(
+            create_vrt_copy(src_ds), 
+            os.path.join(self.directory, "output" + format_selection.extension),
+            footprint_wkt, format_selection.creation_options
+        )
+        out_ds.FlushCache()
+
+        self.assertEqual(expected_ds.RasterCount, out_ds.RasterCount)
+        self.assertEqual(self.read(expected_ds), self.read(out_ds))
+        if format_selection.driver_name == "GTiff":
+            self.assertEqual(
+                expected_ds.GetGeoTransform(), out_ds.GetGeoTransform()
+            )
+            self.assertEqual(
+                expected_ds.GetProjection(), out_ds.GetProjection()
+            )
+
+    def test_blockwise(self):
+        self.assertSameOutput(GeoTIFFFormatSelection(blocksize=64), False)
+
+    def test_blockwise_alpha(self):
+        self.assertSameOutput(GeoTIFFFormatSelection(blocksize=64), True)
+
+    def test_create_copy_fallback(self):
+        self.assertNotEqual(
+            "YES", gdal.GetDriverByName("PNG").GetMetadataItem(gdal.DCAP_CREATE)
+        )
+        self.assertSameOutput(PNGFormatSelection(), False)
+        self.assertSameOutput(PNGFormatSelection(), True)
+
+    def test_windows(self):
+        src_ds = gdal.Open(self.filename)
+        dst_ds = create_temp(301, 203, 3, temp_dir=self.directory)
+        self.assertEqual([256, 256], dst_ds.GetRasterBand(1).GetBlockSize())
+
+        # several windows, cropped at the right and lower border
+        windows = list(iter_windows(301, 203, 128, 64))
+        self.assertEqual(12, len(windows))
+        self.assertEqual((256, 192, 45, 11), windows[-1])
+        self.assertEqual(301 * 203, sum(w[2] * w[3] for w in windows))
+
+        copy_blockwise(src_ds, dst_ds, max_pixels=256 * 256)
+        self.assertEqual(self.read(src_ds), self.read(dst_ds))
+
+
+class BatchPreprocessingTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.output_dir = os.path.join(self.directory, "out")
+        os.mkdir(self.output_dir)
+        for i in range(3):
+            ds = gdal.GetDriverByName("GTiff").Create(
+                os.path.join(self.directory, "scene-%d.tif" % i), 32, 32
+            )
+            ds.SetGeoTransform([10 + i, 0.01, 0, 50, 0, -0.01])
+            ds.SetProjection(crss.get_spatial_reference(4326).wkt)
+            ds.GetRasterBand(1).Fill(i + 1)
+            ds = None
+
+        self.broken = os.path.join(self.directory, "broken.tif")
+        with open(self.broken, "w") as f:
+            f.write("not a raster")
+
+        self.preprocessor = WMSPreProcessor(
+            GeoTIFFFormatSelection(), overviews=False, bandmode=ORIG_BANDS
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_items(self):
+        return batch.glob_items(
+            os.path.join(self.directory, "scene-*.tif")
+        ) + [batch.BatchItem(self.broken)]
+
+    def get_output(self, i):
+        return os.path.join(self.output_dir, "scene-%d_proc.tif" % i)
+
+    def test_read_manifest(self):
+        manifest = os.path.join(self.directory, "manifest.csv")
+        with open(manifest, "w") as f:
+            f.write(dedent("""\
+                # input, output, coverage ID, begin time, end time
+                a.tif
+
+                b.tif, out/b, cov-b, 2014-01-01T00:00:00Z, 2014-01-02T00:00:00Z
+            """))
+
+        items = batch.read_manifest(manifest)
+        self.assertEqual(2, len(items))
+        self.assertEqual("a.tif", items[0].input_filename)
+        self.assertIsNone(items[0].output_basename)
+        self.assertIsNone(items[0].coverage_id)
+        self.assertEqual("b.tif", items[1].input_filename)
+        self.assertEqual("out/b", items[1].output_basename)
+        self.assertEqual("cov-b", items[1].coverage_id)
+        self.assertEqual("2014-01-01T00:00:00Z", items[1].begin_time)
+        self.assertEqual("2014-01-02T00:00:00Z", items[1].end_time)
+
+    def test_glob_items(self):
+        self.assertEqual(
+            [os.path.join(self.directory, "scene-%d.tif" % i) 
+             for i in range(3)],
+            [item.input_filename for item in self.get_items()[:-1]]
+        )
+
+    def test_state(self):
+        filename = os.path.join(self.directory, "state.json")
+        state = batch.BatchState(filename)
+        self.assertEqual(batch.PENDING, state.get_status("a.tif"))
+        state.update("a.tif", batch.DONE, output_filename="a_proc.tif")
+        self.assertFalse(os.path.exists(filename + ".tmp"))
+
+        state = batch.BatchState(filename)
+        self.assertEqual(batch.DONE, state.get_status("a.tif"))
+        self.assertEqual("a_proc.tif", state.get("a.tif")["output_filename"])
+
+    def assertBatch(self, workers):
+        state = batch.BatchState(os.path.join(self.directory, "state.json"))
+
+        # the failing item is recorded, the others are processed
+        self.assertEqual(1, batch.run_batch(
+            self.preprocessor, self.get_items(), state, workers=workers,
+            output_dir=self.output_dir
+        ))
+        self.assertEqual(batch.FAILED, state.get_status(self.broken))
+        self.assertIn("error", state.get(self.broken))
+        for i in range(3):
+            filename = os.path.join(self.directory, "scene-%d.tif" % i)
+            self.assertEqual(batch.DONE, state.get_status(filename))
+            self.assertEqual(
+                self.get_output(i), state.get(filename)["output_filename"]
+            )
+            self.assertTrue(os.path.exists(self.get_output(i)))
+            os.remove(self.get_output(i))
+
+        # finished items are skipped when the batch is resumed, failed ones 
+        # are retried
+        state = batch.BatchState(os.path.join(self.directory, "state.json"))
+        self.assertEqual(1, batch.run_batch(
+            self.preprocessor, self.get_items(), state, workers=workers,
+            output_dir=self.output_dir
+        ))
+        for i in range(3):
+            self.assertFalse(os.path.exists(self.get_output(i)))
+
+    def test_run_batch(self):
+        self.assertBatch(1)
+
+    def test_run_batch_workers(self):
+        self.assertBatch(2)
+
+
+class BandScalingTests(TestCase):
+    """ Compares the block wise band scaling with the previous scaling of 
+        whole bands in double precision.
+    """
+
+    def previous_scaling(self, data, dmin, dmax, datatype=gdal.GDT_Byte):
+        dst_range = get_limits(datatype)
+        src_range = (float(dmin), float(dmax))
+        data = ((dst_range[1] - dst_range[0]) * 
+                ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
+                (src_range[1] - src_range[0])))
+        return data.astype(gdal_array.codes[datatype])
+
+    def assertScaled(self, data, src_datatype, dmin, dmax):
+        scaler = BandScaler(src_datatype, dmin, dmax, gdal.GDT_Byte)
+        self.assertEqual(
+            self.previous_scaling(data, dmin, dmax).tolist(), 
+            scaler(data).tolist()
+        )
+        return scaler
+
+    def test_lookup_tables(self):
+        data = numpy.arange(256, dtype=numpy.uint8).reshape(16, 16)
+        self.assertIsNotNone(self.assertScaled(data, gdal.GDT_Byte, 10, 200).lut)
+        self.assertScaled(data, gdal.GDT_Byte, 0, 255)
+
+        data = numpy.arange(0, 65536, 7).astype(numpy.uint16)
+        self.assertIsNotNone(
+            self.assertScaled(data, gdal.GDT_UInt16, 100, 40000).lut
+        )
+        self.assertScaled(data, gdal.GDT_UInt16, *get_limits(gdal.GDT_UInt16))
+
+        # signed 16 bit values are looked up with an offset of 32768
+        data = numpy.arange(-32768, 32768, 5).astype(numpy.int16)
+        scaler = self.assertScaled(data, gdal.GDT_Int16, -1000, 20000)
+        self.assertEqual(32768, scaler.lut_offset)
+        self.assertScaled(data, gdal.GDT_Int16, *get_limits(gdal.GDT_Int16))
+
+    def test_single_precision(self):
+        data = numpy.linspace(-50, 300, 10007).astype(numpy.float32)
+        scaler = self.assertScaled(data, gdal.GDT_Float32, 0.0, 255.5)
+        self.assertIsNone(scaler.lut)
+
+        # double precision sources are scaled in single precision as well
+        data = numpy.linspace(-50, 300, 10007)
+        scaled = BandScaler(gdal.GDT_Float64, 0.0, 255.5, gdal.GDT_Byte)(data)
+        difference = numpy.abs(
+            scaled.astype(numpy.int16) - 
+            self.previous_scaling(data, 0.0, 255.5).astype(numpy.int16)
+        )
+        self.assertLessEqual(difference.max(), 1)
+
+    def test_minmax(self):
+        ds = gdal.GetDriverByName("MEM").Create("", 20, 10)
+        band = ds.GetRasterBand(1)
+        band.WriteArray(
+            numpy.arange(5, 205, dtype=numpy.uint8).reshape(10, 20)
+        )
+        self.assertEqual((5.0, 204.0), tuple(get_minmax(band)))
+
+        # stored statistics are used instead of reading the data
+        band.SetMetadataItem("STATISTICS_MINIMUM", "0")
+        band.SetMetadataItem("STATISTICS_MAXIMUM", "100")
+        self.assertEqual((0.0, 100.0), get_minmax(band))
+
+
+class CloudOptimizedGeoTIFFTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.range_type = create(RangeType, name="Grey")
+        create(Band, index=0, name="grey", identifier="grey", uom="DN",
+            data_type=gdal.GDT_Byte, range_type=self.range_type
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_raster(self, name, driver_name="GTiff", options=()):
+        filename = os.path.join(self.directory, name)
+        # larger than the default minimum size of the overviews
+        mem_ds = gdal.GetDriverByName("MEM").Create("", 512, 512)
+        mem_ds.SetGeoTransform([10, 0.01, 0, 50, 0, -0.01])
+        mem_ds.SetProjection(crss.get_spatial_reference(4326).wkt)
+        mem_ds.GetRasterBand(1).WriteArray(
+            (numpy.arange(512 * 512) % 251).astype(numpy.uint8).reshape(512, 512)
+        )
+        gdal.GetDriverByName(driver_name).CreateCopy(
+            filename, mem_ds, options=list(options)
+        )
+        return filename
+
+    def create_coverage(self, identifier, *locations):
+        coverage = create(RectifiedDataset,
+            identifier=identifier, range_type=self.range_type,
+            min_x=10, min_y=44.88, max_x=15.12, max_y=50, srid=4326,
+            size_x=512, size_y=512,
+            footprint=MultiPolygon(Polygon.from_bbox((10, 44.88, 15.12, 50)))
+        )
+        for location, format, storage in locations:
+            create(backends.DataItem, 
+                dataset=coverage, location=location, format=format, 
+                storage=storage, semantic="bands[1:1]"
+            )
+        return coverage
+
+    def is_cloud_optimized(self, filename):
+        ds = gdal.Open(filename)
+        try:
+            return is_cloud_optimized(ds)
+        finally:
+            ds = None
+
+    def test_layout(self):
+        stripped = self.create_raster("stripped.tif")
+        self.assertFalse(self.is_cloud_optimized(stripped))
+
+        # internal overviews added afterwards are stored after the full 
+        # resolution data
+        tiled = self.create_raster(
+            "tiled.tif", options=("TILED=YES", "BLOCKXSIZE=64", "BLOCKYSIZE=64")
+        )
+        ds = gdal.Open(tiled, gdal.GA_Update)
+        ds.BuildOverviews("NEAREST", [2, 4])
+        ds = None
+        self.assertFalse(self.is_cloud_optimized(tiled))
+
+        output = os.path.join(self.directory, "output.tif")
+        cogify(stripped, output, COGFormatSelection(blocksize=64), levels=[2, 4])
+        self.assertTrue(self.is_cloud_optimized(output))
+
+        self.assertFalse(is_cloud_optimized(
+            gdal.GetDriverByName("MEM").Create("", 10, 10)
+        ))
+
+    def test_command(self):
+        stripped = self.create_raster("stripped.tif")
+        png = self.create_raster("image.png", "PNG")
+        with open(png) as f:
+            png_content = f.read()
+        storage = create(backends.Storage, 
+            url="http://example.com/", storage_type="HTTP"
+        )
+        self.create_coverage("cogify", 
+            (stripped, "GDAL/GTiff", None), 
+            (png, "GDAL/PNG", None),
+            ("remote.tif", "GDAL/GTiff", storage)
+        )
+
+        stderr = StringIO()
+        call_command("eoxs_cogify", identifiers=["cogify"], 
+            blocksize=64, stdout=StringIO(), stderr=stderr
+        )
+
+        # converted in place
+        self.assertTrue(self.is_cloud_optimized(stripped))
+        self.assertFalse(os.path.exists(stripped + ".cog"))
+
+        # non GeoTIFF and remote data items are skipped
+        with open(png) as f:
+            self.assertEqual(png_content, f.read())
+        self.assertIn("not a GeoTIFF", stderr.getvalue())
+        self.assertIn("not stored locally", stderr.getvalue())
+
+        # already optimized files are left as they are
+        os.utime(stripped, (1000000000, 1000000000))
+        call_command("eoxs_cogify", identifiers=["cogify"], 
+            blocksize=64, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(1000000000, os.path.getmtime(stripped))
+
+    def test_command_unsupported_format(self):
+        # the format of data items is optional
+        png = self.create_raster("image.png", "PNG")
+        with open(png) as f:
+            png_content = f.read()
+        self.create_coverage("cogify", (png, "", None))
+
+        self.assertRaises(CommandError, call_command, 
+            "eoxs_cogify", identifiers=["cogify"], stdout=StringIO(), 
+            stderr=StringIO()
+        )
+        with open(png) as f:
+            self.assertEqual(png_content, f.read())
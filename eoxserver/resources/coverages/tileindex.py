@@ -0,0 +1,256 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Maintenance of the tile indices of Rectified Stitched Mosaics.
+
+The tile index of a mosaic is an ESRI Shapefile with one polygon feature per 
+contained dataset, holding the path to the datasets' raster file (in the 
+"location" field, as expected by MapServer and the `TileIndexConnector`) and
+the primary key of the dataset. The tile index is referenced by a data item 
+of the mosaic with the "tileindex" semantic and is updated whenever a dataset 
+is inserted into or removed from the mosaic. Concurrent modifications are 
+serialized by an exclusive lock on a lock file alongside the shapefile.
+
+A quadtree spatial index lets MapServer only open the tiles intersecting a 
+request. As rebuilding it is linear in the number of tiles, modifications only
+drop the outdated index and `ensure_spatial_index` rebuilds it once before the
+tile index is used again.
+
+If the mosaic does not yet have a tile index data item, the tile index is 
+created in the configured directory::
+
+    [resources.coverages]
+    tileindex_directory=/var/eoxserver/tileindices
+"""
+
+import os
+from os.path import abspath, basename, dirname, exists, join, splitext
+import fcntl
+import logging
+from contextlib import contextmanager
+
+from django.contrib.gis.geos import Polygon
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.contrib import ogr
+from eoxserver.backends import models as backends
+
+
+logger = logging.getLogger(__name__)
+
+TILEINDEX_SEMANTIC = "tileindex"
+LOCATION_FIELD = "location"
+ID_FIELD = "eo_id"
+
+
+class TileIndexConfigReader(config.Reader):
+    section = "resources.coverages"
+    tileindex_directory = config.Option(default=None)
+
+
+def get_tile_location(dataset):
+    """ Returns the absolute path of the raster file of a dataset or ``None``
+        if the dataset cannot be referenced in a tile index. This is only 
+        possible for datasets stored in a single, locally accessible file.
+    """
+    data_items = [
+        data_item for data_item in dataset.data_items.all()
+        if data_item.semantic.startswith("bands")
+    ]
+    if len(data_items) != 1:
+        return None
+
+    data_item = data_items[0]
+    if data_item.storage_id is not None or data_item.package_id is not None:
+        return None
+    return abspath(data_item.location)
+
+
+def get_tileindex_item(mosaic, create=False):
+    """ Returns the tile index data item of the mosaic. If ``create`` is set 
+        and the mosaic does not have one yet, it is created in the configured
+        directory. Returns ``None`` if no tile index is available.
+    """
+    try:
+        return mosaic.data_items.get(semantic=TILEINDEX_SEMANTIC)
+    except backends.DataItem.DoesNotExist:
+        pass
+
+    if not create:
+        return None
+
+    directory = TileIndexConfigReader(
+        get_eoxserver_config()
+    ).tileindex_directory
+    if not directory:
+        logger.warning(
+            "No tile index directory configured. The tile index of the "
+            "mosaic '%s' is not maintained." % mosaic.identifier
+        )
+        return None
+
+    data_item = backends.DataItem(
+        dataset=mosaic, semantic=TILEINDEX_SEMANTIC, format="ESRI Shapefile",
+        location=join(abspath(directory), "%s.shp" % mosaic.identifier)
+    )
+    data_item.full_clean()
+    data_item.save()
+    return data_item
+
+
+def insert_tile(mosaic, dataset):
+    """ Adds (or replaces) the entry of the dataset in the tile index of the 
+        mosaic.
+    """
+    location = get_tile_location(dataset)
+    if location is None:
+        logger.warning(
+            "Dataset '%s' cannot be referenced in the tile index of the mosaic "
+            "'%s'." % (dataset.identifier, mosaic.identifier)
+        )
+        return
+
+    data_item = get_tileindex_item(mosaic, create=True)
+    if data_item is None:
+        return
+
+    with _locked(data_item.location):
+        ds, layer = _open_tileindex(data_item.location, mosaic)
+        deleted = _delete_tiles(layer, dataset.pk)
+
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField(LOCATION_FIELD, location.encode("utf-8"))
+        feature.SetField(ID_FIELD, dataset.pk)
+        feature.SetGeometry(
+            ogr.CreateGeometryFromWkt(Polygon.from_bbox(dataset.extent).wkt)
+        )
+        if layer.CreateFeature(feature) != 0:
+            raise RuntimeError(
+                "Could not add dataset '%s' to the tile index '%s'." 
+                % (dataset.identifier, data_item.location)
+            )
+
+        _finalize(ds, layer, deleted)
+
+
+def remove_tile(mosaic, dataset):
+    """ Removes the entry of the dataset from the tile index of the mosaic.
+    """
+    data_item = get_tileindex_item(mosaic)
+    if data_item is None or not exists(data_item.location):
+        return
+
+    with _locked(data_item.location):
+        ds, layer = _open_tileindex(data_item.location, mosaic)
+        _finalize(ds, layer, _delete_tiles(layer, dataset.pk))
+
+
+def ensure_spatial_index(path):
+    """ Builds the spatial index of the tile index at `path`, if it is 
+        missing (e.g: after the tile index was modified).
+    """
+    index_path = splitext(path)[0] + ".qix"
+    if exists(index_path) or not exists(path):
+        return
+
+    with _locked(path):
+        if exists(index_path):
+            return # built concurrently
+
+        ds = ogr.Open(path, 1)
+        ds.ExecuteSQL("CREATE SPATIAL INDEX ON %s" % ds.GetLayer(0).GetName())
+        ds.SyncToDisk()
+        ds = None
+
+
+@contextmanager
+def _locked(path):
+    """ Holds an exclusive lock for the tile index at `path`, which serializes
+        its modifications across threads and processes.
+    """
+    directory = dirname(path)
+    if not exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # might have been created concurrently
+            if not exists(directory):
+                raise
+
+    with open(splitext(path)[0] + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _open_tileindex(path, mosaic):
+    """ Opens the tile index for update or creates it, if it does not exist.
+    """
+    if exists(path):
+        ds = ogr.Open(path, 1)
+        if ds is None:
+            raise RuntimeError("Could not open the tile index '%s'." % path)
+        return ds, ds.GetLayer(0)
+
+    driver = ogr.GetDriverByName("ESRI Shapefile")
+    ds = driver.CreateDataSource(path)
+    layer = ds.CreateLayer(
+        splitext(basename(path))[0], mosaic.spatial_reference, ogr.wkbPolygon
+    )
+    location_field = ogr.FieldDefn(LOCATION_FIELD, ogr.OFTString)
+    location_field.SetWidth(254)
+    layer.CreateField(location_field)
+    layer.CreateField(ogr.FieldDefn(ID_FIELD, ogr.OFTInteger))
+    return ds, layer
+
+
+def _delete_tiles(layer, pk):
+    """ Deletes all entries of the dataset with the given primary key. Returns
+        ``True`` if any entry was deleted.
+    """
+    layer.SetAttributeFilter("%s = %d" % (ID_FIELD, pk))
+    fids = [feature.GetFID() for feature in layer]
+    layer.SetAttributeFilter(None)
+
+    for fid in fids:
+        layer.DeleteFeature(fid)
+    return bool(fids)
+
+
+def _finalize(ds, layer, deleted):
+    """ Removes deleted features from the files and drops the outdated 
+        spatial index (see `ensure_spatial_index`).
+    """
+    name = layer.GetName()
+    if deleted:
+        ds.ExecuteSQL("REPACK %s" % name)
+    if exists(splitext(ds.GetName())[0] + ".qix"):
+        ds.ExecuteSQL("DROP SPATIAL INDEX ON %s" % name)
+    ds.SyncToDisk()
@@ -0,0 +1,314 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Persistent cache of GDAL VRT files composed for coverages.
+
+Some coverages cannot be read from a single file: mosaics are composed of all
+their member datasets and the bands of some datasets are stored in separate
+files. For these coverages a VRT file is built that presents them as a single
+GDAL dataset. The VRT files are stored in the configured directory and are
+tagged with the revision of the coverage in the catalog change journal (see 
+`eoxserver.resources.coverages.journal`), so that they are built only once 
+per revision and are invalidated automatically whenever the coverage, its data
+items or (in case of mosaics) its members change::
+
+    [resources.coverages]
+    vrt_directory=/var/eoxserver/vrt
+    # overview levels built for mosaic VRTs
+    mosaic_overview_levels=2,4,8,16
+
+If no directory is configured, a directory private to the user of the server 
+process is created in the temporary directory.
+
+VRTs can only be cached, if all referenced files are persistently accessible;
+otherwise they are built in memory for every request.
+"""
+
+import os
+from os.path import abspath, exists, join
+import re
+import glob
+import logging
+from uuid import uuid4
+
+from eoxserver.core.config import get_eoxserver_config, get_private_directory
+from eoxserver.core.decoders import config, typelist
+from eoxserver.contrib import gdal
+from eoxserver.contrib.vrt import VRTBuilder
+from eoxserver.backends.component import BackendComponent, env
+from eoxserver.backends.access import connect
+from eoxserver.resources.coverages import models, journal
+from eoxserver.resources.coverages.rangetype import range_type_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class VRTCacheConfigReader(config.Reader):
+    section = "resources.coverages"
+    vrt_directory = config.Option(default=None)
+    mosaic_overview_levels = config.Option(type=typelist(int, ","), default=[])
+
+
+_band_semantic_re = re.compile(r"^bands(?:\[(\d+)(?::(\d+))?\])?$")
+
+
+def parse_band_semantic(semantic):
+    """ Parses the semantic of a data item containing bands ("bands", 
+        "bands[N]" or "bands[N:M]"). Returns a tuple (start, stop) of the 
+        (inclusive) band range or ``None`` if all bands are contained.
+    """
+    match = _band_semantic_re.match(semantic)
+    if not match:
+        raise ValueError("Invalid band semantic '%s'." % semantic)
+    start, stop = match.groups()
+    if start is None:
+        return None
+    start = int(start)
+    return start, int(stop) if stop is not None else start
+
+
+def get_persistent_location(data_item):
+    """ Returns a path or connection string of a data item that stays valid 
+        across requests or ``None`` if the data item is only accessible via 
+        the (temporary) cache.
+    """
+    if data_item.package_id is not None:
+        return None
+
+    storage = data_item.storage
+    if storage is None:
+        return abspath(data_item.location)
+
+    component = BackendComponent(env).get_connected_storage_component(
+        storage.storage_type
+    )
+    if component:
+        return component.connect(storage.url, data_item.location)
+    return None
+
+
+def iter_band_sources(data_items, num_bands, locate=connect):
+    """ Yields tuples (band index, location, source band index) mapping the 
+        bands of a coverage to the bands of its data items. The data items are
+        ordered by the band ranges declared in their semantics.
+    """
+    band_items = []
+    for data_item in data_items:
+        if data_item.semantic.startswith("bands"):
+            band_items.append(
+                (parse_band_semantic(data_item.semantic), data_item)
+            )
+    band_items.sort(key=lambda item: item[0])
+
+    band_index = 0
+    for band_range, data_item in band_items:
+        location = locate(data_item)
+        if location is None:
+            raise ValueError(
+                "Data item '%s' is not persistently accessible." % data_item
+            )
+
+        if band_range is None:
+            count = num_bands
+        else:
+            count = band_range[1] - band_range[0] + 1
+
+        for src_index in xrange(1, count + 1):
+            band_index += 1
+            yield band_index, str(location), src_index
+
+    if band_index != num_bands:
+        raise ValueError(
+            "The data items provide %d bands, but %d are required."
+            % (band_index, num_bands)
+        )
+
+
+def is_persistent(data_items):
+    """ Checks whether all band data items are persistently accessible. 
+    """
+    return all(
+        get_persistent_location(data_item) is not None
+        for data_item in data_items 
+        if data_item.semantic.startswith("bands")
+    )
+
+
+def get_vrt_directory():
+    return get_private_directory(
+        "vrt", VRTCacheConfigReader(get_eoxserver_config()).vrt_directory
+    )
+
+
+def get_cached_vrt(coverage, build, overview_levels=None):
+    """ Returns the path of the cached VRT of the coverage for its current 
+        revision. If it does not exist yet, it is created by calling 
+        ``build(path)`` and VRTs of previous revisions are removed. If 
+        ``build`` raises a ``ValueError`` (e.g: as the sources are not 
+        persistently accessible), this is remembered for the revision and 
+        a ``ValueError`` is raised without building again.
+    """
+    directory = get_vrt_directory()
+    revision = journal.get_object_revision(coverage)
+    path = join(directory, "%d_%d.vrt" % (coverage.pk, revision))
+    marker = path + ".unavailable"
+    if exists(path):
+        return path
+    elif exists(marker):
+        raise ValueError(
+            "No VRT can be built for '%s' (revision %d)."
+            % (coverage.identifier, revision)
+        )
+
+    logger.debug(
+        "Building VRT for '%s' (revision %d)." 
+        % (coverage.identifier, revision)
+    )
+
+    # build the VRT in a temporary file and move it in place afterwards, so 
+    # that concurrent requests never see incomplete files
+    tmp_path = join(directory, "tmp_%s.vrt" % uuid4().hex)
+    try:
+        build(tmp_path)
+        if overview_levels:
+            ds = gdal.Open(tmp_path)
+            ds.BuildOverviews("AVERAGE", overview_levels)
+            ds = None
+            os.rename(tmp_path + ".ovr", path + ".ovr")
+        os.rename(tmp_path, path)
+    except ValueError:
+        open(marker, "w").close()
+        remove_previous_revisions(directory, coverage, path)
+        raise
+    finally:
+        for filename in (tmp_path, tmp_path + ".ovr"):
+            if exists(filename):
+                os.remove(filename)
+
+    remove_previous_revisions(directory, coverage, path)
+    return path
+
+
+def remove_previous_revisions(directory, coverage, path):
+    """ Removes the VRTs (and markers) of previous revisions of the coverage.
+    """
+    for filename in glob.glob(join(directory, "%d_*.vrt*" % coverage.pk)):
+        if not filename.startswith(path):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+def build_mosaic_vrt(mosaic, path, locate=get_persistent_location):
+    """ Builds a VRT for a Rectified Stitched Mosaic, composed of windows for
+        each of its members. The VRT is written to `path` once the returned 
+        dataset is closed.
+    """
+    range_type = range_type_cache.get_for_coverage(mosaic)
+    res_x, res_y = mosaic.resolution
+
+    builder = VRTBuilder(mosaic.size_x, mosaic.size_y, vrt_filename=path)
+    ds = builder.dataset
+    ds.SetGeoTransform([mosaic.min_x, res_x, 0, mosaic.max_y, 0, -res_y])
+    ds.SetProjection(mosaic.spatial_reference.ExportToWkt())
+    for band in range_type:
+        builder.add_band(band.data_type)
+
+    members = models.RectifiedDataset.objects.filter(
+        collections=mosaic.pk
+    ).prefetch_related("data_items")
+
+    for member in members:
+        src_rect = (0, 0, member.size_x, member.size_y)
+        dst_rect = (
+            int(round((member.min_x - mosaic.min_x) / res_x)),
+            int(round((mosaic.max_y - member.max_y) / res_y)),
+            member.size_x, member.size_y
+        )
+        sources = iter_band_sources(
+            member.data_items.all(), len(range_type), locate
+        )
+        for band_index, location, src_index in sources:
+            builder.add_simple_source(
+                band_index, location, src_index, src_rect, dst_rect
+            )
+
+    return ds
+
+
+def build_band_vrt(coverage, data_items, path, 
+                   locate=get_persistent_location):
+    """ Builds a VRT composing the bands of a coverage which are stored in 
+        separate files. The bands are assigned according to the semantics of 
+        the data items. The VRT is written to `path` once the returned dataset
+        is closed.
+    """
+    range_type = range_type_cache.get_for_coverage(coverage)
+
+    builder = VRTBuilder(coverage.size_x, coverage.size_y, vrt_filename=path)
+    for band in range_type:
+        builder.add_band(band.data_type)
+
+    locations = []
+    sources = iter_band_sources(data_items, len(range_type), locate)
+    for band_index, location, src_index in sources:
+        builder.add_simple_source(band_index, location, src_index)
+        locations.append(location)
+
+    ds = builder.dataset
+    if isinstance(coverage, models.ReferenceableDataset):
+        # the geo-reference is given by the GCPs of the band files
+        builder.copy_gcps(gdal.Open(locations[0]))
+    else:
+        res_x, res_y = coverage.resolution
+        ds.SetGeoTransform(
+            [coverage.min_x, res_x, 0, coverage.max_y, 0, -res_y]
+        )
+        ds.SetProjection(coverage.spatial_reference.ExportToWkt())
+    return ds
+
+
+def get_band_vrt(coverage, data_items):
+    """ Returns the path to the cached VRT composing the bands of the coverage
+        stored in the given data items.
+    """
+    return get_cached_vrt(
+        coverage, lambda path: build_band_vrt(coverage, data_items, path)
+    )
+
+
+def get_mosaic_vrt(mosaic):
+    """ Returns the path to the cached VRT of the mosaic. Raises a 
+        ``ValueError`` if the band files of its members are not persistently
+        accessible.
+    """
+    return get_cached_vrt(
+        mosaic, lambda path: build_mosaic_vrt(mosaic, path),
+        VRTCacheConfigReader(get_eoxserver_config()).mosaic_overview_levels
+    )
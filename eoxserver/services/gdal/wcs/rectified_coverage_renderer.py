@@ -0,0 +1,457 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+from datetime import datetime
+from math import floor, ceil
+from os.path import abspath
+import logging
+
+from django.contrib.gis.geos import Polygon
+
+from eoxserver.core import Component, implements
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.util.rect import Rect
+from eoxserver.backends.access import connect
+from eoxserver.contrib import gdal, vsi
+from eoxserver.contrib.vrt import VRTBuilder
+from eoxserver.resources.coverages import models, crss, vrtcache
+from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.processing.gdal.pool import dataset_pool
+from eoxserver.processing.gdal.refcache import get_warp_options
+from eoxserver.processing.gdal.overviews import (
+    get_overview_policy, get_overview_level, get_overview_rect
+)
+from eoxserver.services.ows.version import Version
+from eoxserver.services.ows.common.config import WCSEOConfigReader
+from eoxserver.services.ows.wcs.interfaces import WCSCoverageRendererInterface
+from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.ows.wcs.v20.fragments import description_cache
+from eoxserver.services.ows.wcs.v20.encodings.geotiff import is_compressed
+from eoxserver.services.ows.wcs.v20.util import (
+    ScaleSize, ScaleExtent, ScaleAxis
+)
+from eoxserver.services.subset import x_axes, y_axes
+from eoxserver.services.result import ResultBuffer
+from eoxserver.services.exceptions import (
+    RenderException, InterpolationMethodNotSupportedException, 
+    InvalidOutputCrsException
+)
+from eoxserver.services.gdal.wcs.referenceable_dataset_renderer import (
+    WCSConfigReader, _get_gtiff_options, temp_vsimem_filename, 
+    get_output_path, spool_output
+)
+
+
+logger = logging.getLogger(__name__)
+
+INTERPOLATION_TRANS = {
+    "nearest-neighbour": "near",
+    "linear": "bilinear",
+    "bilinear": "bilinear",
+    "cubic": "cubic",
+    "average": "average"
+}
+
+
+class GDALRectifiedCoverageRenderer(Component):
+    """ A coverage renderer for rectified coverages using GDAL directly. Only
+        the requested window of the source files is read; range subsetting and
+        scaling are performed with VRTs, reprojection and interpolated scaling
+        with ``gdal.Warp``. Enabled with the "rectified_renderer" option of 
+        the "services.ows.wcs20" section, instead of the MapServer renderer.
+    """
+
+    implements(WCSCoverageRendererInterface)
+
+    versions = (Version(2, 0),)
+    handles = (models.RectifiedDataset, models.RectifiedStitchedMosaic)
+
+    def supports(self, params):
+        return (
+            params.version in self.versions
+            and issubclass(params.coverage.real_type, self.handles)
+            and WCSEOConfigReader(
+                get_eoxserver_config()
+            ).rectified_renderer == "gdal"
+        )
+
+    def render(self, params):
+        coverage = params.coverage.cast()
+        range_type = range_type_cache.get_for_coverage(coverage)
+
+        src_ds = self.get_source_dataset(coverage)
+        path = src_ds.GetDescription()
+        try:
+            return self.render_dataset(params, coverage, range_type, src_ds)
+        finally:
+            dataset_pool.release(src_ds)
+            src_ds = None
+            if path.startswith("/vsimem/"):
+                vsi.remove(path)
+
+    def render_dataset(self, params, coverage, range_type, src_ds):
+        subsets = params.subsets
+        if subsets:
+            subsets.srid  # this automatically checks the validity
+
+        # output format and driver
+        frmt = params.format or self.get_native_format(coverage)
+        mime_type = frmt.split(";")[0]
+        reg_format = getFormatRegistry().getFormatByMIME(mime_type)
+        backend, _, driver_name = (
+            reg_format.driver.partition("/") if reg_format else (None,) * 3
+        )
+        if backend != "GDAL":
+            raise RenderException(
+                "Unsupported output format '%s'." % mime_type, "format"
+            )
+        driver = gdal.GetDriverByName(driver_name)
+
+        resample_alg = "near"
+        if params.interpolation:
+            resample_alg = INTERPOLATION_TRANS.get(params.interpolation)
+            if not resample_alg:
+                raise InterpolationMethodNotSupportedException(
+                    "Interpolation method '%s' is not supported." 
+                    % params.interpolation
+                )
+
+        dst_srid = coverage.srid
+        if params.outputcrs is not None:
+            dst_srid = crss.parseEPSGCode(params.outputcrs,
+                (crss.fromURL, crss.fromURN, crss.fromShortCode)
+            )
+            if dst_srid is None:
+                raise InvalidOutputCrsException(
+                    "Failed to extract an EPSG code from the OutputCRS URI "
+                    "'%s'." % params.outputcrs
+                )
+
+        # the window of the source image to be read
+        src_rect = self.get_src_rect(coverage, subsets)
+
+        if params.rangesubset:
+            band_indices = params.rangesubset.get_band_indices(range_type, 1)
+        else:
+            band_indices = range(1, len(range_type) + 1)
+        bands = [range_type[index - 1] for index in band_indices]
+
+        reproject = dst_srid != coverage.srid
+        scaled_size = get_scaled_size(src_rect.size, params)
+        policy = get_overview_policy()
+
+        # the size the scaling refers to
+        native_size = src_rect.size
+        if reproject and scaled_size:
+            # the scaling refers to the size of the reprojected image
+            warped_ds = warp(
+                self.get_window(
+                    coverage, src_ds, src_rect, band_indices, bands
+                ), dst_srid, resample_alg
+            )
+            native_size = (warped_ds.RasterXSize, warped_ds.RasterYSize)
+            scaled_size = get_scaled_size(native_size, params)
+            warped_ds = None
+
+        # read from the best matching overview level when downscaling
+        read_rect, open_options = None, None
+        level = None
+        if scaled_size:
+            level = get_overview_level(
+                src_ds.GetRasterBand(1), native_size, scaled_size, policy
+            )
+        if level is not None:
+            read_rect = get_overview_rect(
+                src_ds.GetRasterBand(1), level, src_rect
+            )
+            open_options = {"OVERVIEW_LEVEL": str(level)}
+
+        if not reproject and (scaled_size is None 
+                              or (resample_alg == "near" and policy == 0)):
+            # plain windowed read, optionally scaled by the VRT
+            out_ds = self.get_window(
+                coverage, src_ds, src_rect, band_indices, bands, scaled_size,
+                read_rect, open_options
+            )
+        else:
+            window_ds = self.get_window(
+                coverage, src_ds, src_rect, band_indices, bands, 
+                read_rect=read_rect, open_options=open_options
+            )
+            out_ds = warp(window_ds, dst_srid, resample_alg, scaled_size)
+
+        size = (out_ds.RasterXSize, out_ds.RasterYSize)
+        self.check_size(size)
+
+        path_list = self.encode(
+            driver, out_ds, mime_type, getattr(params, "encoding_params", {})
+        )
+        extent = get_extent(out_ds)
+        out_ds = None
+
+        driver_metadata = driver.GetMetadata_Dict()
+        extension = driver_metadata.get("DMD_EXTENSION")
+        time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename = "%s_%s.%s" % (coverage.identifier, time_stamp, extension)
+        reference = "cid:coverage/%s" % filename
+
+        result_set = spool_output(path_list, mime_type, filename, reference)
+
+        # compressed GeoTIFFs shall not be compressed again for transfer
+        if is_compressed(params):
+            result_set[0].compressed = True
+
+        if params.mediatype and params.mediatype.startswith("multipart"):
+            encoder = WCS20EOXMLEncoder()
+            tree = encoder.encode_rectified_coverage(
+                coverage, getattr(params, "http_request", None), bands,
+                reference, mime_type, dst_srid, size, extent,
+                subsets.bounding_polygon(coverage) if subsets else None,
+                description_cache.get(encoder, coverage)
+            )
+            result_set.insert(0, 
+                ResultBuffer(encoder.serialize(tree), encoder.content_type)
+            )
+
+        return result_set
+
+    def get_source_dataset(self, coverage):
+        """ Returns the (pooled) GDAL dataset to read the coverage from. 
+            Mosaics and coverages with multiple band files are read through
+            VRTs, which are stored in ``/vsimem`` if they cannot be cached.
+        """
+        locate = lambda d: abspath(connect(d))
+        if isinstance(coverage, models.RectifiedStitchedMosaic):
+            try:
+                return dataset_pool.acquire(vrtcache.get_mosaic_vrt(coverage))
+            except ValueError:
+                # the members are not persistently accessible
+                pass
+            ds = vrtcache.build_mosaic_vrt(
+                coverage, temp_vsimem_filename(), locate
+            )
+            ds.FlushCache()
+            return ds
+
+        data_items = coverage.data_items.filter(semantic__startswith="bands")
+        if len(data_items) == 1:
+            return dataset_pool.acquire(locate(data_items[0]))
+        elif vrtcache.is_persistent(data_items):
+            return dataset_pool.acquire(
+                vrtcache.get_band_vrt(coverage, data_items)
+            )
+        ds = vrtcache.build_band_vrt(
+            coverage, data_items, temp_vsimem_filename(), locate
+        )
+        ds.FlushCache()
+        return ds
+
+    def get_native_format(self, coverage):
+        registry = getFormatRegistry()
+        for data_item in coverage.data_items.filter(
+                semantic__startswith="bands"):
+            if data_item.format:
+                native_format = registry.mapSourceToNativeWCS20(
+                    registry.getFormatByMIME(data_item.format)
+                )
+                if native_format:
+                    return native_format.mimeType
+        return "image/tiff"
+
+    @staticmethod
+    def get_src_rect(coverage, subsets):
+        """ Returns the pixel window of the coverage matching the requested 
+            subsets.
+        """
+        image_rect = Rect(0, 0, coverage.size_x, coverage.size_y)
+        if not subsets or not (subsets.has_x or subsets.has_y):
+            return image_rect
+
+        minx, miny, maxx, maxy = subsets.xy_bbox
+        srid = subsets.srid
+
+        # pixel subset
+        if srid is None:
+            minx = int(minx) if minx is not None else image_rect.offset_x
+            miny = int(miny) if miny is not None else image_rect.offset_y
+            maxx = int(maxx) if maxx is not None else image_rect.upper_x - 1
+            maxy = int(maxy) if maxy is not None else image_rect.upper_y - 1
+            subset_rect = Rect(minx, miny, maxx - minx + 1, maxy - miny + 1)
+
+        # subset in geographical coordinates
+        else:
+            extent = coverage.extent
+            if srid != coverage.srid:
+                # complete open bounds with the coverage extent and transform
+                # the bounding box to the coverages CRS
+                poly = Polygon.from_bbox(extent)
+                poly.srid = coverage.srid
+                poly.transform(crss.get_coord_transform(coverage.srid, srid))
+                bbox = [
+                    value if value is not None else default 
+                    for value, default in zip(subsets.xy_bbox, poly.extent)
+                ]
+                poly = Polygon.from_bbox(bbox)
+                poly.srid = srid
+                poly.transform(crss.get_coord_transform(srid, coverage.srid))
+                minx, miny, maxx, maxy = poly.extent
+            else:
+                minx, miny, maxx, maxy = [
+                    value if value is not None else default 
+                    for value, default in zip(subsets.xy_bbox, extent)
+                ]
+
+            res_x, res_y = coverage.resolution
+            offset_x = int(floor((minx - extent[0]) / res_x))
+            offset_y = int(floor((extent[3] - maxy) / res_y))
+            subset_rect = Rect(
+                offset_x, offset_y, 
+                upper_x=max(int(ceil((maxx - extent[0]) / res_x)), offset_x+1),
+                upper_y=max(int(ceil((extent[3] - miny) / res_y)), offset_y+1)
+            )
+
+        if not image_rect.intersects(subset_rect):
+            raise RenderException("Subset outside coverage extent.", "subset")
+
+        return subset_rect & image_rect
+
+    @staticmethod
+    def get_window(coverage, src_ds, src_rect, band_indices, bands, 
+                   size=None, read_rect=None, open_options=None):
+        """ Returns a VRT dataset reading the given window and bands of the 
+            source dataset, scaled to the given size. The window is read from
+            `read_rect` if the source is opened with an overview level.
+        """
+        read_rect = read_rect or src_rect
+        size = size or read_rect.size
+        path = src_ds.GetDescription()
+        vrt = VRTBuilder(*size)
+        for dst_index, (src_index, band) in enumerate(
+                zip(band_indices, bands), start=1):
+            vrt.add_band(band.data_type)
+            vrt.add_simple_source(
+                dst_index, path, src_index, read_rect, (0, 0) + tuple(size),
+                open_options
+            )
+
+        res_x, res_y = coverage.resolution
+        res_x *= float(src_rect.size_x) / size[0]
+        res_y *= float(src_rect.size_y) / size[1]
+        min_x = coverage.min_x + src_rect.offset_x * coverage.resolution_x
+        max_y = coverage.max_y - src_rect.offset_y * coverage.resolution_y
+
+        vrt.dataset.SetGeoTransform([min_x, res_x, 0, max_y, 0, -res_y])
+        vrt.dataset.SetProjection(coverage.spatial_reference.ExportToWkt())
+        return vrt.dataset
+
+    @staticmethod
+    def check_size(size):
+        maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
+        if maxsize is not None and (maxsize < size[0] or maxsize < size[1]):
+            raise RenderException(
+                "Requested image size %dpx x %dpx exceeds the allowed "
+                "limit maxsize=%dpx!" % (size[0], size[1], maxsize), "size"
+            )
+
+    @staticmethod
+    def encode(driver, dataset, mime_type, encoding_params):
+        """ Encode the output image to a temporary file and return the paths 
+            of the created files. Small outputs are encoded in memory.
+        """
+        options = ()
+        if mime_type == "image/tiff":
+            options = _get_gtiff_options(**encoding_params)
+
+        out_ds = driver.CreateCopy(
+            get_output_path(driver, dataset), dataset, True, 
+            ["%s=%s" % option for option in options]
+        )
+        return out_ds.GetFileList()
+
+
+def get_scaled_size(size, params):
+    """ Returns the output size for the given size according to the scaling 
+        parameters or ``None`` if no scaling was requested.
+    """
+    if params.scalefactor is None and not params.scales:
+        return None
+
+    size_x, size_y = size
+    if params.scalefactor is not None:
+        size_x = size_x / float(params.scalefactor)
+        size_y = size_y / float(params.scalefactor)
+
+    for scale in params.scales:
+        if isinstance(scale, ScaleAxis):
+            value = (size_x / float(scale.scale), size_y / float(scale.scale))
+        elif isinstance(scale, ScaleSize):
+            value = (scale.size, scale.size)
+        elif isinstance(scale, ScaleExtent):
+            value = (scale.high - scale.low, scale.high - scale.low)
+        else:
+            continue
+
+        if scale.axis in x_axes:
+            size_x = value[0]
+        elif scale.axis in y_axes:
+            size_y = value[1]
+
+    return max(int(round(size_x)), 1), max(int(round(size_y)), 1)
+
+
+def warp(ds, dst_srid, resample_alg, size=None):
+    """ Returns a (virtual) warped dataset of `ds` in the given CRS. The 
+        overview level is already selected when reading the source window, so
+        the warper must not choose one itself. The number of threads, the 
+        warp memory and the error threshold are taken from the configuration.
+    """
+    kwargs = {}
+    if size:
+        kwargs["width"], kwargs["height"] = size
+
+    options = get_warp_options()
+    if options["num_threads"]:
+        kwargs["multithread"] = True
+        kwargs["warpOptions"] = ["NUM_THREADS=%s" % options["num_threads"]]
+    if options["memory_limit"]:
+        kwargs["warpMemoryLimit"] = int(options["memory_limit"])
+    kwargs["errorThreshold"] = options["max_error"]
+
+    return gdal.Warp("", ds, options=["-ovr", "NONE"],
+        format="VRT", dstSRS="EPSG:%d" % dst_srid, resampleAlg=resample_alg,
+        **kwargs
+    )
+
+
+def get_extent(ds):
+    gt = ds.GetGeoTransform()
+    return (
+        gt[0], gt[3] + ds.RasterYSize * gt[5], 
+        gt[0] + ds.RasterXSize * gt[1], gt[3]
+    )
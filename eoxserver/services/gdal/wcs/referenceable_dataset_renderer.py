@@ -43,17 +43,23 @@ from eoxserver.core.util.rect import Rect
 from eoxserver.backends.access import connect
 from eoxserver.contrib import gdal, osr
 from eoxserver.contrib.vrt import VRTBuilder
-from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages import models, vrtcache
+from eoxserver.resources.coverages.rangetype import range_type_cache
 from eoxserver.services.ows.version import Version
-from eoxserver.services.result import ResultFile, ResultBuffer
+from eoxserver.services.result import (
+    ResultBuffer, ResultSpool, SpoolConfigReader, spool_file, 
+    RESPONSE_CHUNK_SIZE
+)
 from eoxserver.services.subset import Subsets
 from eoxserver.services.ows.wps.v10.encoders.execute_response_raw import ResultAlt
 from eoxserver.services.ows.wcs.interfaces import WCSCoverageRendererInterface
 from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.ows.wcs.v20.encodings.geotiff import is_compressed
 from eoxserver.services.exceptions import (
     RenderException, OperationNotSupportedException
 )
-from eoxserver.processing.gdal import reftools
+from eoxserver.processing.gdal import refcache
+from eoxserver.processing.gdal.pool import dataset_pool
 from eoxserver.resources.coverages.formats import getFormatRegistry
 
 
@@ -86,15 +92,27 @@ class GDALReferenceableDatasetRenderer(Component):
         # get the requested coverage, data items and range type.
         coverage = params.coverage
         data_items = coverage.data_items.filter(semantic__startswith="bands")
-        range_type = coverage.range_type
-
-        subsets = params.subsets
+        range_type = range_type_cache.get_for_coverage(coverage)
 
-        # GDAL source dataset. Either a single file dataset or a composed VRT
-        # dataset.
+        # GDAL source dataset. Either a single (pooled) file dataset or a 
+        # composed VRT dataset.
         src_ds = self.get_source_dataset(
             coverage, data_items, range_type
         )
+        path = src_ds.GetDescription()
+        try:
+            return self.render_dataset(
+                params, coverage, data_items, range_type, src_ds
+            )
+        finally:
+            dataset_pool.release(src_ds)
+            src_ds = None
+            if path.startswith("/vsimem/"):
+                gdal.Unlink(path)
+
+
+    def render_dataset(self, params, coverage, data_items, range_type, src_ds):
+        subsets = params.subsets
 
         # retrieve area of interest of the source image according to given
         # subsets
@@ -180,12 +198,10 @@ class GDALReferenceableDatasetRenderer(Component):
             time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
             filename_base = "%s_%s" % (coverage.identifier, time_stamp)
 
-            result_set = [
-                ResultFile(
-                    path_item, mime_type, "%s.%s" % (filename_base, extension),
-                    ("cid:coverage/%s" % coverage.identifier) if i == 0 else None
-                ) for i, path_item in enumerate(path_list)
-            ]
+            result_set = spool_output(
+                path_list, mime_type, "%s.%s" % (filename_base, extension),
+                "cid:coverage/%s" % coverage.identifier
+            )
 
         # ---------------------------------------------------------------------
         elif driver_backend == "EOXS": #EOxServer native backend
@@ -222,24 +238,30 @@ class GDALReferenceableDatasetRenderer(Component):
             mime_type = driver_metadata.get("DMD_MIMETYPE")
             extension = driver_metadata.get("DMD_EXTENSION")
             path_list = out_ds.GetFileList()
+            out_ds = None
 
             time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
             filename_base = "%s_%s" % (coverage.identifier, time_stamp)
 
-            result_set = [
-                ResultFile(
-                    path_item, mime_type, "%s.%s" % (filename_base, extension),
-                    ("cid:coverage/%s" % coverage.identifier) if i == 0 else None
-                ) for i, path_item in enumerate(path_list)
-            ]
+            result_set = spool_output(
+                path_list, mime_type, "%s.%s" % (filename_base, extension),
+                "cid:coverage/%s" % coverage.identifier
+            )
 
         # ---------------------------------------------------------------------
 
+        # compressed GeoTIFFs shall not be compressed again for transfer
+        if is_compressed(params):
+            for result_item in result_set:
+                result_item.compressed = True
+
         if params.mediatype and params.mediatype.startswith("multipart"):
             reference = "cid:coverage/%s" % result_set[0].filename
 
             if subsets.has_x and subsets.has_y:
-                footprint = GEOSGeometry(reftools.get_footprint_wkt(out_ds))
+                footprint = GEOSGeometry(
+                    refcache.get_footprint_wkt(src_ds, src_rect)
+                )
                 if not subsets.srid:
                     extent = footprint.extent
                 else:
@@ -263,34 +285,19 @@ class GDALReferenceableDatasetRenderer(Component):
 
     def get_source_dataset(self, coverage, data_items, range_type):
         if len(data_items) == 1:
-            return gdal.OpenShared(abspath(connect(data_items[0])))
+            return dataset_pool.acquire(abspath(connect(data_items[0])))
+        elif vrtcache.is_persistent(data_items):
+            return dataset_pool.acquire(
+                vrtcache.get_band_vrt(coverage, data_items)
+            )
         else:
-            vrt = VRTBuilder(
-                coverage.size_x, coverage.size_y,
-                vrt_filename=temp_vsimem_filename()
+            # compose the bands in a temporary VRT
+            ds = vrtcache.build_band_vrt(
+                coverage, data_items, temp_vsimem_filename(), 
+                lambda d: abspath(connect(d))
             )
-
-            # sort in ascending order according to semantic
-            data_items = sorted(data_items, key=(lambda d: d.semantic))
-
-            gcps = []
-            compound_index = 0
-            for data_item in data_items:
-                path = abspath(connect(data_item))
-
-                # iterate over all bands of the data item
-                for set_index, item_index in self._data_item_band_indices(data_item):
-                    if set_index != compound_index + 1:
-                        raise ValueError
-                    compound_index = set_index
-
-                    band = range_type[set_index]
-                    vrt.add_band(band.data_type)
-                    vrt.add_simple_source(
-                        set_index, path, item_index
-                    )
-
-            return vrt.dataset
+            ds.FlushCache()
+            return ds
 
 
     @staticmethod
@@ -317,13 +324,8 @@ class GDALReferenceableDatasetRenderer(Component):
 
         # subset in geographical coordinates
         else:
-            vrt = VRTBuilder(*image_rect.size)
-            vrt.copy_gcps(dataset)
-
-            options = reftools.suggest_transformer(dataset)
-
-            subset_rect = reftools.rect_from_subset(
-                vrt.dataset, subsets.srid, *subsets.xy_bbox, **options
+            subset_rect = refcache.rect_from_subset(
+                dataset, subsets.srid, *subsets.xy_bbox
             )
 
         # check whether or not the subsets intersect with the image
@@ -367,22 +369,19 @@ class GDALReferenceableDatasetRenderer(Component):
     @staticmethod
     def encode(driver, dataset, mime_type, encoding_params):
         """ Encode (i.e., create) the output image and return the opened GDAL
-        dataset object.
+        dataset object. Small outputs are encoded in memory (see 
+        :func:`get_output_path`).
         """
 
         # temporary filename
-        path_temp = SystemConfigReader(get_eoxserver_config()).path_temp
-        while True:
-            path = join(path_temp, "eoxs_tmp_%s" % uuid4().hex)
-            if not exists(path):
-                break
+        path = get_output_path(driver, dataset)
 
         # parse the encoding options
         options = ()
         if mime_type == "image/tiff":
             options = _get_gtiff_options(**encoding_params)
 
-        args = [("%s=%s" % key, value) for key, value in options]
+        args = ["%s=%s" % option for option in options]
         return driver.CreateCopy(path, dataset, True, args)
 
     @staticmethod
@@ -494,6 +493,69 @@ def temp_vsimem_filename():
     return "/vsimem/%s" % uuid4().hex
 
 
+def get_output_path(driver, dataset):
+    """ Returns a temporary path to encode the given dataset to with the 
+        driver. Outputs whose uncompressed size fits into the spool threshold 
+        are encoded in memory, larger ones and the ones of drivers that cannot
+        write through the VSI layer (e.g: netCDF) directly into the temporary 
+        directory.
+    """
+    reader = SpoolConfigReader(get_eoxserver_config())
+    size = dataset.RasterXSize * dataset.RasterYSize * sum(
+        gdal.GetDataTypeSize(dataset.GetRasterBand(i).DataType) / 8
+        for i in xrange(1, dataset.RasterCount + 1)
+    )
+    if (size <= reader.spool_threshold and 
+            driver.GetMetadataItem("DCAP_VIRTUALIO") == "YES"):
+        return temp_vsimem_filename()
+
+    while True:
+        path = join(reader.path_temp or "/tmp", "eoxs_tmp_%s" % uuid4().hex)
+        if not exists(path):
+            return path
+
+
+def spool_output(path_list, content_type, filename, identifier=None):
+    """ Moves the files of an encoded output into spooled results. Files in 
+        memory are copied to the spool, files on the disc are unlinked and 
+        only kept open. Only the first result is assigned the identifier.
+    """
+    result_set = []
+    try:
+        for i, path in enumerate(path_list):
+            item_identifier = identifier if i == 0 else None
+            if not path.startswith("/vsimem/"):
+                result_set.append(spool_file(
+                    path, content_type, filename, item_identifier
+                ))
+                continue
+
+            item = ResultSpool(content_type, filename, item_identifier)
+            result_set.append(item)
+            fp = gdal.VSIFOpenL(path, "rb")
+            try:
+                while True:
+                    data = gdal.VSIFReadL(1, RESPONSE_CHUNK_SIZE, fp)
+                    if not data:
+                        break
+                    item.write(data)
+            finally:
+                gdal.VSIFCloseL(fp)
+                gdal.Unlink(path)
+    except:
+        # clean up the spools and all files that were not yet spooled
+        for item in result_set:
+            item.delete()
+        for path in path_list[len(result_set):]:
+            if path.startswith("/vsimem/"):
+                gdal.Unlink(path)
+            elif exists(path):
+                remove(path)
+        raise
+
+    return result_set
+
+
 def _get_gtiff_options(compression=None, jpeg_quality=None,
                        predictor=None, interleave=None, tiling=False,
                        tilewidth=None, tileheight=None):
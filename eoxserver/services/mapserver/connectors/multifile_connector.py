@@ -31,20 +31,26 @@ from uuid import uuid4
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.access import connect
-from eoxserver.contrib import vsi, vrt
+from eoxserver.contrib import vsi
 from eoxserver.services.mapserver.interfaces import ConnectorInterface
+from eoxserver.processing.gdal.vrt import create_simple_vrt
+from eoxserver.processing.gdal import refcache
+from eoxserver.processing.gdal.pool import dataset_pool
+from eoxserver.resources.coverages.dateline import wrap_extent_around_dateline
+from eoxserver.resources.coverages import models, vrtcache
 
 
 class MultiFileConnector(Component):
     """ Connects multiple files containing the various bands of the coverage
-        with the given layer. A temporary VRT file is used as abstraction for 
-        the different band files.
+        with the given layer. A VRT file is used as abstraction for the 
+        different band files. If all band files are persistently accessible, 
+        the VRT is cached for the current revision of the coverage, otherwise 
+        a temporary VRT is used.
     """
 
     implements(ConnectorInterface)
     
     def supports(self, data_items):
-        # TODO: better checks
         return (
             len(data_items) > 1 
             and all(
@@ -53,25 +59,29 @@ class MultiFileConnector(Component):
         )
 
     def connect(self, coverage, data_items, layer):
+        if vrtcache.is_persistent(data_items):
+            data = vrtcache.get_band_vrt(coverage, data_items)
+        else:
+            data = join("/vsimem", uuid4().hex)
+            vrtcache.build_band_vrt(coverage, data_items, data, connect)
+            layer.setMetaData("eoxs_tmp_data", data)
 
-        # TODO: implement
-        vrt_doc = vrt.VRT()
-        # TODO: configure vrt here
-
-        path = join("/vsimem", uuid4().hex)
-        with vsi.open(path, "w+") as f:
-            vrt_doc.write(f)
-
+        if isinstance(coverage, models.ReferenceableDataset):
+            vrt_path = join("/vsimem", uuid4().hex)
+            refcache.create_rectified_vrt(data, vrt_path)
+            data = vrt_path
+            layer.setMetaData("eoxs_ref_data", data)
 
-        # TODO!!
-        if layer.metadata.get("eoxs_wrap_dateline") == "true":
+        if not layer.metadata.get("eoxs_wrap_dateline") == "true":
+            layer.data = data
+        else:
             e = wrap_extent_around_dateline(coverage.extent, coverage.srid)
 
             vrt_path = join("/vsimem", uuid4().hex)
-            ds = gdal.Open(data)
-            vrt_ds = create_simple_vrt(ds, vrt_path)
-            size_x = ds.RasterXSize
-            size_y = ds.RasterYSize
+            with dataset_pool.open(data) as ds:
+                vrt_ds = create_simple_vrt(ds, vrt_path)
+                size_x = ds.RasterXSize
+                size_y = ds.RasterYSize
             
             dx = abs(e[0] - e[2]) / size_x
             dy = abs(e[1] - e[3]) / size_y 
@@ -81,7 +91,12 @@ class MultiFileConnector(Component):
             
             layer.data = vrt_path
 
-        layer.data = path
-
     def disconnect(self, coverage, data_items, layer):
-        vsi.remove(layer.data)
+        # the cached VRT is kept, only temporary files are removed
+        if layer.metadata.get("eoxs_wrap_dateline") == "true":
+            vsi.remove(layer.data)
+
+        for key in ("eoxs_ref_data", "eoxs_tmp_data"):
+            vrt_path = layer.metadata.get(key)
+            if vrt_path:
+                vsi.remove(vrt_path)
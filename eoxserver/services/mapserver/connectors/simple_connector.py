@@ -34,7 +34,8 @@ from eoxserver.backends.access import connect
 from eoxserver.contrib import vsi, vrt, mapserver, gdal
 from eoxserver.services.mapserver.interfaces import ConnectorInterface
 from eoxserver.processing.gdal.vrt import create_simple_vrt
-from eoxserver.processing.gdal import reftools
+from eoxserver.processing.gdal import refcache
+from eoxserver.processing.gdal.pool import dataset_pool
 from eoxserver.resources.coverages.dateline import wrap_extent_around_dateline
 from eoxserver.resources.coverages import models
 
@@ -54,7 +55,7 @@ class SimpleConnector(Component):
 
         if isinstance(coverage, models.ReferenceableDataset):
             vrt_path = join("/vsimem", uuid4().hex)
-            reftools.create_rectified_vrt(data, vrt_path)
+            refcache.create_rectified_vrt(data, vrt_path)
             data = vrt_path
             layer.setMetaData("eoxs_ref_data", data)
 
@@ -64,10 +65,10 @@ class SimpleConnector(Component):
             e = wrap_extent_around_dateline(coverage.extent, coverage.srid)
 
             vrt_path = join("/vsimem", uuid4().hex)
-            ds = gdal.Open(data)
-            vrt_ds = create_simple_vrt(ds, vrt_path)
-            size_x = ds.RasterXSize
-            size_y = ds.RasterYSize
+            with dataset_pool.open(data) as ds:
+                vrt_ds = create_simple_vrt(ds, vrt_path)
+                size_x = ds.RasterXSize
+                size_y = ds.RasterYSize
             
             dx = abs(e[0] - e[2]) / size_x
             dy = abs(e[1] - e[3]) / size_y 
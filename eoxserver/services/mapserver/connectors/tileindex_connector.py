@@ -28,15 +28,26 @@
 
 
 import os.path
+import logging
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.access import connect
+from eoxserver.resources.coverages import models, tileindex, vrtcache
 from eoxserver.services.mapserver.interfaces import ConnectorInterface
 
 
+logger = logging.getLogger(__name__)
+
+
 class TileIndexConnector(Component):
     """ Connects a tile index with the given layer. The tileitem is fixed to 
         "location".
+
+        For Rectified Stitched Mosaics whose members are all persistently 
+        accessible the cached mosaic VRT (see 
+        `eoxserver.resources.coverages.vrtcache`) is connected instead, which 
+        spares MapServer from opening and querying the tile index shapefile on
+        every request.
     """
 
     implements(ConnectorInterface)
@@ -47,8 +58,36 @@ class TileIndexConnector(Component):
         )
 
     def connect(self, coverage, data_items, layer):
-        layer.tileindex = os.path.abspath(connect(data_items[0]))
+        if isinstance(coverage, models.RectifiedStitchedMosaic):
+            path = self._get_mosaic_vrt(coverage)
+            if path:
+                layer.data = path
+                return
+
+        path = os.path.abspath(connect(data_items[0]))
+        try:
+            tileindex.ensure_spatial_index(path)
+        except Exception, e:
+            logger.warning(
+                "Could not build the spatial index of the tile index '%s': %s"
+                % (path, e)
+            )
+
+        layer.tileindex = path
         layer.tileitem = "location"
 
     def disconnect(self, coverage, data_items, layer):
         pass
+
+    def _get_mosaic_vrt(self, mosaic):
+        try:
+            return vrtcache.get_mosaic_vrt(mosaic)
+        except ValueError:
+            # the members are not persistently accessible
+            return None
+        except Exception, e:
+            logger.warning(
+                "Could not build VRT for mosaic '%s', falling back to the tile"
+                " index: %s" % (mosaic.identifier, e)
+            )
+            return None
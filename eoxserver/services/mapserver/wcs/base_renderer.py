@@ -36,6 +36,11 @@ from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import crss
 from eoxserver.resources.coverages.models import RectifiedStitchedMosaic
 from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.resources.coverages.journal import get_update_sequence
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.processing.gdal.overviews import (
+    get_overview_policy, get_mapserver_processing
+)
 
 
 class WCSConfigReader(config.Reader):
@@ -58,9 +63,9 @@ class BaseRenderer(Component):
         maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
         if maxsize is not None:
             map_.maxsize = maxsize
-        map_.setMetaData("ows_updateSequence", 
+        map_.setMetaData("ows_updateSequence", get_update_sequence(
             WCSConfigReader(get_eoxserver_config()).update_sequence
-        )
+        ))
         return map_
 
     def data_items_for_coverage(self, coverage):
@@ -75,7 +80,7 @@ class BaseRenderer(Component):
         """ Helper method to generate a WCS enabled MapServer layer for a given 
             coverage.
         """
-        range_type = coverage.range_type
+        range_type = range_type_cache.get_for_coverage(coverage)
         bands = list(range_type)
 
         # create and configure layer
@@ -153,6 +158,10 @@ class BaseRenderer(Component):
                 "interval": "%d %d" % band.allowed_values
             }, namespace="wcs_%s" % band.name)
 
+        # reading of overviews for downscaled requests
+        for directive in get_mapserver_processing(get_overview_policy()):
+            layer.addProcessing(directive)
+
         return layer
 
 
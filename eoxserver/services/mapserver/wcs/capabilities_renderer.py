@@ -32,6 +32,7 @@ from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.contrib.mapserver import create_request, Map, Layer
 from eoxserver.resources.coverages import crss
+from eoxserver.resources.coverages.journal import get_update_sequence
 from eoxserver.services.mapserver.wcs.base_renderer import BaseRenderer
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.ows.wcs.interfaces import (
@@ -59,7 +60,7 @@ class MapServerWCSCapabilitiesRenderer(BaseRenderer):
             "enable_request": "*",
             "onlineresource": conf.http_service_url,
             "service_onlineresource": conf.onlineresource,
-            "updateSequence": conf.update_sequence,
+            "updateSequence": get_update_sequence(conf.update_sequence),
             "name": conf.name,
             "title": conf.title,
             "label": conf.title,
@@ -34,12 +34,17 @@ import logging
 from lxml import etree
 
 from eoxserver.core import implements, ExtensionPoint
+from eoxserver.core.config import get_eoxserver_config
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import models, crss
 from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.resources.coverages.rangetype import range_type_cache
 from eoxserver.services.exceptions import NoSuchCoverageException
+from eoxserver.services.ows.common.config import WCSEOConfigReader
 from eoxserver.services.ows.wcs.interfaces import WCSCoverageRendererInterface
 from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.ows.wcs.v20.fragments import description_cache
+from eoxserver.services.ows.wcs.v20.encodings.geotiff import is_compressed
 from eoxserver.services.ows.wcs.v20.util import (
     ScaleSize, ScaleExtent, ScaleAxis
 )
@@ -54,6 +59,9 @@ from eoxserver.services.exceptions import (
     RenderException, OperationNotSupportedException,
     InterpolationMethodNotSupportedException, InvalidOutputCrsException
 )
+from eoxserver.services.gdal.wcs.rectified_coverage_renderer import (
+    GDALRectifiedCoverageRenderer, get_scaled_size
+)
 
 
 logger = logging.getLogger(__name__)
@@ -96,7 +104,10 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
             and issubclass(params.coverage.real_type, self.handles_full))
             or
             (params.version in self.versions_partly
-            and issubclass(params.coverage.real_type, self.handles_partly))
+            and issubclass(params.coverage.real_type, self.handles_partly)
+            and WCSEOConfigReader(
+                get_eoxserver_config()
+            ).rectified_renderer == "mapserver")
         )
 
 
@@ -110,7 +121,7 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
 
         data_items = self.data_items_for_coverage(coverage)
 
-        range_type = coverage.range_type
+        range_type = range_type_cache.get_for_coverage(coverage)
         bands = list(range_type)
 
         subsets = params.subsets
@@ -118,6 +129,16 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
         if subsets:
             subsets.srid  # this automatically checks the validity
 
+        # for multipart responses the coverage description is encoded 
+        # directly, unless the output grid is determined by MapServer's 
+        # reprojection
+        multipart = (
+            params.version == Version(2, 0)
+            and getattr(params, "mediatype", None) 
+            in ("multipart/mixed", "multipart/related")
+        )
+        grid = self.get_output_grid(coverage, params) if multipart else None
+
         # create and configure map object
         map_ = self.create_map()
 
@@ -161,7 +182,9 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
             connector.connect(coverage, data_items, layer)
             # create request object and dispatch it against the map
             request = ms.create_request(
-                self.translate_params(params, range_type)
+                self.translate_params(
+                    params, range_type, multipart=(grid is None)
+                )
             )
             request.setParameter("format", mime_type)
             raw_result = ms.dispatch(map_, request)
@@ -172,8 +195,45 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
 
         result_set = result_set_from_raw_data(raw_result)
 
-        if params.version == Version(2, 0):
-            if getattr(params, "mediatype", None) in ("multipart/mixed", "multipart/related"):
+        # compressed GeoTIFFs shall not be compressed again for transfer
+        if is_compressed(params):
+            for result_item in result_set:
+                if result_item.content_type == mime_type:
+                    result_item.compressed = True
+
+        if grid is not None:
+            # MapServer only returned the coverage itself
+            result_item = result_set[0]
+            result_item.filename = (
+                result_item.filename or basename + of.extension
+            )
+            result_item.identifier = "cid:coverage/%s" % result_item.filename
+            result_item.streamed = True
+
+            if params.rangesubset:
+                bands = [
+                    range_type[index - 1] for index in 
+                    params.rangesubset.get_band_indices(range_type, 1)
+                ]
+
+            # the range type and the EO metadata are taken from the stored
+            # description fragment of the coverage
+            encoder = WCS20EOXMLEncoder()
+            cast_coverage = coverage.cast()
+            tree = encoder.encode_rectified_coverage(
+                cast_coverage, getattr(params, "http_request", None), bands,
+                result_item.identifier, result_item.content_type, *grid,
+                subset_polygon=(
+                    subsets.bounding_polygon(coverage) if subsets else None
+                ),
+                description=description_cache.get(encoder, cast_coverage)
+            )
+            result_set.insert(0, 
+                ResultBuffer(encoder.serialize(tree), encoder.content_type)
+            )
+
+        elif params.version == Version(2, 0):
+            if multipart:
                 encoder = WCS20EOXMLEncoder()
                 is_mosaic = issubclass(
                     coverage.real_type, models.RectifiedStitchedMosaic
@@ -200,12 +260,45 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
         # "default" response
         return result_set
 
-    def translate_params(self, params, range_type):
-        """ "Translate" parameters to be understandable by mapserver.
+    def get_output_grid(self, coverage, params):
+        """ Returns the grid (SRID, size and extent) of the rendered coverage
+            as a tuple or ``None`` if it is reprojected.
+        """
+        if coverage.srid is None:
+            return None
+
+        if params.outputcrs is not None:
+            srid = crss.parseEPSGCode(params.outputcrs,
+                (crss.fromURL, crss.fromURN, crss.fromShortCode)
+            )
+            if srid != coverage.srid:
+                return None
+
+        src_rect = GDALRectifiedCoverageRenderer.get_src_rect(
+            coverage, params.subsets
+        )
+        size = get_scaled_size(src_rect.size, params) or src_rect.size
+
+        res_x, res_y = coverage.resolution
+        min_x = coverage.min_x + src_rect.offset_x * res_x
+        max_y = coverage.max_y - src_rect.offset_y * res_y
+        extent = (
+            min_x, max_y - src_rect.size_y * res_y, 
+            min_x + src_rect.size_x * res_x, max_y
+        )
+        return coverage.srid, size, extent
+
+    def translate_params(self, params, range_type, multipart=True):
+        """ "Translate" parameters to be understandable by mapserver. With
+            `multipart` set to ``False`` only the coverage itself is 
+            requested.
         """
         if params.version.startswith("2.0"):
             for key, value in params:
-                if key == "interpolation":
+                if key == "mediatype" and not multipart:
+                    continue
+
+                elif key == "interpolation":
                     interpolation = INTERPOLATION_TRANS.get(value)
                     if not interpolation:
                         raise InterpolationMethodNotSupportedException(
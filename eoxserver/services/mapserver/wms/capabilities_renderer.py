@@ -32,6 +32,7 @@ from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.contrib.mapserver import create_request, Map, Layer, Class, Style
 from eoxserver.resources.coverages import crss, models
+from eoxserver.resources.coverages.journal import get_update_sequence
 from eoxserver.resources.coverages.formats import getFormatRegistry
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.ows.wms.interfaces import (
@@ -63,7 +64,7 @@ class MapServerWMSCapabilitiesRenderer(Component):
             "enable_request": "*",
             "onlineresource": conf.http_service_url,
             "service_onlineresource": conf.onlineresource,
-            "updateSequence": conf.update_sequence,
+            "updateSequence": get_update_sequence(conf.update_sequence),
             "name": conf.name,
             "title": conf.title,
             "abstract": conf.abstract,
@@ -100,9 +100,8 @@ class MapServerWMSFeatureInfoRenderer(MapServerWMSBaseComponent):
 
                 return [
                     ResultBuffer(
-                        encoder.serialize(
-                            encoder.encode_coverage_descriptions(coverages)
-                        ), encoder.content_type
+                        encoder.serialize_coverage_descriptions(coverages),
+                        encoder.content_type
                     )
                 ], encoder.content_type
 
@@ -29,6 +29,10 @@ import os.path
 from django.conf import settings
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import crss
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.processing.gdal.overviews import (
+    get_overview_policy, get_mapserver_processing
+)
 from eoxserver.services import models as service_models
 
 
@@ -234,7 +238,7 @@ class DataLayerMixIn(object):
                 return None
 
         req_bands = options.get("bands", None)
-        range_types = cov.range_type
+        range_types = range_type_cache.get_for_coverage(cov)
 
         if not req_bands:
             req_bands = _default_indeces(ropt)
@@ -305,7 +309,9 @@ class DataLayerMixIn(object):
         if offsite:
             layer.offsite = offsite
         else:
-            layer.offsite = self._offsite_color(cov.range_type, indices)
+            layer.offsite = self._offsite_color(
+                range_type_cache.get_for_coverage(cov), indices
+            )
 
         if ropt:
             if ropt.scale_min is not None and ropt.scale_max is not None:
@@ -317,4 +323,8 @@ class DataLayerMixIn(object):
         if mask:
             layer.mask = mask
 
+        # reading of overviews for small images of large coverages
+        for directive in get_mapserver_processing(get_overview_policy()):
+            layer.addProcessing(directive)
+
         return layer
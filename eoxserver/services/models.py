@@ -46,3 +46,16 @@ class WMSRenderOptions(models.Model):
     scale_auto = models.BooleanField(default=False)
     scale_min = models.PositiveIntegerField(null=True)
     scale_max = models.PositiveIntegerField(null=True)
+
+
+class CoverageDescriptionFragment(models.Model):
+    """ Cached serialization of the WCS 2.0 EO CoverageDescription of a 
+        coverage. The fragment is valid as long as the `revision` matches the
+        current revision of the coverage.
+    """
+
+    coverage = models.OneToOneField(
+        coverage_models.Coverage, related_name="description_fragment"
+    )
+    revision = models.CharField(max_length=64)
+    content = models.TextField()
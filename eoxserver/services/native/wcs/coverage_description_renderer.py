@@ -54,9 +54,8 @@ class NativeWCS20CoverageDescriptionRenderer(Component):
         encoder = WCS20EOXMLEncoder()
         return [
             ResultBuffer(
-                encoder.serialize(
-                    encoder.encode_coverage_descriptions(params.coverages),
-                    pretty_print=settings.DEBUG
+                encoder.serialize_coverage_descriptions(
+                    params.coverages, pretty_print=settings.DEBUG
                 ),
                 encoder.content_type
             )
@@ -27,7 +27,13 @@
 #-------------------------------------------------------------------------------
 
 
+from datetime import datetime
+
+from django.utils.timezone import utc
+
+from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config, typelist, Choice
+from eoxserver.resources.coverages.formats import getFormatRegistry
 
 
 class CapabilitiesConfigReader(config.Reader):
@@ -66,3 +72,18 @@ class CapabilitiesConfigReader(config.Reader):
 class WCSEOConfigReader(config.Reader):
     section = "services.ows.wcs20"
     paging_count_default = config.Option(type=int, default=None)
+    rectified_renderer = config.Option(default="mapserver")
+
+
+def get_configuration_stamp():
+    """ Returns a tuple of a stamp identifying the current instance and 
+        formats configuration and the time of its latest modification (or 
+        ``None``). Both are the same in all processes serving the instance.
+    """
+    config = get_eoxserver_config()
+    registry = getFormatRegistry()
+    modified = max(config.modified, registry.modified)
+    return (
+        "%s|%s" % (config.stamp, registry.stamp), 
+        datetime.fromtimestamp(modified, utc) if modified is not None else None
+    )
@@ -68,6 +68,13 @@ class ServiceHandlerInterface(object):
             reported in a capabilities document.
         """
 
+    def get_revision(self, request):
+        """ Optional. Returns the catalog revision (see 
+            `eoxserver.resources.coverages.journal`) the response for the 
+            given request depends upon or ``None`` if it cannot be told. It is
+            used to answer conditional requests without handling them.
+        """
+
 
 class ExceptionHandlerInterface(object): 
     """ Interface for OWS exception handlers.
@@ -32,7 +32,7 @@ default methods can be overidden.
 """
 
 from eoxserver.core import ExtensionPoint
-from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages import models, journal
 from eoxserver.services.result import to_http_response
 from eoxserver.services.ows.wcs.parameters import WCSCapabilitiesRenderParams
 from eoxserver.services.exceptions import (
@@ -96,6 +96,12 @@ class WCSGetCapabilitiesHandlerBase(object):
         """
         return to_http_response(result_set)
 
+    def get_revision(self, request):
+        """ Default implementation of the revision lookup. The capabilities
+            depend on the whole catalog.
+        """
+        return journal.get_revision()
+
 
     def handle(self, request):
         """ Default handler method.
@@ -175,6 +181,13 @@ class WCSDescribeCoverageHandlerBase(object):
         """
         return to_http_response(result_set)
 
+    def get_revision(self, request):
+        """ Default implementation of the revision lookup. Returns the latest
+            revision of the requested coverages.
+        """
+        coverages = self.lookup_coverages(self.get_decoder(request))
+        return max(journal.get_object_revisions(coverages).values() or [0])
+
 
     def handle(self, request):
         """ Default request handling method implementation.
@@ -36,7 +36,8 @@ from django.db.models import Q
 from eoxserver.core import Component, implements
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
-from eoxserver.resources.coverages import models
+from eoxserver.core.models import iter_cast_bulk
+from eoxserver.resources.coverages import models, journal
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -78,6 +79,17 @@ class WCS20DescribeEOCoverageSetHandler(Component):
             "CountDefault": reader.paging_count_default
         }
 
+    def get_revision(self, request):
+        """ Returns the latest revision of the requested objects (including 
+            the contents of requested collections) and of the range types.
+        """
+        eo_ids = self.get_decoder(request).eo_ids
+        eo_objects = models.EOObject.objects.filter(identifier__in=eo_ids)
+        revisions = journal.get_object_revisions(eo_objects)
+        if len(revisions) < len(set(eo_ids)):
+            return None
+        return max(revisions.values() + [journal.get_range_type_revision()])
+
     def handle(self, request):
         decoder = self.get_decoder(request)
         eo_ids = decoder.eo_ids
@@ -192,11 +204,11 @@ class WCS20DescribeEOCoverageSetHandler(Component):
 
         # finally iterate over everything that has been retrieved and get
         # a list of dataset series and coverages to be encoded into the response
-        for eo_object in chain(coverages_qs, collection_set):
+        for eo_object in iter_cast_bulk(chain(coverages_qs, collection_set)):
             if inc_cov_section and issubclass(eo_object.real_type, models.Coverage):
-                coverages.add(eo_object.cast())
+                coverages.add(eo_object)
             elif inc_dss_section and issubclass(eo_object.real_type, models.DatasetSeries):
-                dataset_series.add(eo_object.cast())
+                dataset_series.add(eo_object)
 
             else:
                 # TODO: what to do here?
@@ -212,12 +224,10 @@ class WCS20DescribeEOCoverageSetHandler(Component):
         encoder = WCS20EOXMLEncoder()
 
         return (
-            encoder.serialize(
-                encoder.encode_eo_coverage_set_description(
-                    sorted(dataset_series, key=lambda s: s.identifier), 
-                    sorted(coverages, key=lambda c: c.identifier), 
-                    count_all_coverages + num_collections
-                ), pretty_print=True
+            encoder.serialize_eo_coverage_set_description(
+                sorted(dataset_series, key=lambda s: s.identifier), 
+                sorted(coverages, key=lambda c: c.identifier), 
+                count_all_coverages + num_collections, pretty_print=True
             ),
             encoder.content_type
         )
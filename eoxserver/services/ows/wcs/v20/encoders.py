@@ -35,17 +35,19 @@ from django.utils.timezone import now
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.core.util.timetools import isoformat
-from eoxserver.backends.access import retrieve
-from eoxserver.contrib.osr import SpatialReference
 from eoxserver.resources.coverages.models import (
     RectifiedStitchedMosaic, ReferenceableDataset
 )
 from eoxserver.resources.coverages.formats import getFormatRegistry
 from eoxserver.resources.coverages import crss, models
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.resources.coverages.journal import get_update_sequence
+from eoxserver.resources.coverages.metadata.fragments import fragment_cache
 from eoxserver.services.gml.v32.encoders import GML32Encoder, EOP20Encoder
 from eoxserver.services.ows.component import ServiceComponent, env
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.ows.common.v20.encoders import OWS20Encoder
+from eoxserver.services.ows.wcs.v20.fragments import iter_description_fragments
 from eoxserver.services.ows.wcs.v20.util import (
     nsmap, ns_xlink, ns_xsi, ns_ogc, ns_ows, ns_gml, ns_gmlcov, ns_wcs, ns_crs, 
     ns_eowcs, OWS, GML, GMLCOV, WCS, CRS, EOWCS, SWE, INT,
@@ -264,7 +266,7 @@ class WCS20CapabilitiesXMLEncoder(OWS20Encoder):
 
             caps.append(WCS("Contents", *contents))
 
-        root = WCS("Capabilities", *caps, version="2.0.1", updateSequence=conf.update_sequence)
+        root = WCS("Capabilities", *caps, version="2.0.1", updateSequence=get_update_sequence(conf.update_sequence))
         return root
 
     def get_schema_locations(self):
@@ -344,7 +346,7 @@ class GMLCOV10Encoder(GML32Encoder):
     def encode_domain_set(self, coverage, srid=None, size=None, extent=None, 
                           rectified=True):
         grid_name = "%s_grid" % coverage.identifier
-        srs = SpatialReference(srid) if srid is not None else None
+        srs = crss.get_spatial_reference(srid) if srid is not None else None
 
         if rectified:
             return GML("domainSet", 
@@ -363,7 +365,7 @@ class GMLCOV10Encoder(GML32Encoder):
 
     def encode_bounded_by(self, extent, sr=None):
         minx, miny, maxx, maxy = extent
-        sr = sr or SpatialReference(4326)
+        sr = sr or crss.get_spatial_reference(4326)
         swap = crss.getAxesSwapper(sr.srid)
         labels = ("x", "y") if sr.IsProjected() else ("long", "lat")
         axis_labels = " ".join(swap(*labels))
@@ -390,27 +392,9 @@ class GMLCOV10Encoder(GML32Encoder):
             )
         )
 
-    # cached range types and nil value sets
+    # cached range types (shared within the process)
     def get_range_type(self, pk):
-        cached_range_types = self._cache.setdefault(models.RangeType, {})
-        try:
-            return cached_range_types[pk]
-        except KeyError:
-            cached_range_types[pk] = models.RangeType.objects.get(pk=pk)
-            return cached_range_types[pk]
-
-    def get_nil_value_set(self, pk):
-        cached_nil_value_set = self._cache.setdefault(models.NilValueSet, {})
-        try:
-            return cached_nil_value_set[pk]
-        except KeyError:
-            try:
-                cached_nil_value_set[pk] = models.NilValueSet.objects.get(
-                    pk=pk
-                )
-                return cached_nil_value_set[pk]
-            except models.NilValueSet.DoesNotExist:
-                return ()
+        return range_type_cache.get(pk)
 
 
     def encode_nil_values(self, nil_value_set):
@@ -425,9 +409,7 @@ class GMLCOV10Encoder(GML32Encoder):
         return SWE("field",
             SWE("Quantity",
                 SWE("description", band.description),
-                self.encode_nil_values(
-                    self.get_nil_value_set(band.nil_value_set_id)
-                ),
+                self.encode_nil_values(band.nil_value_set or ()),
                 SWE("uom", code=band.uom),
                 SWE("constraint",
                     SWE("AllowedValues",
@@ -473,30 +455,35 @@ class WCS20CoverageDescriptionXMLEncoder(GMLCOV10Encoder):
 
 
 class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20Encoder):
-    def encode_eo_metadata(self, coverage, request=None, subset_polygon=None):
-        data_items = list(coverage.data_items.filter(
-            semantic="metadata", format="eogml"
-        ))
-        if len(data_items) >= 1:
-            with open(retrieve(data_items[0])) as f:
-                earth_observation = etree.parse(f).getroot()
-
-            if subset_polygon:
-                try:
-                    feature = earth_observation.xpath(
-                        "om:featureOfInterest", namespaces=nsmap
-                    )[0]
-                    feature[0] = self.encode_footprint(
-                        coverage.footprint.intersection(subset_polygon),
-                        coverage.identifier
-                    )
-                except IndexError:
-                    pass # no featureOfInterest
+    def encode_eo_metadata(self, coverage, request=None, subset_polygon=None,
+                           earth_observation=None):
+        """ Encodes the EO metadata of the coverage. An already available 
+            (and modifiable) EarthObservation element of the coverage can be 
+            passed as `earth_observation`.
+        """
+        if earth_observation is None:
+            data_items = list(coverage.data_items.filter(
+                semantic="metadata", format="eogml"
+            ).select_related("metadata_fragment"))
+            if len(data_items) >= 1:
+                earth_observation = fragment_cache.get(data_items[0])
+            else:
+                earth_observation = self.encode_earth_observation(
+                    coverage, subset_polygon=subset_polygon
+                )
+                subset_polygon = None # already applied
 
-        else:
-            earth_observation = self.encode_earth_observation(
-                coverage, subset_polygon=subset_polygon
-            )
+        if subset_polygon:
+            try:
+                feature = earth_observation.xpath(
+                    "om:featureOfInterest", namespaces=nsmap
+                )[0]
+                feature[0] = self.encode_footprint(
+                    coverage.footprint.intersection(subset_polygon),
+                    coverage.identifier
+                )
+            except IndexError:
+                pass # no featureOfInterest
 
         if not request:
             lineage = None
@@ -551,8 +538,10 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
         if extent:
             poly = Polygon.from_bbox(extent)
             poly.srid = srid
-            extent = poly.transform(4326).extent
-            sr = SpatialReference(4326)
+            if srid != 4326:
+                poly.transform(crss.get_coord_transform(srid, 4326))
+            extent = poly.extent
+            sr = crss.get_spatial_reference(4326)
         else:
             extent = coverage.extent
             sr = coverage.spatial_reference
@@ -602,7 +591,9 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
         eo_objects = coverage.eo_objects
         if subset_polygon:
             if subset_polygon.srid != 4326:
-                subset_polygon = subset_polygon.transform(4326, True)
+                subset_polygon = subset_polygon.transform(
+                    crss.get_coord_transform(subset_polygon.srid, 4326), True
+                )
 
             eo_objects = eo_objects.filter(
                 footprint__intersects=subset_polygon
@@ -646,6 +637,58 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             ]
         ), **tree.attrib)
 
+    def encode_rectified_coverage(self, coverage, request, bands, reference,
+                                  mime_type, srid, size, extent,
+                                  subset_polygon=None, description=None):
+        """ Encodes the description of a rendered (subsetted, reprojected or
+            scaled) Rectified Dataset or Rectified Stitched Mosaic as included
+            in multipart GetCoverage responses. The range type and the EO 
+            metadata are taken from the (modifiable) CoverageDescription 
+            element `description`, if given.
+        """
+        is_mosaic = issubclass(coverage.real_type, RectifiedStitchedMosaic)
+
+        range_type = None
+        earth_observation = None
+        if description is not None:
+            range_types = description.xpath(
+                "gmlcov:rangeType", namespaces=nsmap
+            )
+            if range_types:
+                names = range_types[0].xpath(
+                    "swe:DataRecord/swe:field/@name", namespaces=nsmap
+                )
+                # only the complete range type can be re-used
+                if names == [band.name for band in bands]:
+                    range_type = range_types[0]
+
+            earth_observations = description.xpath(
+                "gmlcov:metadata/gmlcov:Extension/eowcs:EOMetadata/*[1]",
+                namespaces=nsmap
+            )
+            if earth_observations:
+                earth_observation = earth_observations[0]
+
+        elements = [
+            self.encode_bounded_by(extent, crss.get_spatial_reference(srid)),
+            self.encode_domain_set(coverage, srid, size, extent),
+            self.encode_range_set(reference, mime_type),
+            range_type if range_type is not None 
+            else self.encode_range_type(bands),
+            self.encode_eo_metadata(
+                coverage, request, subset_polygon, earth_observation
+            )
+        ]
+        if is_mosaic:
+            elements.append(
+                self.encode_contributing_datasets(coverage, subset_polygon)
+            )
+
+        return EOWCS(
+            "RectifiedStitchedMosaic" if is_mosaic else "RectifiedDataset",
+            *elements, **{ns_gml("id"): self.get_gml_id(coverage.identifier)}
+        )
+
     def encode_referenceable_dataset(self, coverage, range_type, reference, 
                                      mime_type, subset=None):
         # handle subset 
@@ -656,7 +699,7 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             domain_set = self.encode_domain_set(coverage, rectified=False)
             eo_metadata = self.encode_eo_metadata(coverage)
             extent = coverage.extent
-            sr = SpatialReference(dst_srid)
+            sr = crss.get_spatial_reference(dst_srid)
 
         else:
             # subset is given 
@@ -674,9 +717,9 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             poly = Polygon.from_bbox(extent)
             poly.srid = srid
             if srid != dst_srid:
-                poly.transform(dst_srid)
+                poly.transform(crss.get_coord_transform(srid, dst_srid))
             extent = poly.extent
-            sr = SpatialReference(srid)
+            sr = crss.get_spatial_reference(srid)
 
         return EOWCS("ReferenceableDataset",
             self.encode_bounded_by(extent, sr),
@@ -726,5 +769,69 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
 
         return root
 
+    # serialization using the cached coverage description fragments
+
+    def serialize_coverage_descriptions(self, coverages, pretty_print=True,
+                                        encoding='iso-8859-1'):
+        """ Serialize the CoverageDescriptions of the given coverages. The 
+            stored description fragments are spliced into the output. 
+        """
+        root = WCS("CoverageDescriptions")
+        return self.serialize_spliced(
+            root, root, iter_description_fragments(self, coverages), 
+            pretty_print, encoding
+        )
+
+    def serialize_eo_coverage_set_description(self, dataset_series_set, 
+                                              coverages, number_matched=None,
+                                              number_returned=None, 
+                                              pretty_print=True, 
+                                              encoding='iso-8859-1'):
+        """ Same as `encode_eo_coverage_set_description` but directly 
+            serializes the result using the stored coverage description 
+            fragments.
+        """
+        if number_matched is None:
+            number_matched = len(coverages) + len(dataset_series_set)
+        if number_returned is None:
+            number_returned = len(coverages) + len(dataset_series_set)
+
+        root = EOWCS("EOCoverageSetDescription", 
+            numberMatched=str(number_matched), 
+            numberReturned=str(number_returned)
+        )
+
+        descriptions = None
+        if coverages:
+            descriptions = WCS("CoverageDescriptions")
+            root.append(descriptions)
+        if dataset_series_set:
+            root.append(self.encode_dataset_series_descriptions(
+                dataset_series_set
+            ))
+
+        if descriptions is None:
+            return self.serialize(root, pretty_print, encoding)
+
+        return self.serialize_spliced(
+            root, descriptions, iter_description_fragments(self, coverages),
+            pretty_print, encoding
+        )
+
+    def serialize_spliced(self, tree, parent, fragments, pretty_print=True,
+                          encoding='iso-8859-1'):
+        """ Serialize the `tree` and insert the already serialized 
+            `fragments` as children of `parent`, which must be empty.
+        """
+        marker = "eoxs-fragments-%x" % id(parent)
+        parent.append(etree.Comment(marker))
+        head, tail = self.serialize(tree, pretty_print, encoding).split(
+            "<!--%s-->" % marker, 1
+        )
+        return "".join([head] + [
+            fragment.encode(encoding, "xmlcharrefreplace") 
+            for fragment in fragments
+        ] + [tail])
+
     def get_schema_locations(self):
         return {ns_eowcs.uri: ns_eowcs.schema_location}
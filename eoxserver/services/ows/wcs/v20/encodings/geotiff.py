@@ -92,6 +92,14 @@ class WCS20GeoTIFFEncodingExtension(Component):
         }
 
 
+def is_compressed(params):
+    """ Returns ``True`` if the render parameters request a compressed 
+        GeoTIFF. The compression method "None" requests an uncompressed one.
+    """
+    encoding_params = getattr(params, "encoding_params", None) or {}
+    return encoding_params.get("compression") not in (None, "None")
+
+
 compression_enum = enum(
     ("None", "PackBits", "Huffman", "LZW", "JPEG", "Deflate")
 )
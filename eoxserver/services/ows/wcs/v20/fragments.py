@@ -0,0 +1,185 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Cache of serialized WCS 2.0 EO CoverageDescription fragments.
+
+The description of a coverage only changes when the coverage itself, its data
+items (or the metadata files they point to) or its range type are modified.
+The serialized descriptions are stored in the database together with a
+revision of the coverage (see `eoxserver.resources.coverages.journal`), so
+that responses can be assembled by splicing the stored fragments instead of
+encoding every coverage on every request. For the descriptions of rendered
+coverages (e.g: in multipart GetCoverage responses), the parsed fragments are
+additionally kept in a small in-process cache.
+"""
+
+import hashlib
+import threading
+from copy import deepcopy
+from collections import defaultdict, OrderedDict
+import logging
+
+from lxml import etree
+from django.db import transaction
+from django.db.utils import IntegrityError
+
+from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import journal
+from eoxserver.resources.coverages.metadata.fragments import get_stamp
+from eoxserver.services.models import CoverageDescriptionFragment
+from eoxserver.services.ows.common.config import get_configuration_stamp
+
+
+logger = logging.getLogger(__name__)
+
+# maximum number of coverages looked up with a single query
+QUERY_CHUNK_SIZE = 500
+
+# maximum number of parsed descriptions kept in memory
+MAX_PARSED_DESCRIPTIONS = 256
+
+
+def get_coverage_revision(coverage, journal_revision, metadata_items, 
+                          config_stamp=""):
+    """ Get the revision of a coverage description. It is composed of the
+        revision of the coverage in the catalog change journal (which
+        includes changes of its data items and range type), the stamps of
+        its metadata files, as these may change on disk without any catalog
+        change, and the stamp of the configuration (e.g: the native formats).
+    """
+    h = hashlib.sha1(config_stamp)
+    for data_item in sorted(metadata_items, key=lambda d: d.pk):
+        h.update(repr((data_item.pk, get_stamp(data_item))))
+
+    return "%d:%s" % (journal_revision, h.hexdigest())
+
+
+def iter_description_fragments(encoder, coverages):
+    """ Yield the serialized (unicode) CoverageDescription for each coverage. 
+        Missing or outdated fragments are encoded with the given `encoder` and
+        stored.
+    """
+    coverages = list(coverages)
+    config_stamp, _ = get_configuration_stamp()
+    for i in xrange(0, len(coverages), QUERY_CHUNK_SIZE):
+        chunk = coverages[i:i + QUERY_CHUNK_SIZE]
+
+        fragments = dict(
+            (fragment.coverage_id, fragment) for fragment in
+            CoverageDescriptionFragment.objects.filter(
+                coverage__in=[coverage.pk for coverage in chunk]
+            )
+        )
+
+        journal_revisions = journal.get_object_revisions(chunk)
+
+        metadata_items = defaultdict(list)
+        for data_item in backends.DataItem.objects.filter(
+                dataset__in=[coverage.dataset_ptr_id for coverage in chunk],
+                semantic="metadata"):
+            metadata_items[data_item.dataset_id].append(data_item)
+
+        for coverage in chunk:
+            revision = get_coverage_revision(
+                coverage, journal_revisions[coverage.pk],
+                metadata_items[coverage.dataset_ptr_id], config_stamp
+            )
+            fragment = fragments.get(coverage.pk)
+            if fragment is None:
+                fragment = CoverageDescriptionFragment(coverage=coverage)
+            elif fragment.revision == revision:
+                yield fragment.content
+                continue
+
+            logger.debug(
+                "Encoding coverage description of '%s'." % coverage.identifier
+            )
+            fragment.revision = revision
+            fragment.content = etree.tostring(
+                encoder.encode_coverage_description(coverage), 
+                encoding=unicode
+            )
+            _save_fragment(fragment)
+            yield fragment.content
+
+
+def _save_fragment(fragment):
+    """ Store the fragment. When concurrent requests both create the first 
+        fragment of a coverage, the one losing the race updates the row of 
+        the other instead of failing.
+    """
+    sid = transaction.savepoint()
+    try:
+        fragment.save()
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
+        CoverageDescriptionFragment.objects.filter(
+            coverage=fragment.coverage_id
+        ).update(revision=fragment.revision, content=fragment.content)
+    else:
+        transaction.savepoint_commit(sid)
+
+
+class DescriptionCache(object):
+    """ Cache for the parsed CoverageDescription fragments. Callers receive a
+        private copy of the cached element and are free to modify it.
+    """
+
+    def __init__(self, max_size=MAX_PARSED_DESCRIPTIONS):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._parsed = OrderedDict()
+
+    def get(self, encoder, coverage):
+        """ Get the CoverageDescription element of the coverage. The stored
+            fragment is refreshed (using the `encoder`) if it is missing or 
+            outdated.
+        """
+        content = next(iter_description_fragments(encoder, [coverage]))
+
+        with self._lock:
+            cached = self._parsed.pop(coverage.pk, None)
+            if cached is not None and cached[0] == content:
+                self._parsed[coverage.pk] = cached
+                return deepcopy(cached[1])
+
+        element = etree.fromstring(content.encode("utf-8"))
+
+        with self._lock:
+            self._parsed[coverage.pk] = (content, element)
+            while len(self._parsed) > self._max_size:
+                self._parsed.popitem(last=False)
+
+        return deepcopy(element)
+
+    def clear(self):
+        with self._lock:
+            self._parsed.clear()
+
+
+#: the process wide description cache
+description_cache = DescriptionCache()
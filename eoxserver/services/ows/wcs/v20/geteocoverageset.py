@@ -44,6 +44,7 @@ except:
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, enum
+from eoxserver.core.models import cast_all
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface,
@@ -222,14 +223,14 @@ class WCS20GetEOCoverageSetHandler(Component):
         if containment == "within":
             collection_set = filter(lambda c: subsets.matches(c), collection_set)
 
-        coverages = []
         dataset_series = []
 
         # finally iterate over everything that has been retrieved and get
         # a list of dataset series and coverages to be encoded into the response
-        for eo_object in chain(coverages_qs, collection_set):
-            if issubclass(eo_object.real_type, models.Coverage):
-                coverages.append(eo_object.cast())
+        coverages = cast_all(
+            eo_object for eo_object in chain(coverages_qs, collection_set)
+            if issubclass(eo_object.real_type, models.Coverage)
+        )
 
         fd, pkg_filename = tempfile.mkstemp()
         tmp = os.fdopen(fd)
@@ -42,6 +42,7 @@ from numpy import argmin, argmax
 from qhull import chull2D_qhull
 
 from eoxserver.contrib import osr, gdal
+from eoxserver.resources.coverages import crss
 
 #-------------------------------------------------------------------------------
 
@@ -72,6 +73,16 @@ class OSRTransform( object ) :
         self.fwd = osr.CoordinateTransformation( src , dst )
         self.bwd = osr.CoordinateTransformation( dst , src )
 
+    @classmethod 
+    def fromEPSG( cls , src , dst ) : 
+        """ create transform re-using the cached transformations of the CRS 
+            registry """ 
+
+        trn = cls.__new__( cls ) 
+        trn.fwd = crss.get_transformation( src , dst ) 
+        trn.bwd = crss.get_transformation( dst , src ) 
+        return trn 
+
     def src2dst( self , xy ) :
         return array( self.fwd.TransformPoint( xy[0] , xy[1] ) , 'float64' ) 
 
@@ -156,12 +167,15 @@ def getFootprintRect( info , numberOfPoints = 20, delimiter = " " , repeatFirst
     gt = GeoTransform( info.GeoTransform ) 
 
     cr_src = osr.SpatialReference() 
-    cr_dst = osr.SpatialReference() 
-
     cr_src.ImportFromWkt( info.Projection ) 
-    cr_dst.SetWellKnownGeogCS( "WGS84" ) 
 
-    trn = OSRTransform(cr_src,cr_dst) 
+    # use the cached transformations if the projection has got an EPSG code 
+    if ( cr_src.GetAuthorityName(None) or "" ).upper() == "EPSG" : 
+        trn = OSRTransform.fromEPSG( int(cr_src.GetAuthorityCode(None)) , 4326 ) 
+    else : 
+        cr_dst = osr.SpatialReference() 
+        cr_dst.SetWellKnownGeogCS( "WGS84" ) 
+        trn = OSRTransform(cr_src,cr_dst) 
 
     # -----------------------------
     # extract footprint (clockwise)
@@ -33,7 +33,7 @@ default methods can be overidden.
 """
 
 from eoxserver.core import UniqueExtensionPoint
-from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages import models, journal
 from eoxserver.services.ows.wms.interfaces import (
     WMSCapabilitiesRendererInterface
 )
@@ -49,6 +49,11 @@ class WMSGetCapabilitiesHandlerBase(object):
 
     renderer = UniqueExtensionPoint(WMSCapabilitiesRendererInterface)
 
+    def get_revision(self, request):
+        """ The capabilities depend on the whole catalog.
+        """
+        return journal.get_revision()
+
     def handle(self, request):
         collections_qs = models.Collection.objects \
             .order_by("identifier") \
@@ -118,10 +118,10 @@ def lookup_layers(layers, subsets, suffixes=None):
                         .exclude(pk__in=used_ids)\
                         .order_by("begin_time", "end_time", "identifier")\
                         .prefetch_related('metadata_items'))
-        for eo_object in eo_objects:
+        for eo_object in eo_objects.iter_cast_bulk():
             used_ids.add(eo_object.pk)
             if models.iscoverage(eo_object):
-                selection.append(eo_object.cast(), _get_alias(eo_object))
+                selection.append(eo_object, _get_alias(eo_object))
             elif models.iscollection(eo_object):
                 _recursive_lookup(eo_object)
             else:
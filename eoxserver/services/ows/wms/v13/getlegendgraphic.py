@@ -85,11 +85,11 @@ class WMS13GetLegendGraphicHandler(Component):
                 )
 
                 result = []
-                for eo_object in eo_objects:
+                for eo_object in eo_objects.iter_cast_bulk():
                     used_ids.add(eo_object.pk)
 
                     if models.iscoverage(eo_object):
-                        result.append((eo_object.cast(), suffix))
+                        result.append((eo_object, suffix))
                     elif models.iscollection(eo_object):
                         result.extend(
                             recursive_lookup(eo_object, used_ids, suffix)
@@ -29,7 +29,8 @@ from copy import deepcopy
 from lxml import etree
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.timetools import isoformat
-from eoxserver.backends.access import retrieve
+from eoxserver.resources.coverages.rangetype import range_type_cache
+from eoxserver.resources.coverages.metadata.fragments import fragment_cache
 
 # get the service URL
 URL = get_eoxserver_config().get("services.owscommon", "http_service_url")
@@ -208,12 +209,11 @@ def cov2html(coverage):
 
         data_items = coverage.data_items
         data_items = data_items.filter(semantic="metadata", format="eogml")
-        data_items = list(data_items)
+        data_items = list(data_items.select_related("metadata_fragment"))
         if len(data_items) < 1:
             return
 
-        with open(retrieve(data_items[0])) as fid:
-            eop = etree.parse(fid)
+        eop = etree.ElementTree(fragment_cache.get(data_items[0]))
 
         # extract metadata
         md = eop_extract(eop)
@@ -310,7 +310,7 @@ def cov2html(coverage):
     yield _lb("Coverage Metadata:", level=0)
     yield _kv("subtype:", coverage.cast().__class__.__name__)
     yield _kv("source size:", "%d x %d pixels"%(coverage.size_x, coverage.size_y))
-    yield _kv("source bands:", "%d"%(coverage.range_type.bands.count()))
+    yield _kv("source bands:", "%d"%(len(range_type_cache.get_for_coverage(coverage))))
 
     for item in _eop2html(coverage):
         yield item
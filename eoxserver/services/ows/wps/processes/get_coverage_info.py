@@ -29,9 +29,7 @@ from datetime import datetime
 from django.contrib.gis.geos import Point
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core import Component, implements
-from eoxserver.resources.coverages.models import (
-    Collection, Coverage, iscollection
-)
+from eoxserver.resources.coverages.models import Collection, Coverage
 from eoxserver.services.ows.wps.interfaces import ProcessInterface
 from eoxserver.services.ows.wps.parameters import (
     LiteralData, ComplexData, CDTextBuffer, CDAsciiTextBuffer, FormatText,
@@ -110,12 +108,17 @@ class GetCoverageInfoProcess(Component):
 
         if is_collection:
 
-            # recursive nested collection lookup
+            # nested collection lookup (one query per nesting level)
             def _get_children_ids(obj):
                 id_list = [obj.id]
-                for child in obj.eo_objects.all():
-                    if iscollection(child):
-                        id_list.extend(_get_children_ids(child.cast()))
+                level = [obj.id]
+                while level:
+                    level = list(
+                        Collection.objects.filter(collections__in=level)
+                        .exclude(id__in=id_list)
+                        .values_list("id", flat=True).distinct()
+                    )
+                    id_list.extend(level)
                 return id_list
 
             # prepare coverage query set
@@ -28,11 +28,43 @@
 
 import os
 import os.path
+import time
+import zlib
+import calendar
+import hashlib
 from cStringIO import StringIO
+from tempfile import SpooledTemporaryFile, TemporaryFile
 from uuid import uuid4
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    class StreamingHttpResponse(HttpResponse):
+        """ Minimal streaming response for Django versions that lack one. The
+            content is passed to the server chunk by chunk and must not be
+            accessed beforehand.
+        """
+        streaming = True
+
+        def _get_streaming_content(self):
+            return self._container
+
+        def _set_streaming_content(self, value):
+            self._container = value
+            self._base_content_is_iter = True
 
+        streaming_content = property(
+            _get_streaming_content, _set_streaming_content
+        )
+from django.utils.http import (
+    http_date, parse_http_date_safe, parse_etags, quote_etag
+)
+from django.utils.timezone import is_aware
+from django.utils.cache import patch_vary_headers
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
 from eoxserver.core.util import multiparttools as mp
 
 
@@ -40,6 +72,14 @@ class ResultItem(object):
     """ Base class for render results.
     """
 
+    # set to `True` if the data is already compressed although its content 
+    # type suggests otherwise (e.g: compressed GeoTIFFs)
+    compressed = False
+
+    # set to `True` if the data shall be streamed to the client instead of
+    # being passed to the response as a whole
+    streamed = False
+
     def __init__(self, content_type=None, filename=None, identifier=None):
         self.content_type = content_type
         self.filename = filename
@@ -114,7 +154,8 @@ class ResultFile(ResultItem):
 
 class ResultBuffer(ResultItem):
     """ Class for results that are actually a subset of a larger context.
-        Usually a buffer
+        Usually a buffer. The chunks are yielded as ``buffer`` views on the 
+        data and are thus not copied.
     """
 
     def __init__(self, buf, content_type=None, filename=None, identifier=None):
@@ -141,12 +182,107 @@ class ResultBuffer(ResultItem):
             yield self.buf
             return
 
+        # unicode objects do not expose their encoded bytes as a buffer
+        if isinstance(self.buf, unicode):
+            view = lambda i: self.buf[i:i+chunksize]
+        else:
+            view = lambda i: buffer(self.buf, i, chunksize)
+
         i = 0
         while i < size:
-            yield self.buf[i:i+chunksize]
+            yield view(i)
             i += chunksize
 
 
+class SpoolConfigReader(config.Reader):
+    section = "services.owscommon"
+    spool_threshold = config.Option(type=int, default=16 * 1024 * 1024)
+    path_temp = config.Option(type=str, default=None, section="core.system")
+
+
+class ResultSpool(ResultItem):
+    """ Class for results that are written to a spool. The data is kept in 
+        memory until it exceeds the ``threshold`` (in bytes, defaults to the 
+        configured ``spool_threshold``) and is then transparently spilled to 
+        an anonymous temporary file. As that file has no name on the disc, it
+        is removed as soon as the spool is deleted or garbage collected.
+
+        Alternatively, an already opened file object can be passed as 
+        ``fileobj``.
+    """
+
+    def __init__(self, content_type=None, filename=None, identifier=None,
+                 fileobj=None, threshold=None):
+        super(ResultSpool, self).__init__(content_type, filename, identifier)
+        if fileobj is None:
+            reader = SpoolConfigReader(get_eoxserver_config())
+            if threshold is None:
+                threshold = reader.spool_threshold
+
+            if threshold > 0:
+                fileobj = SpooledTemporaryFile(
+                    threshold, prefix="eoxs_spool_", dir=reader.path_temp
+                )
+            else:
+                fileobj = TemporaryFile(
+                    prefix="eoxs_spool_", dir=reader.path_temp
+                )
+        self.fileobj = fileobj
+
+    def write(self, data):
+        """ Appends the given data to the spool.
+        """
+        self.fileobj.write(data)
+
+    @property
+    def spilled(self):
+        """ Returns ``True`` if the data is stored on the disc.
+        """
+        if isinstance(self.fileobj, SpooledTemporaryFile):
+            return self.fileobj._rolled
+        return True
+
+    @property
+    def streamed(self):
+        return self.spilled
+
+    @property
+    def data(self):
+        self.fileobj.seek(0)
+        return self.fileobj.read()
+
+    @property
+    def data_file(self):
+        self.fileobj.seek(0)
+        return self.fileobj
+
+    def __len__(self):
+        self.fileobj.seek(0, os.SEEK_END)
+        return self.fileobj.tell()
+
+    def chunked(self, chunksize):
+        self.fileobj.seek(0)
+        while True:
+            data = self.fileobj.read(chunksize)
+            if not data:
+                break
+
+            yield data
+
+    def delete(self):
+        self.fileobj.close()
+
+
+def spool_file(path, content_type=None, filename=None, identifier=None):
+    """ Returns a :class:`ResultSpool` for the file at the given path. The 
+        file is unlinked right away, so that it disappears as soon as the 
+        spool is closed.
+    """
+    fileobj = open(path, "rb")
+    os.remove(path)
+    return ResultSpool(content_type, filename, identifier, fileobj)
+
+
 def get_content_type(result_set):
     """ Returns the content type of a result set. If only one item is included
         its content type is used.
@@ -175,9 +311,103 @@ def get_headers(result_item):
 
 
 
-def to_http_response(result_set, response_type=HttpResponse, boundary=None):
+def get_etag(*values):
+    """ Returns a strong entity tag for the given values, which shall identify
+        the representation (e.g: the catalog revision and the request URL).
+    """
+    return quote_etag(hashlib.sha1(
+        "|".join(map(unicode, values)).encode("utf-8")
+    ).hexdigest())
+
+
+def encode_etag(etag, encoding):
+    """ Returns the entity tag of the representation compressed with the 
+        given content encoding.
+    """
+    return '%s;%s"' % (etag[:-1], encoding)
+
+
+def _to_timestamp(last_modified):
+    if is_aware(last_modified):
+        return calendar.timegm(last_modified.utctimetuple())
+    return time.mktime(last_modified.timetuple())
+
+
+def is_not_modified(request, etag=None, last_modified=None):
+    """ Evaluates the conditional headers ("If-None-Match" and 
+        "If-Modified-Since") of the request against the given validators.
+        Returns ``True`` if the client already has the current representation.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if request.META.get("HTTP_IF_NONE_MATCH") and etag:
+        # "If-None-Match" takes precedence over "If-Modified-Since"
+        return get_validated_etag(request, etag) is not None
+
+    if_modified_since = parse_http_date_safe(
+        request.META.get("HTTP_IF_MODIFIED_SINCE", "")
+    )
+    if if_modified_since is not None and last_modified is not None:
+        return int(_to_timestamp(last_modified)) <= if_modified_since
+
+    return False
+
+
+def get_validated_etag(request, etag):
+    """ Returns the entity tag of the "If-None-Match" header matching the 
+        current representation. This is either the given `etag` or, if the 
+        client holds the representation compressed with the content encoding
+        negotiated for this request, the tag with the encoding suffix (see 
+        `compress_response`). Returns ``None`` if no tag matches.
+    """
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    encoding = get_content_encoding(request)
+    if encoding and encode_etag(etag, encoding).strip('"') in etags:
+        return encode_etag(etag, encoding)
+    elif "*" in etags or etag.strip('"') in etags:
+        return etag
+    return None
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """ Sets the "ETag" and "Last-Modified" headers of the response.
+    """
+    if etag:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(_to_timestamp(last_modified))
+    return response
+
+
+def not_modified_response(etag=None, last_modified=None, request=None):
+    """ Returns a "304 Not Modified" response with the given validators. If 
+        the client of the `request` validated a compressed representation, the
+        response carries the same entity tag and varies on "Accept-Encoding" 
+        like the compressed response itself.
+    """
+    response = HttpResponseNotModified()
+    if etag and request is not None:
+        validated = get_validated_etag(request, etag)
+        if validated is not None and validated != etag:
+            etag = validated
+            patch_vary_headers(response, ("Accept-Encoding",))
+    return set_validators(response, etag, last_modified)
+
+
+# maximum size of the chunks handed to the response. Django copies each chunk
+# when it is written, so this limits the additional memory to one chunk
+RESPONSE_CHUNK_SIZE = 1024 * 1024
+
+
+def to_http_response(result_set, response_type=HttpResponse, boundary=None,
+                     etag=None, last_modified=None):
     """ Returns a response for a given result set. The ``response_type`` is the
-        class to be used. It must be capable to work with iterators.
+        class to be used. It must be capable to work with iterators. If any of
+        the items shall be streamed (e.g: spooled results that were spilled to 
+        the disc), a streaming response is used instead of the default 
+        ``HttpResponse``. The optional ``etag`` and ``last_modified`` are set 
+        as the validator headers of the response.
     """
     def get_payload_size(items, boundary):
         boundary_str = "%s--%s%s" % (mp.CRLF, boundary, mp.CRLF)
@@ -190,7 +420,7 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                 mp.CRLF.join("%s: %s" % (k, v) for k, v in get_headers(item))
             )
             size += len(mp.CRLFCRLF)
-            size += len(item.data)
+            size += len(item)
         size += len(boundary_str_end)
         return size
 
@@ -221,7 +451,8 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                         "%s: %s" % (k, v) for k, v in get_headers(item)
                     )
                     yield mp.CRLFCRLF
-                yield item.data
+                for chunk in item.chunked(RESPONSE_CHUNK_SIZE):
+                    yield chunk
             if boundary:
                 yield boundary_str_end
         finally:
@@ -232,7 +463,12 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                     # TODO: Log the failure as a warning!
                     pass # bad exception swallowing...
 
+    if response_type == HttpResponse \
+            and any(item.streamed for item in result_set):
+        response_type = StreamingHttpResponse
+
     # workaround for bug in django, that does not consume iterator in tests.
+    # the list only holds views on the data of the result items
     if response_type == HttpResponse:
         response = response_type(
             list(response_iterator(result_set, boundary)),
@@ -247,6 +483,141 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
     for key, value in headers:
         response[key] = value
 
+    # multipart responses are compressed when any of the parts benefits
+    response.compressible = any(
+        is_compressible(item.content_type, item.compressed)
+        for item in result_set
+    )
+
+    return set_validators(response, etag, last_modified)
+
+
+class CompressionConfigReader(config.Reader):
+    section = "services.owscommon"
+    compression_level = config.Option(type=int, default=6)
+
+
+# content types that are worth to be compressed for transfer; binary formats 
+# like PNG, JPEG or ZIP are already compressed
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/", "application/xml", "application/json", "application/javascript",
+    "application/vnd.ogc.", "image/svg+xml", "image/tiff", 
+    "application/x-netcdf", "application/x-hdf"
+)
+
+
+def is_compressible(content_type, compressed=False):
+    """ Returns ``True`` if data of the given content type shall be compressed
+        for transfer.
+    """
+    if compressed or not content_type:
+        return False
+    content_type = content_type.split(";")[0].strip().lower()
+    return (
+        content_type.startswith(COMPRESSIBLE_CONTENT_TYPES) 
+        or content_type.endswith("+xml")
+    )
+
+
+def get_content_encoding(request):
+    """ Negotiates the content encoding ("gzip" or "deflate") from the 
+        "Accept-Encoding" header of the request. Returns ``None`` if none of 
+        them is acceptable.
+    """
+    qualities = {}
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    candidates = [
+        (qualities.get(coding, qualities.get("*", 0.0)), coding)
+        for coding in ("gzip", "deflate")
+    ]
+    quality, coding = max(candidates, key=lambda c: c[0])
+    if quality <= 0.0:
+        return None
+    return coding
+
+
+def iter_compressed(chunks, encoding, level=6):
+    """ Compresses the given iterable of chunks incrementally with the given 
+        content encoding ("gzip" or "deflate") and yields the compressed 
+        chunks.
+    """
+    wbits = zlib.MAX_WBITS
+    if encoding == "gzip":
+        # add gzip header and trailer instead of the zlib ones
+        wbits |= 16
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(request, response, level=None):
+    """ Applies a negotiated content encoding to a successful response, if its
+        content is compressible. Streamed responses are compressed 
+        incrementally. The compression level defaults to the configured one;
+        a level of ``0`` disables the compression.
+    """
+    if response.status_code != 200 or response.has_header("Content-Encoding"):
+        return response
+
+    compressible = getattr(response, "compressible", None)
+    if compressible is None:
+        compressible = is_compressible(response.get("Content-Type"))
+    if not compressible:
+        return response
+
+    if level is None:
+        level = CompressionConfigReader(
+            get_eoxserver_config()
+        ).compression_level
+    if not level:
+        return response
+
+    patch_vary_headers(response, ("Accept-Encoding",))
+
+    encoding = get_content_encoding(request)
+    if not encoding:
+        return response
+
+    if getattr(response, "streaming", False):
+        response.streaming_content = iter_compressed(
+            response.streaming_content, encoding, level
+        )
+    else:
+        # iterating the response yields the content chunk by chunk instead
+        # of joining it beforehand
+        response.content = "".join(
+            iter_compressed(response, encoding, level)
+        )
+
+    if response.has_header("Content-Length"):
+        del response["Content-Length"]
+    if not getattr(response, "streaming", False):
+        response["Content-Length"] = str(len(response.content))
+
+    response["Content-Encoding"] = encoding
+    if response.has_header("ETag"):
+        # the representation differs, so the entity tag must differ as well
+        response["ETag"] = encode_etag(response["ETag"], encoding)
+
     return response
 
 
@@ -272,7 +643,8 @@ def parse_headers(headers):
 def result_set_from_raw_data(data):
     """ Create a result set from raw HTTP data. This can either be a single
         or a multipart string. It returns a list containing objects of the
-        `ResultBuffer` type that reference substrings of the given data.
+        `ResultBuffer` type that reference substrings of the given data. Only
+        the headers are parsed; the payloads are kept as ``buffer`` views.
     """
     return [
         ResultBuffer(data, *parse_headers(headers))
@@ -178,7 +178,7 @@ class Subsets(list):
                         )
                     line.srid = srid
                     if srid != 4326:
-                        line.transform(4326)
+                        line.transform(crss.get_coord_transform(srid, 4326))
                     qs = qs.filter(footprint__intersects=line)
 
                 else:
@@ -208,7 +208,7 @@ class Subsets(list):
             poly.srid = srid
 
             if srid != 4326:
-                poly.transform(4326)
+                poly.transform(crss.get_coord_transform(srid, 4326))
             if containment == "overlaps":
                 qs = qs.filter(footprint__intersects=poly)
             elif containment == "contains":
@@ -268,7 +268,7 @@ class Subsets(list):
                         )
                     line.srid = srid
                     if srid != 4326:
-                        line.transform(4326)
+                        line.transform(crss.get_coord_transform(srid, 4326))
 
                     if not line.intersects(footprint):
                         return False
@@ -300,7 +300,7 @@ class Subsets(list):
             poly.srid = srid
 
             if srid != 4326:
-                poly.transform(4326)
+                poly.transform(crss.get_coord_transform(srid, 4326))
             if containment == "overlaps":
                 if not footprint.intersects(poly):
                     return False
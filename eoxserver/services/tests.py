@@ -26,12 +26,54 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
+import sys
+import zlib
+import subprocess
+from tempfile import mkstemp
 from textwrap import dedent
+from uuid import uuid4
+
+from lxml import etree
+
+from datetime import datetime
 
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils.http import http_date
+from django.utils.timezone import utc
+from django.contrib.gis.geos import MultiPolygon, Polygon
 
+from eoxserver.core import env
 from eoxserver.core.util import multiparttools as mp
-from eoxserver.services.result import result_set_from_raw_data
+from eoxserver.contrib import gdal
+from eoxserver.backends.models import DataItem
+from eoxserver.resources.coverages import models as coverages, crss
+from eoxserver.services.models import CoverageDescriptionFragment
+from eoxserver.services.result import (
+    result_set_from_raw_data, get_etag, is_not_modified, to_http_response, 
+    ResultBuffer, compress_response, RESPONSE_CHUNK_SIZE, ResultSpool, 
+    spool_file, StreamingHttpResponse, encode_etag, not_modified_response
+)
+from eoxserver.services.subset import Subsets, Trim
+from eoxserver.services.ows.wcs.v20 import fragments
+from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.ows.wcs.v20.encodings.geotiff import is_compressed
+from eoxserver.services.ows.wcs.v20.parameters import (
+    WCS20CoverageRenderParams
+)
+from eoxserver.services.ows.wcs.v20.util import (
+    RangeSubset, ScaleSize, nsmap
+)
+from eoxserver.services.mapserver.wcs.coverage_renderer import (
+    RectifiedCoverageMapServerRenderer
+)
+from eoxserver.services.gdal.wcs.rectified_coverage_renderer import (
+    GDALRectifiedCoverageRenderer
+)
+from eoxserver.services.gdal.wcs.referenceable_dataset_renderer import (
+    GDALReferenceableDatasetRenderer, get_output_path
+)
 
 
 class MultipartTest(TestCase):
@@ -103,3 +145,463 @@ class ResultSetTestCase(TestCase):
         self.assertEqual(first.identifier, "message-part")
         self.assertEqual(str(second.data), "PGh0bWw+CiAgPGhlYWQ+CiAgPC9oZWFkPgogIDxib2R5PgogICAgPHA+VGhpcyBpcyB0aGUgYm9keSBvZiB0aGUgbWVzc2FnZS48L3A+CiAgPC9ib2R5Pgo8L2h0bWw+Cg==")
 
+
+class ZeroCopyResultTestCase(TestCase):
+    """ Checks that large raw results are passed to the response as views 
+        and that the peak memory stays well below the size of the payload.
+        The response is produced in a fresh process, as the peak memory is 
+        a process wide high-water mark.
+    """
+
+    payload_size = 64 * 1024 * 1024
+
+    script = dedent("""
+        import sys, resource
+        from django.http import HttpResponse
+        from eoxserver.services.result import (
+            result_set_from_raw_data, to_http_response
+        )
+
+        def get_peak_memory():
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        HttpResponse("") # load the settings beforehand
+
+        # the file is read into a single string, so the peak memory is not 
+        # raised by any temporary copies
+        with open(sys.argv[1], "rb") as f:
+            raw = f.read()
+        before = get_peak_memory()
+
+        result_set = result_set_from_raw_data(raw)
+        response = to_http_response(result_set)
+        size = max_chunk = 0
+        for chunk in response:
+            size += len(chunk)
+            max_chunk = max(max_chunk, len(chunk))
+
+        print len(result_set), int(isinstance(result_set[1].data, buffer)), \\
+            len(result_set[1]), size, int(response["Content-Length"]), \\
+            max_chunk, get_peak_memory() - before
+    """)
+
+    def setUp(self):
+        fd, self.filename = mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write("".join((
+                "Content-Type: multipart/mixed; boundary=wcs\r\n\r\n",
+                "\r\n--wcs\r\nContent-Type: text/xml\r\n\r\n<a/>",
+                "\r\n--wcs\r\nContent-Type: image/tiff\r\n",
+                "Content-Length: %d\r\n\r\n" % self.payload_size
+            )))
+            chunk = "\0" * (1024 * 1024)
+            for _ in xrange(self.payload_size / len(chunk)):
+                f.write(chunk)
+            f.write("\r\n--wcs--")
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_peak_memory(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+            [sys.executable, "-c", self.script, self.filename], env=env
+        )
+        (parts, is_buffer, payload_size, size, content_length, max_chunk, 
+            peak_memory) = map(int, output.split()[-7:])
+
+        self.assertEqual(2, parts)
+        self.assertTrue(is_buffer)
+        self.assertEqual(self.payload_size, payload_size)
+        self.assertEqual(content_length, size)
+        self.assertLessEqual(max_chunk, RESPONSE_CHUNK_SIZE)
+        self.assertLess(peak_memory, self.payload_size / 4)
+
+
+class ResultSpoolTestCase(TestCase):
+    def test_spill(self):
+        spool = ResultSpool("image/tiff", threshold=16)
+        spool.write("0123456789")
+        self.assertFalse(spool.spilled)
+        spool.write("0123456789")
+        self.assertTrue(spool.spilled)
+        self.assertEqual(20, len(spool))
+        self.assertEqual("01234567890123456789", spool.data)
+
+    def test_streamed_response(self):
+        spool = ResultSpool("image/tiff", threshold=0)
+        spool.write("x" * (RESPONSE_CHUNK_SIZE + 1))
+
+        response = to_http_response([spool])
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(
+            str(RESPONSE_CHUNK_SIZE + 1), response["Content-Length"]
+        )
+
+        # closing the response early (e.g: when the client disconnected) 
+        # removes the spool
+        content = iter(response.streaming_content)
+        self.assertEqual(RESPONSE_CHUNK_SIZE, len(next(content)))
+        response.close()
+        self.assertTrue(spool.fileobj.closed)
+
+    def test_spool_file(self):
+        fd, path = mkstemp()
+        with os.fdopen(fd, "w") as f:
+            f.write("content")
+
+        spool = spool_file(path, "text/plain")
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual("content", spool.data)
+        spool.delete()
+
+
+class OutputPathTestCase(TestCase):
+    """ Checks that small outputs are only encoded in memory if the driver 
+        supports the VSI layer.
+    """
+
+    class NonVirtualIODriver(object):
+        def GetMetadataItem(self, name, domain=""):
+            return None
+
+    def setUp(self):
+        self.dataset = gdal.GetDriverByName("MEM").Create("", 10, 10)
+
+    def test_virtual_io(self):
+        path = get_output_path(gdal.GetDriverByName("GTiff"), self.dataset)
+        self.assertTrue(path.startswith("/vsimem/"))
+
+    def test_non_virtual_io(self):
+        path = get_output_path(self.NonVirtualIODriver(), self.dataset)
+        self.assertFalse(path.startswith("/vsimem/"))
+        self.assertTrue(os.path.isdir(os.path.dirname(path)))
+
+    def test_netcdf(self):
+        driver = gdal.GetDriverByName("netCDF")
+        if driver is None:
+            self.skipTest("GDAL is built without netCDF support.")
+        if driver.GetMetadataItem("DCAP_VIRTUALIO") == "YES":
+            self.skipTest("The netCDF driver supports the VSI layer.")
+
+        out_ds = GDALReferenceableDatasetRenderer.encode(
+            driver, self.dataset, "application/x-netcdf", {}
+        )
+        self.assertIsNotNone(out_ds)
+        filenames = out_ds.GetFileList()
+        out_ds = None
+        try:
+            self.assertTrue(filenames)
+            self.assertTrue(all(os.path.isfile(f) for f in filenames))
+        finally:
+            for filename in filenames:
+                if os.path.isfile(filename):
+                    os.remove(filename)
+
+
+class CoverageDescriptionFragmentTestCase(TestCase):
+    def setUp(self):
+        range_type = coverages.RangeType.objects.create(name="Grey")
+        coverages.Band.objects.create(
+            index=0, name="grey", identifier="grey", uom="DN", data_type=1,
+            range_type=range_type
+        )
+        self.coverage = coverages.RectifiedDataset(
+            identifier="rectified-1", range_type=range_type, 
+            min_x=0, min_y=0, max_x=10, max_y=10, srid=4326,
+            size_x=100, size_y=100,
+            footprint=MultiPolygon(Polygon.from_bbox((0, 0, 10, 10)))
+        )
+        self.coverage.full_clean()
+        self.coverage.save()
+
+    def test_spliced_fragments(self):
+        encoder = WCS20EOXMLEncoder()
+        c14n = lambda xml: etree.tostring(etree.fromstring(xml), method="c14n")
+        expected = encoder.serialize(
+            encoder.encode_coverage_descriptions([self.coverage]), False
+        )
+        self.assertEqual(
+            c14n(expected), c14n(
+                encoder.serialize_coverage_descriptions([self.coverage], False)
+            )
+        )
+
+        # the stored fragment is used as long as the revision matches
+        fragment = CoverageDescriptionFragment.objects.get()
+        fragment.content = fragment.content.replace("grey", "cached")
+        fragment.save()
+        self.assertIn(
+            "cached", 
+            encoder.serialize_coverage_descriptions([self.coverage], False)
+        )
+
+        # modifications of the coverage result in a new revision
+        self.coverage.size_x = 200
+        self.coverage.save()
+        self.assertNotIn(
+            "cached", 
+            encoder.serialize_coverage_descriptions([self.coverage], False)
+        )
+
+    def test_concurrent_creation(self):
+        encoder = WCS20EOXMLEncoder()
+        encoder.serialize_coverage_descriptions([self.coverage], False)
+
+        # a request that did not see the fragment created by another one 
+        # updates the existing row
+        fragments._save_fragment(CoverageDescriptionFragment(
+            coverage=self.coverage, revision="0:concurrent", content="<a/>"
+        ))
+        fragment = CoverageDescriptionFragment.objects.get()
+        self.assertEqual("0:concurrent", fragment.revision)
+        self.assertEqual("<a/>", fragment.content)
+
+
+class ConditionalRequestTestCase(TestCase):
+    last_modified = datetime(2014, 3, 1, 12, 0, 0, tzinfo=utc)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.etag = get_etag(42, "/ows?service=WCS&request=GetCapabilities")
+
+    def test_if_none_match(self):
+        request = self.factory.get("/ows", HTTP_IF_NONE_MATCH=self.etag)
+        self.assertTrue(is_not_modified(request, self.etag))
+
+        request = self.factory.get("/ows", 
+            HTTP_IF_NONE_MATCH=get_etag(43, "/ows")
+        )
+        self.assertFalse(is_not_modified(request, self.etag))
+
+        request = self.factory.post("/ows", HTTP_IF_NONE_MATCH=self.etag)
+        self.assertFalse(is_not_modified(request, self.etag))
+
+    def test_if_modified_since(self):
+        request = self.factory.get("/ows", 
+            HTTP_IF_MODIFIED_SINCE=http_date(1393675200)
+        )
+        self.assertTrue(is_not_modified(request, None, self.last_modified))
+
+        request = self.factory.get("/ows", 
+            HTTP_IF_MODIFIED_SINCE=http_date(1393675199)
+        )
+        self.assertFalse(is_not_modified(request, None, self.last_modified))
+
+    def test_response_validators(self):
+        response = to_http_response(
+            [ResultBuffer("<a/>", "text/xml")], etag=self.etag, 
+            last_modified=self.last_modified
+        )
+        self.assertEqual(self.etag, response["ETag"])
+        self.assertEqual(http_date(1393675200), response["Last-Modified"])
+
+    def test_compressed_representation(self):
+        gzip_etag = encode_etag(self.etag, "gzip")
+        request = self.factory.get("/ows", 
+            HTTP_IF_NONE_MATCH=gzip_etag, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertTrue(is_not_modified(request, self.etag))
+        response = not_modified_response(self.etag, None, request)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(gzip_etag, response["ETag"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        # the compressed representation is not valid for clients that no 
+        # longer accept the encoding
+        request = self.factory.get("/ows", HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertFalse(is_not_modified(request, self.etag))
+
+        request = self.factory.get("/ows", 
+            HTTP_IF_NONE_MATCH=self.etag, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        response = not_modified_response(self.etag, None, request)
+        self.assertEqual(self.etag, response["ETag"])
+        self.assertFalse(response.has_header("Vary"))
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.xml = "<a>%s</a>" % ("<b>content</b>" * 1000)
+
+    def test_is_compressed(self):
+        params = lambda compression: WCS20CoverageRenderParams(
+            None, encoding_params={"compression": compression}
+        )
+        self.assertTrue(is_compressed(params("LZW")))
+        self.assertFalse(is_compressed(params("None")))
+        self.assertFalse(is_compressed(params(None)))
+        self.assertFalse(is_compressed(object()))
+
+    def compress(self, result_set, **headers):
+        request = self.factory.get("/ows", **headers)
+        return compress_response(
+            request, to_http_response(result_set), level=6
+        )
+
+    def test_gzip(self):
+        response = self.compress(
+            [ResultBuffer(self.xml, "text/xml")], 
+            HTTP_ACCEPT_ENCODING="deflate;q=0.5, gzip"
+        )
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(str(len(response.content)), response["Content-Length"])
+        self.assertEqual(
+            self.xml, zlib.decompress(response.content, 16 + zlib.MAX_WBITS)
+        )
+
+    def test_not_accepted(self):
+        response = self.compress(
+            [ResultBuffer(self.xml, "text/xml")], 
+            HTTP_ACCEPT_ENCODING="gzip;q=0, identity"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        # the response still varies with the accepted encodings
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(self.xml, response.content)
+
+    def test_skip_compressed(self):
+        response = self.compress(
+            [ResultBuffer("\x89PNG...", "image/png")], 
+            HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertFalse(response.has_header("Vary"))
+
+    def test_multipart(self):
+        response = self.compress([
+                ResultBuffer(self.xml, "text/xml"), 
+                ResultBuffer("\x89PNG...", "image/png")
+            ], HTTP_ACCEPT_ENCODING="deflate"
+        )
+        self.assertEqual("deflate", response["Content-Encoding"])
+        content = zlib.decompress(response.content)
+        self.assertIn(self.xml, content)
+        self.assertIn("Content-Type: image/png", content)
+
+
+class RectifiedCoverageRendererEquivalenceTestCase(TestCase):
+    """ Checks that the GDAL renderer for rectified coverages produces the 
+        same images as the MapServer renderer.
+    """
+
+    def setUp(self):
+        range_type = coverages.RangeType.objects.create(name="Pattern")
+        for index, name in enumerate(("b1", "b2")):
+            coverages.Band.objects.create(
+                index=index, name=name, identifier=name, uom="DN", 
+                data_type=gdal.GDT_Byte, range_type=range_type
+            )
+
+        fd, self.filename = mkstemp(suffix=".tif")
+        os.close(fd)
+        ds = gdal.GetDriverByName("GTiff").Create(self.filename, 60, 40, 2)
+        ds.SetGeoTransform([10, 0.1, 0, 44, 0, -0.1])
+        ds.SetProjection(crss.get_spatial_reference(4326).wkt)
+        for i in (1, 2):
+            ds.GetRasterBand(i).WriteRaster(0, 0, 60, 40, "".join(
+                chr((x * i + y) % 256) for y in range(40) for x in range(60)
+            ))
+        ds = None
+
+        self.coverage = coverages.RectifiedDataset(
+            identifier="pattern", range_type=range_type, 
+            min_x=10, min_y=40, max_x=16, max_y=44, srid=4326,
+            size_x=60, size_y=40,
+            footprint=MultiPolygon(Polygon.from_bbox((10, 40, 16, 44)))
+        )
+        self.coverage.full_clean()
+        self.coverage.save()
+        DataItem.objects.create(
+            dataset=self.coverage, location=self.filename, 
+            semantic="bands[1:2]", format="image/tiff"
+        )
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def render(self, renderer_class, subsets=(), crs=None, **kwargs):
+        params = WCS20CoverageRenderParams(
+            self.coverage, Subsets(subsets, crs=crs), format="image/tiff",
+            **kwargs
+        )
+        result_set = renderer_class(env).render(params)
+
+        path = "/vsimem/%s.tif" % uuid4().hex
+        gdal.FileFromMemBuffer(path, result_set[0].data)
+        for item in result_set:
+            item.delete()
+        try:
+            ds = gdal.Open(path)
+            return (
+                (ds.RasterXSize, ds.RasterYSize), ds.GetGeoTransform(),
+                [ds.GetRasterBand(i).ReadRaster(0, 0, ds.RasterXSize, 
+                    ds.RasterYSize) for i in range(1, ds.RasterCount + 1)]
+            )
+        finally:
+            ds = None
+            gdal.Unlink(path)
+
+    def assertEquivalent(self, compare_pixels=True, **kwargs):
+        size, gt, pixels = self.render(GDALRectifiedCoverageRenderer, **kwargs)
+        ms_size, ms_gt, ms_pixels = self.render(
+            RectifiedCoverageMapServerRenderer, **kwargs
+        )
+        self.assertEqual(ms_size, size)
+        for value, ms_value in zip(gt, ms_gt):
+            self.assertAlmostEqual(ms_value, value, places=6)
+        if compare_pixels:
+            self.assertEqual(ms_pixels, pixels)
+
+    def test_full(self):
+        self.assertEquivalent()
+
+    def test_image_subset(self):
+        self.assertEquivalent(
+            subsets=(Trim("x", 10, 29), Trim("y", 5, 24)), crs="imageCRS"
+        )
+
+    def test_geo_subset(self):
+        # subset bounds on pixel edges
+        self.assertEquivalent(
+            subsets=(Trim("long", 11, 13), Trim("lat", 41, 43)),
+            crs="http://www.opengis.net/def/crs/EPSG/0/4326"
+        )
+
+    def test_range_subset(self):
+        self.assertEquivalent(rangesubset=RangeSubset(["b2"]))
+
+    def test_scale_size(self):
+        # resampling details differ, only compare the grid
+        self.assertEquivalent(compare_pixels=False,
+            scales=(ScaleSize("x", 30), ScaleSize("y", 20))
+        )
+
+    def test_multipart_description(self):
+        params = WCS20CoverageRenderParams(
+            self.coverage, Subsets(
+                (Trim("x", 10, 29), Trim("y", 5, 24)), crs="imageCRS"
+            ), format="image/tiff", mediatype="multipart/related"
+        )
+        result_set = RectifiedCoverageMapServerRenderer(env).render(params)
+        try:
+            self.assertEqual(2, len(result_set))
+            description = etree.fromstring(str(result_set[0].data))
+            self.assertEqual(["19 19"], description.xpath(
+                "gml:domainSet/gml:RectifiedGrid/gml:limits/"
+                "gml:GridEnvelope/gml:high/text()", namespaces=nsmap
+            ))
+            self.assertEqual(["b1", "b2"], description.xpath(
+                "gmlcov:rangeType/swe:DataRecord/swe:field/@name", 
+                namespaces=nsmap
+            ))
+            self.assertEqual([result_set[1].identifier], description.xpath(
+                "gml:rangeSet/gml:File/gml:fileReference/text()", 
+                namespaces=nsmap
+            ))
+            self.assertTrue(result_set[1].streamed)
+        finally:
+            for item in result_set:
+                item.delete()
@@ -41,7 +41,13 @@ except:
         pass
 from django.conf import settings
 
+from eoxserver.resources.coverages import journal
 from eoxserver.services.ows.component import ServiceComponent, env
+from eoxserver.services.ows.common.config import get_configuration_stamp
+from eoxserver.services.result import (
+    get_etag, is_not_modified, not_modified_response, set_validators,
+    compress_response
+)
 
 
 logger = logging.getLogger(__name__)
@@ -52,14 +58,27 @@ def ows(request):
         If an exception occurs during the handling of the request, an exception
         handler is determined and dispatched.
 
+        If the handler is able to tell the catalog revision its response 
+        depends upon (the optional ``get_revision()`` method), the response is
+        tagged with an "ETag" and a "Last-Modified" header and conditional 
+        requests are answered with "304 Not Modified" before any encoding 
+        takes place. Successful responses are compressed, if the client 
+        accepts it.
+
         Any response of the service handler and exception handler is transformed
         to a django HttpResponse to adhere the required interface.
     """
 
     component = ServiceComponent(env)
+    etag, last_modified = None, None
 
     try:
         handler = component.query_service_handler(request)
+
+        etag, last_modified = get_validators(handler, request)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified, request)
+
         result = handler.handle(request)
         default_status = 200
     except Exception, e:
@@ -67,7 +86,50 @@ def ows(request):
         handler = component.query_exception_handler(request)
         result = handler.handle_exception(request, e)
         default_status = 400
+        etag, last_modified = None, None
+
+    response = to_response(result, default_status)
+    if response is not None and response.status_code == 200:
+        set_validators(response, etag, last_modified)
+        compress_response(request, response)
+    return response
 
+
+def get_validators(handler, request):
+    """ Returns the "ETag" and "Last-Modified" validators for the response of
+        the given handler or a tuple of ``None`` values if the handler does 
+        not provide the catalog revision of its response. As the responses 
+        also depend on the configuration, its stamp and modification time are
+        included.
+    """
+    if request.method not in ("GET", "HEAD") \
+            or not hasattr(handler, "get_revision"):
+        return None, None
+
+    try:
+        revision = handler.get_revision(request)
+    except Exception:
+        # errors will be reported by the actual request handling
+        logger.debug(traceback.format_exc())
+        return None, None
+
+    if revision is None:
+        return None, None
+
+    config_stamp, config_modified = get_configuration_stamp()
+    last_modified = journal.get_timestamp(revision)
+    if last_modified is not None and config_modified is not None:
+        last_modified = max(last_modified, config_modified)
+
+    return (
+        get_etag(revision, config_stamp, request.get_full_path()),
+        last_modified
+    )
+
+
+def to_response(result, default_status):
+    """ Converts the result of a handler to a django compatible response.
+    """
     # try to return a django compatible response
     if isinstance(result, (HttpResponse, StreamingHttpResponse)):
         return result
@@ -0,0 +1,358 @@
+#!/usr/bin/python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Micro-benchmarks for performance relevant parts of EOxServer. Each 
+benchmark is a sub-command, e.g.:
+
+    eoxserver-benchmark.py crs --iterations 10000 --epsg 4326 32633
+    eoxserver-benchmark.py describe --settings myinstance.settings --count 500
+    eoxserver-benchmark.py getcoverage --settings myinstance.settings \
+        --coverage MER_FRS_1P_reduced_RGB --size 256
+    eoxserver-benchmark.py rectify --size 4096 --gcps 32 --threads ALL_CPUS
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import textwrap
+from os.path import join
+from timeit import default_timer
+
+
+def timed(func, iterations):
+    """ Run ``func`` ``iterations`` times and return the mean duration in 
+    seconds. """
+    start = default_timer()
+    for _ in xrange(iterations):
+        func()
+    return (default_timer() - start) / iterations
+
+
+def report(name, duration, baseline=None):
+    line = "%-40s %12.3f us" % (name, duration * 1e6)
+    if baseline is not None and duration > 0:
+        line += "  (x%.1f)" % (baseline / duration)
+    print line
+
+#-------------------------------------------------------------------------------
+# CRS registry
+
+def benchmark_crs(args):
+    from eoxserver.contrib import osr
+    from eoxserver.resources.coverages import crss
+
+    iterations = args.iterations
+
+    for epsg in args.epsg:
+        print "EPSG:%d" % epsg
+
+        def uncached_sr():
+            sr = osr.SpatialReference()
+            sr.ImportFromEPSG(epsg)
+            sr.IsProjected()
+
+        def uncached_ct():
+            src = osr.SpatialReference()
+            src.ImportFromEPSG(epsg)
+            dst = osr.SpatialReference()
+            dst.ImportFromEPSG(4326)
+            osr.CoordinateTransformation(src.sr, dst.sr)
+
+        # warm up the registry
+        crss.get_transformation(epsg, 4326)
+
+        baseline = timed(uncached_sr, iterations)
+        report("  ImportFromEPSG + IsProjected", baseline)
+        report("  crss.isProjected (registry)",
+            timed(lambda: crss.isProjected(epsg), iterations), baseline
+        )
+
+        baseline = timed(uncached_ct, iterations)
+        report("  CoordinateTransformation", baseline)
+        report("  crss.get_transformation (registry)",
+            timed(lambda: crss.get_transformation(epsg, 4326), iterations),
+            baseline
+        )
+
+#-------------------------------------------------------------------------------
+# coverage descriptions
+
+def setup_django(args):
+    if args.settings:
+        os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+
+
+def benchmark_describe(args):
+    setup_django(args)
+    from eoxserver.resources.coverages import models
+    from eoxserver.services.models import CoverageDescriptionFragment
+    from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+
+    coverages = models.Coverage.objects.order_by("identifier")[:args.count]
+    coverages = coverages.cast_all()
+    encoder = WCS20EOXMLEncoder()
+    print "%d coverages" % len(coverages)
+
+    def encode():
+        encoder.serialize(
+            encoder.encode_coverage_descriptions(coverages), False
+        )
+
+    def splice():
+        encoder.serialize_coverage_descriptions(coverages, False)
+
+    # NOTE: this (re-)creates the stored fragments of the coverages
+    CoverageDescriptionFragment.objects.filter(
+        coverage__in=[coverage.pk for coverage in coverages]
+    ).delete()
+
+    baseline = timed(encode, args.iterations)
+    report("  encode + serialize", baseline)
+    report("  spliced fragments (cold)", timed(splice, 1), baseline)
+    report("  spliced fragments (warm)", timed(splice, args.iterations),
+        baseline
+    )
+
+#-------------------------------------------------------------------------------
+
+def benchmark_getcoverage(args):
+    setup_django(args)
+    from eoxserver.core import env
+    from eoxserver.resources.coverages import models
+    from eoxserver.services.subset import Subsets, Trim
+    from eoxserver.services.ows.wcs.v20.parameters import (
+        WCS20CoverageRenderParams
+    )
+    from eoxserver.services.mapserver.wcs.coverage_renderer import (
+        RectifiedCoverageMapServerRenderer
+    )
+    from eoxserver.services.gdal.wcs.rectified_coverage_renderer import (
+        GDALRectifiedCoverageRenderer
+    )
+
+    coverage = models.Coverage.objects.get(identifier=args.coverage)
+    print "%s (%d x %d)" % (coverage.identifier, coverage.size_x, 
+        coverage.size_y
+    )
+
+    # a window of the requested size in the center of the coverage
+    offset_x = max(0, (coverage.size_x - args.size) / 2)
+    offset_y = max(0, (coverage.size_y - args.size) / 2)
+    requests = (
+        ("full", ()),
+        ("window %dpx" % args.size, (
+            Trim("x", offset_x, offset_x + args.size - 1),
+            Trim("y", offset_y, offset_y + args.size - 1)
+        ))
+    )
+
+    def render(renderer, subsets):
+        params = WCS20CoverageRenderParams(
+            coverage, Subsets(subsets, crs="imageCRS"), format=args.format
+        )
+        for item in renderer.render(params):
+            item.delete()
+
+    mapserver = RectifiedCoverageMapServerRenderer(env)
+    gdal = GDALRectifiedCoverageRenderer(env)
+    for name, subsets in requests:
+        print "  %s" % name
+        baseline = timed(lambda: render(mapserver, subsets), args.iterations)
+        report("    MapServer", baseline)
+        report("    GDAL",
+            timed(lambda: render(gdal, subsets), args.iterations), baseline
+        )
+
+#-------------------------------------------------------------------------------
+# rectification of referenceable datasets
+
+def create_gcp_dataset(path, size, n_gcps):
+    """ Creates a synthetic dataset of ``size`` x ``size`` pixels 
+    geo-referenced by a grid of ``n_gcps`` x ``n_gcps`` tie-points. The 
+    tie-points describe a slightly rotated and curved swath, similar to a 
+    satellite scene. """
+    from math import sin, cos, radians
+    from eoxserver.contrib import gdal, osr
+
+    ds = gdal.GetDriverByName("GTiff").Create(path, size, size, 1,
+        gdal.GDT_Byte, ["TILED=YES"]
+    )
+    row = bytearray(i % 256 for i in xrange(size))
+    band = ds.GetRasterBand(1)
+    for line in xrange(size):
+        band.WriteRaster(0, line, size, 1, str(row[line % 256:] + 
+            row[:line % 256])
+        )
+
+    angle = radians(10)
+    gcps = []
+    for j in xrange(n_gcps + 1):
+        for i in xrange(n_gcps + 1):
+            u, v = float(i) / n_gcps, float(j) / n_gcps
+            x = 10.0 + 5.0 * (u * cos(angle) - v * sin(angle)) + 0.5 * v * v
+            y = 50.0 - 5.0 * (u * sin(angle) + v * cos(angle)) + 0.2 * u * u
+            gcps.append(gdal.GCP(x, y, 0, u * size, v * size))
+
+    sr = osr.SpatialReference()
+    sr.ImportFromEPSG(4326)
+    ds.SetGCPs(gcps, sr.ExportToWkt())
+    ds = None
+
+
+def benchmark_rectify(args):
+    from eoxserver.contrib import gdal
+    from eoxserver.processing.gdal import reftools
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = join(tmp_dir, "gcps.tif")
+        create_gcp_dataset(path, args.size, args.gcps)
+        transformer = reftools.suggest_transformer(path)
+        print "%d x %d pixels, %d tie-points, %s order %d" % (
+            args.size, args.size, (args.gcps + 1) ** 2,
+            reftools.METHOD2STR[transformer["method"]], transformer["order"]
+        )
+
+        memory_limit = args.memory_limit * 1024 * 1024
+        block_size = (args.block_size, args.block_size)
+        configurations = (
+            ("exact, 1 thread", {"max_error": 0}),
+            ("approximate, 1 thread", {}),
+            ("approximate, %s threads" % args.threads, {
+                "num_threads": args.threads
+            }),
+            ("approximate, %s threads, %dpx blocks" % (
+                args.threads, args.block_size
+            ), {
+                "num_threads": args.threads, "block_size": block_size
+            }),
+        )
+
+        def rectify(options):
+            vrt_path = join(tmp_dir, "rectified.vrt")
+            reftools.create_rectified_vrt(path, vrt_path, 
+                memory_limit=memory_limit, **dict(transformer, **options)
+            )
+            ds = gdal.Open(vrt_path)
+            ds.GetRasterBand(1).ReadRaster(
+                0, 0, ds.RasterXSize, ds.RasterYSize
+            )
+            ds = None
+            os.remove(vrt_path)
+
+        baseline = None
+        for name, options in configurations:
+            duration = timed(lambda: rectify(options), args.iterations)
+            report("  " + name, duration, baseline)
+            if baseline is None:
+                baseline = duration
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        add_help=True, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.description = textwrap.dedent(__doc__)
+    subparsers = parser.add_subparsers()
+
+    crs_parser = subparsers.add_parser("crs",
+        help="Compare uncached SRS/transformation creation with lookups in "
+             "the CRS registry."
+    )
+    crs_parser.add_argument("--iterations", type=int, default=1000)
+    crs_parser.add_argument("--epsg", type=int, nargs="+",
+        default=[4326, 3857, 32633]
+    )
+    crs_parser.set_defaults(func=benchmark_crs)
+
+    describe_parser = subparsers.add_parser("describe",
+        help="Compare encoding WCS 2.0 coverage descriptions with splicing "
+             "the stored description fragments. Requires a configured "
+             "instance."
+    )
+    describe_parser.add_argument("--settings", default=None,
+        help="The Django settings module of the instance."
+    )
+    describe_parser.add_argument("--iterations", type=int, default=10)
+    describe_parser.add_argument("--count", type=int, default=1000,
+        help="The maximum number of coverages to describe."
+    )
+    describe_parser.set_defaults(func=benchmark_describe)
+
+    getcoverage_parser = subparsers.add_parser("getcoverage",
+        help="Compare rendering WCS 2.0 GetCoverage responses of a rectified "
+             "coverage with the MapServer and the GDAL renderer. Requires a "
+             "configured instance."
+    )
+    getcoverage_parser.add_argument("--settings", default=None,
+        help="The Django settings module of the instance."
+    )
+    getcoverage_parser.add_argument("--coverage", required=True,
+        help="The identifier of the coverage to render."
+    )
+    getcoverage_parser.add_argument("--format", default="image/tiff")
+    getcoverage_parser.add_argument("--size", type=int, default=256,
+        help="The size of the requested window in pixels."
+    )
+    getcoverage_parser.add_argument("--iterations", type=int, default=10)
+    getcoverage_parser.set_defaults(func=benchmark_getcoverage)
+
+    rectify_parser = subparsers.add_parser("rectify",
+        help="Compare the rectification of a synthetic referenceable dataset "
+             "with the exact and the approximate transformer and with "
+             "multithreaded warping."
+    )
+    rectify_parser.add_argument("--size", type=int, default=2048,
+        help="The size of the dataset in pixels."
+    )
+    rectify_parser.add_argument("--gcps", type=int, default=20,
+        help="The number of tie-point grid cells along each axis."
+    )
+    rectify_parser.add_argument("--threads", default="ALL_CPUS",
+        help="The number of warping threads or ALL_CPUS."
+    )
+    rectify_parser.add_argument("--memory-limit", type=float, default=64,
+        help="The warp memory limit in MiB."
+    )
+    rectify_parser.add_argument("--block-size", type=int, default=512,
+        help="The size of the warped chunks in pixels."
+    )
+    rectify_parser.add_argument("--iterations", type=int, default=3)
+    rectify_parser.set_defaults(func=benchmark_rectify)
+
+    parsed = parser.parse_args(args)
+    parsed.func(parsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -47,6 +47,9 @@ from eoxserver.processing.preprocessing.format import (
 from eoxserver.processing.preprocessing.georeference import (
     Extent, GCPList
 )
+from eoxserver.processing.preprocessing.batch import (
+    read_manifest, glob_items, run_batch, BatchState
+)
 
 
 def main(args):
@@ -97,8 +100,22 @@ def main(args):
                             --gcp 0,1920,10,50 --gcp 2560,1920,50,50 \\ 
                             --georef-crs 4326 input.tif
                             
+    # cloud optimized GeoTIFF with DEFLATE compression
+    eoxserver-preprocess.py --cog --compression=DEFLATE --no-metadata input.tif
+    
     # reading arguments from a file (1 line per argument), with overrides
     eoxserver-preprocess.py @args.txt --crs=3035 --no-tiling input.tif
+
+    # batch processing of all files matching a pattern with 4 workers
+    eoxserver-preprocess.py --no-metadata --glob "input/*.tif" --workers 4 \\
+                            --output-dir output/ --state-file batch.state
+
+    # batch processing of a manifest with registration of the outputs. Each 
+    # line of the manifest is in the form: 
+    # input[,output_basename[,coverage_id,begin_time,end_time]]
+    DJANGO_SETTINGS_MODULE=instance.settings \\
+    eoxserver-preprocess.py --manifest manifest.csv --workers 4 \\
+                            --register RGB --collection MER_FRS_1P
     """)
     
     #===========================================================================
@@ -197,6 +214,14 @@ def main(args):
                              "subsets in the form: 'no[:low:high]'. Either "
                              "three bands, or four when --rgba is requested.")
     
+    parser.add_argument("--cog", dest="cog", action="store_true",
+                        default=False,
+                        help="Write a cloud optimized GeoTIFF: a tiled "
+                             "GeoTIFF with internal overviews stored in front "
+                             "of the full resolution data.")
+    parser.add_argument("--blocksize", dest="blocksize", type=int,
+                        help="The tile size of the output dataset. Default "
+                             "is 512 for cloud optimized GeoTIFFs.")
     parser.add_argument("--compression", dest="compression",
                         choices=GeoTIFFFormatSelection.SUPPORTED_COMPRESSIONS,
                         help="The desired compression technique.")
@@ -236,7 +261,46 @@ def main(args):
                         default=1,
                         help="Set the verbosity (0, 1, 2). Default is 1.")
     
-    parser.add_argument("input_filename", metavar="infile", nargs=1,
+    #===========================================================================
+    # Batch processing group
+    #===========================================================================
+    
+    batch_g = parser.add_mutually_exclusive_group()
+    batch_g.add_argument("--manifest", dest="manifest",
+                         help="Process all inputs listed in the given manifest "
+                              "file. Each line is in the form 'input"
+                              "[,output_basename[,coverage_id,begin_time,"
+                              "end_time]]'.")
+    batch_g.add_argument("--glob", dest="glob",
+                         help="Process all inputs matching the given pattern.")
+    
+    parser.add_argument("--workers", dest="workers", type=int, default=1,
+                        help="The number of worker processes for batch "
+                             "processing. Default is 1.")
+    parser.add_argument("--gdal-cache", dest="gdal_cache", type=int,
+                        help="The GDAL block cache size in megabytes for each "
+                             "worker process.")
+    parser.add_argument("--state-file", dest="state_file",
+                        default="eoxserver-preprocess.state",
+                        help="The file to record the status of each item of a "
+                             "batch. Already processed items are skipped when "
+                             "the batch is resumed.")
+    parser.add_argument("--output-dir", dest="output_dir",
+                        help="The output directory for batch items without "
+                             "an explicit output basename.")
+    parser.add_argument("--register", dest="range_type_name",
+                        help="Register the outputs of a batch as datasets "
+                             "with the given range type. Requires a "
+                             "configured EOxServer instance.")
+    parser.add_argument("--collection", dest="collection_ids",
+                        action="append",
+                        help="Link the registered datasets to the given "
+                             "collection. Can be given multiple times.")
+    parser.add_argument("--visible", dest="visible", action="store_true",
+                        default=False,
+                        help="Register the datasets as 'visible'.")
+    
+    parser.add_argument("input_filename", metavar="infile", nargs="?",
                         help="The input raster file to be processed.")
     parser.add_argument("output_basename", metavar="outfiles_basename",
                         nargs="?", 
@@ -245,6 +309,16 @@ def main(args):
     
     values = vars(parser.parse_args(args))
     
+    batch_values = _extract(values, ("manifest", "glob", "workers", 
+                                     "gdal_cache", "state_file", "output_dir",
+                                     "range_type_name", "collection_ids",
+                                     "visible"))
+    
+    if "manifest" in batch_values or "glob" in batch_values:
+        return _main_batch(parser, values, batch_values)
+    
+    if "input_filename" not in values:
+        parser.error("No input file given.")
     
     # check metadata values
     if "generate_metadata" in values and ("begin_time" in values 
@@ -259,9 +333,6 @@ def main(args):
         parser.error("Enter the full metadata with --begin-time, --end-time "
                      "and --coverage-id.")
     
-    # hack to flatten the list
-    values["input_filename"] = values["input_filename"][0]
-    
     georef_crs = values.pop("georef_crs", None)
     
     if "extent" in values:
@@ -275,7 +346,9 @@ def main(args):
     
     # Extract format and execution specific values
     format_values = _extract(values, ("tiling", "compression", "jpeg_quality", 
-                                      "zlevel", "creation_options"))
+                                      "zlevel", "creation_options", 
+                                      "blocksize"))
+    format_name = "COG" if values.pop("cog") else "GTiff"
     exec_values = _extract(values, ("input_filename", "geo_reference",
                                     "generate_metadata"))
     other_values = _extract(values, ("traceback", ))
@@ -298,7 +371,7 @@ def main(args):
 
     try:
         # create a format selection
-        format_selection = get_format_selection("GTiff", **format_values)
+        format_selection = get_format_selection(format_name, **format_values)
 
 
         # TODO: make 'tif' dependant on format selection
@@ -340,6 +413,83 @@ def main(args):
         sys.stderr.write("%s: %s\n" % (type(e).__name__, str(e)))
 
 
+def _main_batch(parser, values, batch_values):
+    """ Batch processing of multiple inputs given by a manifest or a glob
+        pattern.
+    """
+    
+    if "input_filename" in values or "output_basename" in values:
+        parser.error("--manifest and --glob cannot be used with an input "
+                     "file.")
+    
+    if "extent" in values or "gcps" in values:
+        parser.error("--extent and --gcp cannot be used in batch mode.")
+    
+    if ("begin_time" in values or "end_time" in values 
+        or "coverage_id" in values):
+        parser.error("--begin-time, --end-time and --coverage-id cannot be "
+                     "used in batch mode. Use a manifest instead.")
+    
+    if batch_values.get("collection_ids") and not batch_values.get("range_type_name"):
+        parser.error("--collection can only be used with --register")
+    
+    if "palette_file" in values and not "color_index" in values:
+        parser.error("--pct can only be used with --indexed")
+    
+    values.pop("georef_crs", None)
+    
+    format_values = _extract(values, ("tiling", "compression", "jpeg_quality", 
+                                      "zlevel", "creation_options", 
+                                      "blocksize"))
+    format_name = "COG" if values.pop("cog") else "GTiff"
+    generate_metadata = values.pop("generate_metadata", True)
+    traceback_enabled = values.pop("traceback", False)
+    values.pop("force", None)
+    verbosity = values.pop("verbosity")
+    
+    # setup logging
+    if verbosity > 0:
+        if verbosity == 1: level = logging.WARN
+        elif verbosity == 2: level = logging.INFO
+        elif verbosity >= 3: level = logging.DEBUG
+        logging.basicConfig(format="%(levelname)s: %(message)s", stream=sys.stderr,
+                            level=level)
+    
+    try:
+        format_selection = get_format_selection(format_name, **format_values)
+        preprocessor = WMSPreProcessor(format_selection, **values)
+        
+        if "manifest" in batch_values:
+            items = read_manifest(batch_values["manifest"])
+        else:
+            items = glob_items(batch_values["glob"])
+        
+        failed = run_batch(
+            preprocessor, items, BatchState(batch_values["state_file"]),
+            workers=batch_values["workers"], 
+            gdal_cache=batch_values.get("gdal_cache"),
+            output_dir=batch_values.get("output_dir"),
+            generate_metadata=generate_metadata,
+            range_type_name=batch_values.get("range_type_name"),
+            collection_ids=batch_values.get("collection_ids"),
+            visible=batch_values["visible"]
+        )
+        
+        if failed:
+            sys.stderr.write("%d item(s) failed. See '%s' for details.\n"
+                             % (failed, batch_values["state_file"]))
+            return 1
+        
+    except Exception, e:
+        # error wrapping
+        if traceback_enabled:
+            traceback.print_exc()
+        sys.stderr.write("%s: %s\n" % (type(e).__name__, str(e)))
+        return 1
+    
+    return 0
+
+
 def _parse_datetime(input_str):
     """ Helper callback function to check if a given datetime is correct.
     """
@@ -461,4 +611,4 @@ def _extract(dct, keys):
 
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))